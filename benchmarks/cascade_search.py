@@ -0,0 +1,181 @@
+"""
+Latency benchmark of cascading multi-event search.
+
+Builds a synthetic flat index of clustered keyframe embeddings (one cluster
+per video) with its clip.json, then runs multi-event queries through
+`MultiEventRetrieval` twice: every event searching the whole corpus, and the
+cascade where later events only search the surviving videos after the base
+match. Text encoding is replaced by precomputed query vectors so that only
+search and join are timed. Reports the mean latency, how many base hits each
+mode keeps, and the mean number of keyframes each later cascade event searched.
+
+Run from the repository root:
+    python -m benchmarks.cascade_search --videos 2000 --frames 300 --events 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+import faiss
+import numpy as np
+
+from src.repositories.load_faiss import ClipFaiss
+from src.repositories.load_json import LoadJson
+from src.services.multi_event_retrieval import MultiEventRetrieval
+from src.utils.executor import InferenceExecutor
+
+
+class QueryEncoder:
+    """
+    Stands in for a CLIP encoder: returns the vectors of the current query.
+    """
+
+    def __init__(self) -> None:
+        self.vectors = None
+
+    async def text_embeddings(self, texts):
+        return self.vectors[:len(texts)]
+
+
+class LoadedModels:
+    """
+    Stands in for the ModelManager: the model is always loaded.
+    """
+
+    @asynccontextmanager
+    async def use(self, model_type):
+        yield
+
+
+class RecordingFaiss:
+    """
+    Forwards searches to ClipFaiss and records the size of every id filter.
+    """
+
+    def __init__(self, clip_faiss: ClipFaiss) -> None:
+        self._faiss = clip_faiss
+        self.filter_sizes = []
+
+    async def multi_search(self, *args, **kwargs):
+        if kwargs.get("id_filter") is not None:
+            self.filter_sizes.append(len(kwargs["id_filter"]))
+        return await self._faiss.multi_search(*args, **kwargs)
+
+
+def build_corpus(tmp_dir: str, videos: int, frames: int, dim: int):
+    """
+    Write a flat index whose keyframes drift slowly along each video, and the
+    matching clip.json.
+    """
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((videos, dim), dtype=np.float32)
+    drift = rng.standard_normal((videos, dim), dtype=np.float32)
+    steps = np.linspace(0, 1, frames, dtype=np.float32)
+    vectors = (centers[:, None, :] + steps[None, :, None] * drift[:, None, :]).reshape(-1, dim)
+    vectors += 0.3 * rng.standard_normal(vectors.shape, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexFlatIP(dim)
+    index.add(vectors)
+    index_path = os.path.join(tmp_dir, "original.faiss")
+    faiss.write_index(index, index_path)
+    json_path = os.path.join(tmp_dir, "clip.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump([
+            {"indice": i, "video_id": f"V{i // frames:05d}", "frame_id": f"{i % frames:05d}.jpg"}
+            for i in range(videos * frames)
+        ], f)
+    return index_path, json_path, vectors
+
+
+def make_queries(vectors: np.ndarray, frames: int, events: int, queries: int) -> list:
+    """
+    Each query follows one video: its events are noisy copies of frames at
+    increasing positions.
+    """
+    rng = np.random.default_rng(1)
+    videos = len(vectors) // frames
+    result = []
+    for _ in range(queries):
+        video = rng.integers(videos)
+        positions = np.sort(rng.choice(frames, events, replace=False))
+        query = vectors[video * frames + positions]
+        query = query + 0.05 * rng.standard_normal(query.shape, dtype=np.float32)
+        faiss.normalize_L2(query)
+        result.append(query)
+    return result
+
+
+async def run(retrieval, encoder, recorder, queries, events, cascade) -> tuple:
+    """
+    Run every query in one mode; return mean ms, kept hits and filter sizes.
+    """
+    latencies, kept = [], []
+    step_sizes = [[] for _ in range(events - 1)]
+    list_event = [f"event {i}" for i in range(events)]
+    for query in queries:
+        encoder.vectors = query
+        recorder.filter_sizes = []
+        start = time.perf_counter()
+        result = await retrieval.multi_event_search(
+            model_type="original_clip",
+            list_event=list_event,
+            cascade=cascade
+        )
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        kept.append(len(result))
+        for step, size in enumerate(recorder.filter_sizes):
+            step_sizes[step].append(size)
+    return np.mean(latencies), np.mean(kept), step_sizes
+
+
+def main() -> None:
+    """
+    Parse arguments, build the corpus and print both modes.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--videos", type=int, default=1000)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--events", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=1500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_path, json_path, vectors = build_corpus(tmp_dir, args.videos, args.frames, args.dim)
+        executor = InferenceExecutor()
+        clip_faiss = ClipFaiss(index_path, index_path, index_path, executor=executor, lazy=True)
+        clip_faiss.load_index("original_clip")
+        frames = LoadJson(json_path, use_bundle=False)
+        encoder = QueryEncoder()
+        recorder = RecordingFaiss(clip_faiss)
+        retrieval = MultiEventRetrieval(
+            top_k=args.top_k,
+            original_clip=encoder,
+            apple_clip=encoder,
+            laion_clip=encoder,
+            faiss=recorder,
+            data=frames,
+            models=LoadedModels(),
+            frames=frames
+        )
+        queries = make_queries(vectors, args.frames, args.events, args.queries)
+        print(f"{len(vectors)} keyframes, {args.events} events, K={args.top_k}")
+        for cascade in (False, True):
+            latency, kept, step_sizes = asyncio.run(
+                run(retrieval, encoder, recorder, queries, args.events, cascade)
+            )
+            line = f"{'cascade' if cascade else 'full':<8}{latency:>9.1f} ms{kept:>9.1f} kept"
+            if cascade:
+                searched = [f"{np.mean(sizes):.0f}" if sizes else "-" for sizes in step_sizes]
+                line += f", keyframes searched by events 2..{args.events}: {' '.join(searched)}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
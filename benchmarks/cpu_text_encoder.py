@@ -0,0 +1,70 @@
+"""
+CPU latency benchmark for the text encoder modes.
+
+Measures per-call latency of the fp32, int8 (exported TorchScript) and bf16
+text encoders of one model at several batch sizes. Export the int8 tower
+first with `python -m src.tools.export_text_encoder`.
+
+Run from the repository root:
+    python -m benchmarks.cpu_text_encoder --model-type apple_clip --batch-sizes 1 8
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+
+from src.services.service import TEXT_ENCODER_DIR, text_encoder_path
+from src.tools.export_text_encoder import MODELS, load_cpu_encoder
+from src.tools.text_encoder_parity import DEFAULT_QUERIES
+
+
+def time_calls(encoder, texts, repeats: int) -> np.ndarray:
+    """
+    Time repeated encode_texts calls, after one warm-up call.
+    """
+    encoder.encode_texts(texts)
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        encoder.encode_texts(texts)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000.0
+
+
+def main() -> None:
+    """
+    Parse arguments and print the latency table.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-type", choices=sorted(MODELS), required=True)
+    parser.add_argument("--modes", nargs="+", default=["default", "int8", "bf16"])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--export-dir", default=TEXT_ENCODER_DIR)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    encoder = load_cpu_encoder(args.model_type)
+    path = text_encoder_path(args.export_dir, args.model_type)
+    print(f"{'mode':<10}{'batch':>6}{'p50 ms':>10}{'p99 ms':>10}{'q/s':>10}")
+    for mode in args.modes:
+        if mode == "int8" and not os.path.exists(path):
+            print(f"{mode:<10} skipped, {path} not found")
+            continue
+        encoder.set_text_encoder_mode(mode=mode, path=path)
+        for batch_size in args.batch_sizes:
+            texts = (DEFAULT_QUERIES * batch_size)[:batch_size]
+            latencies = time_calls(encoder, texts, args.repeats)
+            p50 = np.percentile(latencies, 50)
+            print(f"{mode:<10}{batch_size:>6}{p50:>10.1f}"
+                  f"{np.percentile(latencies, 99):>10.1f}"
+                  f"{batch_size * 1000.0 / p50:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
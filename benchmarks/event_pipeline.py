@@ -0,0 +1,126 @@
+"""
+Latency benchmark of the pipelined multi-event search.
+
+Builds the synthetic corpus of `benchmarks.cascade_search` and runs
+multi-event queries through `MultiEventRetrieval`, first as one stage per
+query (every event embedded in one pass, searched in one call and mapped on
+the event loop) and then pipelined in chunks of events, by default with the
+service defaults (EVENT_CHUNK_SIZE 0, i.e. `--concurrency` chunks per query). Text encoding is
+simulated on the model pool by a blocking wait of a fixed cost per pass plus
+a cost per text, standing in for a forward pass that releases the GIL, so the
+overlap with the FAISS search and the mapping is measured.
+
+Run from the repository root:
+    python -m benchmarks.event_pipeline --events 2
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.cascade_search import LoadedModels, build_corpus, make_queries
+from src.repositories.load_faiss import ClipFaiss
+from src.repositories.load_json import LoadJson
+from src.services.multi_event_retrieval import MultiEventRetrieval
+from src.utils.executor import InferenceExecutor
+
+
+class TimedEncoder:
+    """
+    Stands in for a CLIP encoder: blocks a model pool thread for the cost of a
+    forward pass, then returns the vectors of the current query.
+    """
+
+    def __init__(self, executor: InferenceExecutor, pass_ms: float, text_ms: float) -> None:
+        self._executor = executor
+        self._pass_ms = pass_ms
+        self._text_ms = text_ms
+        self.vectors = None
+        self._events = []
+
+    def start(self, vectors: np.ndarray, list_event: list) -> None:
+        self.vectors = vectors
+        self._events = list_event
+
+    def _encode(self, texts):
+        time.sleep((self._pass_ms + self._text_ms * len(texts)) / 1000.0)
+        return self.vectors[[self._events.index(text) for text in texts]]
+
+    async def text_embeddings(self, texts):
+        return await self._executor.run("original_clip", self._encode, texts)
+
+
+async def run(retrieval, encoder, queries, list_event) -> float:
+    """
+    Run every query; return the mean latency in ms.
+    """
+    latencies = []
+    for query in queries:
+        encoder.start(query, list_event)
+        start = time.perf_counter()
+        await retrieval.multi_event_search(
+            model_type="original_clip",
+            list_event=list_event
+        )
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return float(np.mean(latencies))
+
+
+def main() -> None:
+    """
+    Parse arguments, build the corpus and print both modes.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--videos", type=int, default=1000)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--events", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=1500)
+    parser.add_argument("--pass-ms", type=float, default=10.0)
+    parser.add_argument("--text-ms", type=float, default=4.0)
+    parser.add_argument("--chunk-size", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--index-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_path, json_path, vectors = build_corpus(tmp_dir, args.videos, args.frames, args.dim)
+        executor = InferenceExecutor(pool_sizes={
+            "original_index": args.index_workers,
+            "event_mapping": args.concurrency
+        })
+        clip_faiss = ClipFaiss(index_path, index_path, index_path, executor=executor, lazy=True)
+        clip_faiss.load_index("original_clip")
+        frames = LoadJson(json_path, use_bundle=False)
+        encoder = TimedEncoder(executor, args.pass_ms, args.text_ms)
+        queries = make_queries(vectors, args.frames, args.events, args.queries)
+        list_event = [f"event {i}" for i in range(args.events)]
+        modes = {
+            "serial": dict(event_chunk_size=args.events, event_concurrency=1),
+            "pipelined": dict(executor=executor, event_chunk_size=args.chunk_size,
+                              event_concurrency=args.concurrency)
+        }
+        print(f"{len(vectors)} keyframes, {args.events} events, K={args.top_k}, "
+              f"encode {args.pass_ms:g} ms + {args.text_ms:g} ms/text")
+        for name, kwargs in modes.items():
+            retrieval = MultiEventRetrieval(
+                top_k=args.top_k,
+                original_clip=encoder,
+                apple_clip=encoder,
+                laion_clip=encoder,
+                faiss=clip_faiss,
+                data=frames,
+                models=LoadedModels(),
+                frames=frames,
+                **kwargs
+            )
+            latency = asyncio.run(run(retrieval, encoder, queries, list_event))
+            print(f"{name:<10}{latency:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
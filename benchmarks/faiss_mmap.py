@@ -0,0 +1,127 @@
+"""
+Startup time and memory benchmark for memory-mapped FAISS index loading.
+
+Builds a synthetic index, then starts several worker processes per mode that
+each load it with `ClipFaiss.read_index` and run a few searches, the way
+uvicorn/gunicorn workers would. Reports the load time of each worker and its
+private (RssAnon), file-backed (RssFile) and proportional (Pss) memory while
+all workers are alive, so that pages shared through the page cache show up
+as a lower Pss. Drop the page cache between runs for truly cold starts
+(`echo 3 > /proc/sys/vm/drop_caches` as root).
+
+Run from the repository root:
+    python -m benchmarks.faiss_mmap --vectors 500000 --dim 768 --workers 4
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from src.repositories.load_faiss import ClipFaiss
+
+
+def memory_kb() -> dict:
+    """
+    Read the RSS split and Pss of the current process from /proc.
+    """
+    stats = {}
+    with open("/proc/self/status", "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith(("RssAnon", "RssFile")):
+                stats[line.split(":")[0]] = int(line.split()[1])
+    with open("/proc/self/smaps_rollup", "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                stats["Pss"] = int(line.split()[1])
+    return stats
+
+
+def build_index(path: str, vectors: int, dim: int, factory: str) -> None:
+    """
+    Write a synthetic inner-product index of unit vectors.
+    """
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((vectors, dim), dtype=np.float32)
+    faiss.normalize_L2(data)
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+    index.train(data[:min(vectors, 100_000)])
+    index.add(data)
+    faiss.write_index(index, path)
+
+
+def worker(path, mmap, queries, barrier, results) -> None:
+    """
+    Load the index, search it, and report timings and memory.
+    """
+    start = time.perf_counter()
+    index = ClipFaiss.read_index(path, mmap=mmap)
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    index.search(queries, 100)
+    search_seconds = time.perf_counter() - start
+    # Measure once every worker holds the index.
+    barrier.wait()
+    results.put((load_seconds, search_seconds, memory_kb()))
+    barrier.wait()
+
+
+def run_mode(path: str, mmap: bool, workers: int, queries: np.ndarray) -> list:
+    """
+    Start the workers of one mode and collect their reports.
+    """
+    context = mp.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(path, mmap, queries, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return reports
+
+
+def main() -> None:
+    """
+    Parse arguments and print the per-mode table.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--factory", default="Flat",
+                        help="index_factory string, e.g. Flat or IVF1024,Flat")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--index", help="existing index file instead of a synthetic one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.index
+        if path is None:
+            path = os.path.join(tmp_dir, "synthetic.faiss")
+            build_index(path, args.vectors, args.dim, args.factory)
+        dim = ClipFaiss.read_index(path, mmap=True).d
+        queries = np.random.default_rng(1).standard_normal((8, dim), dtype=np.float32)
+        print(f"index {os.path.getsize(path) / 2**20:.0f} MB, {args.workers} workers")
+        print(f"{'mode':<8}{'load s':>9}{'search s':>10}"
+              f"{'anon MB':>10}{'file MB':>10}{'pss MB':>10}{'total pss MB':>14}")
+        for mmap in (False, True):
+            reports = run_mode(path, mmap, args.workers, queries)
+            load = np.mean([r[0] for r in reports])
+            search = np.mean([r[1] for r in reports])
+            anon = np.mean([r[2]["RssAnon"] for r in reports]) / 1024
+            file = np.mean([r[2]["RssFile"] for r in reports]) / 1024
+            pss = np.mean([r[2]["Pss"] for r in reports]) / 1024
+            print(f"{'mmap' if mmap else 'read':<8}{load:>9.3f}{search:>10.3f}"
+                  f"{anon:>10.0f}{file:>10.0f}{pss:>10.0f}{pss * len(reports):>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
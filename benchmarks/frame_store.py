@@ -0,0 +1,132 @@
+"""
+Memory and mapping-time benchmark of the columnar keyframe store.
+
+Writes a synthetic clip.json, then loads it in a fresh process per store: the
+previous dict-of-dicts mapping (the parsed list, a dict per keyframe and the
+reverse lookup, rebuilt here as the baseline) and the columnar `LoadJson`.
+Reports the load time, the private memory (RssAnon) the store adds to a
+worker, and the time to map one row of TOP_K search results.
+
+Run from the repository root:
+    python -m benchmarks.frame_store --keyframes 2000000 --top-k 1500
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from src.repositories.load_json import LoadJson
+
+
+def rss_anon_kb() -> int:
+    """
+    Read the private resident memory of the current process from /proc.
+    """
+    with open("/proc/self/status", "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("RssAnon"):
+                return int(line.split()[1])
+    return 0
+
+
+def write_json(path: str, keyframes: int, frames_per_video: int) -> None:
+    """
+    Write a synthetic clip.json of `keyframes` entries.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([
+            {
+                "indice": i,
+                "video_id": f"L{i // (frames_per_video * 500):02d}_V{i // frames_per_video:05d}",
+                "frame_id": f"{(i % frames_per_video) * 25:05d}.jpg"
+            } for i in range(keyframes)
+        ], f)
+
+
+class DictStore:
+    """
+    The previous mapping: the parsed list, a dict per keyframe and a reverse dict.
+    """
+
+    def __init__(self, json_url: str) -> None:
+        with open(json_url, "r", encoding="utf-8") as f:
+            self.mapping = json.load(f)
+        self.data = {
+            obj["indice"]: {"video_id": obj["video_id"], "frame_id": obj["frame_id"]}
+            for obj in self.mapping
+        }
+        self.reverse = {
+            (obj["video_id"], LoadJson.frame_number(obj["frame_id"])): obj["indice"]
+            for obj in self.mapping
+        }
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def map_indices(self, indices: np.ndarray, scores: np.ndarray) -> list:
+        return [
+            dict(self.data[indice], score=score)
+            for indice, score in zip(indices.tolist(), scores.tolist())
+            if indice in self.data
+        ]
+
+
+def worker(path, store_name, top_k, repeats, results) -> None:
+    """
+    Load one store and report its load time, memory and mapping time.
+    """
+    before = rss_anon_kb()
+    start = time.perf_counter()
+    store = DictStore(path) if store_name == "dict" else LoadJson(path)
+    load_seconds = time.perf_counter() - start
+    memory = rss_anon_kb() - before
+    rng = np.random.default_rng(0)
+    rows = [rng.integers(0, len(store), top_k) for _ in range(repeats)]
+    scores = np.sort(rng.random(top_k, dtype=np.float32))[::-1]
+    start = time.perf_counter()
+    for row in rows:
+        store.map_indices(row, scores)
+    map_ms = (time.perf_counter() - start) * 1000.0 / repeats
+    results.put((store_name, len(store), load_seconds, memory, map_ms))
+
+
+def main() -> None:
+    """
+    Parse arguments and print one line per store.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--keyframes", type=int, default=1_000_000)
+    parser.add_argument("--frames-per-video", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=1500)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--json", help="existing clip.json instead of a synthetic one")
+    args = parser.parse_args()
+
+    context = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.json
+        if path is None:
+            path = os.path.join(tmp_dir, "clip.json")
+            write_json(path, args.keyframes, args.frames_per_video)
+        print(f"clip.json {os.path.getsize(path) / 2**20:.0f} MB, K={args.top_k}")
+        print(f"{'store':<10}{'load s':>9}{'anon MB':>10}{'B/frame':>9}{'map ms':>9}")
+        for store_name in ("dict", "columnar"):
+            results = context.Queue()
+            process = context.Process(
+                target=worker,
+                args=(path, store_name, args.top_k, args.repeats, results)
+            )
+            process.start()
+            name, keyframes, load_seconds, memory, map_ms = results.get()
+            process.join()
+            print(f"{name:<10}{load_seconds:>9.2f}{memory / 1024:>10.0f}"
+                  f"{memory * 1024 / keyframes:>9.0f}{map_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
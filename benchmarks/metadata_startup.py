@@ -0,0 +1,82 @@
+"""
+Startup benchmark of the keyframe mapping: JSON parse versus metadata bundle.
+
+Writes a synthetic clip.json and compiles it into a bundle, then opens the
+mapping in fresh processes, as every uvicorn/gunicorn worker does on start:
+once parsing the JSON (`LoadJson(..., use_bundle=False)`) and once mapping
+the bundle. Reports the open time, the private memory (RssAnon) it adds, and
+the time of the first result mapping, which pays for the bundle's page faults.
+
+Run from the repository root:
+    python -m benchmarks.metadata_startup --keyframes 2000000 --runs 3
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.frame_store import rss_anon_kb, write_json
+from src.repositories.load_json import LoadJson
+from src.repositories.metadata_bundle import bundle_path
+
+
+def worker(url, use_bundle, top_k, results) -> None:
+    """
+    Open the mapping once and report timings and memory.
+    """
+    before = rss_anon_kb()
+    start = time.perf_counter()
+    frames = LoadJson(url, use_bundle=use_bundle)
+    open_seconds = time.perf_counter() - start
+    memory = rss_anon_kb() - before
+    row = np.random.default_rng(0).integers(0, len(frames), top_k)
+    start = time.perf_counter()
+    frames.map_indices(row)
+    first_map_ms = (time.perf_counter() - start) * 1000.0
+    results.put((open_seconds, memory, first_map_ms))
+
+
+def main() -> None:
+    """
+    Parse arguments and print one line per format.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--keyframes", type=int, default=1_000_000)
+    parser.add_argument("--frames-per-video", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=1500)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="existing clip.json instead of a synthetic one")
+    args = parser.parse_args()
+
+    context = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.json
+        if path is None:
+            path = os.path.join(tmp_dir, "clip.json")
+            write_json(path, args.keyframes, args.frames_per_video)
+        bundle = os.path.join(tmp_dir, os.path.basename(bundle_path(path)))
+        start = time.perf_counter()
+        LoadJson(path, use_bundle=False).save_bundle(bundle, source_url=path)
+        print(f"clip.json {os.path.getsize(path) / 2**20:.0f} MB, "
+              f"compiled in {time.perf_counter() - start:.2f}s")
+        print(f"{'format':<8}{'open s':>10}{'anon MB':>10}{'first map ms':>14}")
+        for name, url, use_bundle in (("json", path, False), ("bundle", bundle, True)):
+            reports = []
+            for _ in range(args.runs):
+                results = context.Queue()
+                process = context.Process(
+                    target=worker, args=(url, use_bundle, args.top_k, results)
+                )
+                process.start()
+                reports.append(results.get())
+                process.join()
+            open_seconds, memory, first_map_ms = np.mean(reports, axis=0)
+            print(f"{name:<8}{open_seconds:>10.4f}{memory / 1024:>10.1f}{first_map_ms:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Timing benchmark of OCR/ASR result fusion.
+
+Generates two synthetic ranked hit lists sharing part of their keyframes and
+times the previous non-text path (a set of `tuple(item.items())` per list,
+then membership tests of every result against the lists of dicts, per
+priority entry) against `fuse` on packed frame keys, in each fusion mode.
+
+Run from the repository root:
+    python -m benchmarks.result_fusion --hits 5000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.services.result_fusion import fuse
+
+
+def make_hits(rng, hits: int, videos: int, frames: int) -> list:
+    """
+    Draw ranked hits over `videos` videos of `frames` keyframes each.
+    """
+    keys = rng.choice(videos * frames, hits, replace=False)
+    return [
+        {"video_id": f"L01_V{key // frames:05d}", "frame_id": f"{key % frames:05d}.jpg"}
+        for key in keys.tolist()
+    ]
+
+
+def previous_fusion(list_ocr: list, list_asr: list, priority: list) -> list:
+    """
+    The previous set intersection followed by list-membership prioritization.
+    """
+    ocr_set = {tuple(item.items()) for item in list_ocr}
+    asr_set = {tuple(item.items()) for item in list_asr}
+    result = [dict(item) for item in ocr_set.intersection(asr_set)]
+    prioritized = []
+    for item in priority:
+        if item == "asr":
+            prioritized.extend(r for r in result if r in list_asr)
+        elif item == "ocr":
+            prioritized.extend(r for r in result if r in list_ocr)
+    return prioritized
+
+
+def timed(func, repeats: int) -> tuple:
+    """
+    Return the mean ms of `repeats` calls and the last result.
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = func()
+    return (time.perf_counter() - start) * 1000.0 / repeats, result
+
+
+def main() -> None:
+    """
+    Parse arguments and print one line per method.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hits", type=int, default=2000)
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    list_ocr = make_hits(rng, args.hits, args.videos, args.frames)
+    list_asr = make_hits(rng, args.hits, args.videos, args.frames)
+    priority = ["ocr", "asr"]
+    print(f"{args.hits} OCR and {args.hits} ASR hits")
+    elapsed, result = timed(lambda: previous_fusion(list_ocr, list_asr, priority), args.repeats)
+    print(f"{'previous':<14}{elapsed:>10.2f} ms{len(result):>8} hits")
+    for mode in ("intersection", "union", "priority", "rrf"):
+        elapsed, result = timed(lambda: fuse([list_ocr, list_asr], mode=mode), args.repeats)
+        print(f"{mode:<14}{elapsed:>10.2f} ms{len(result):>8} hits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Response-building benchmark of paginated results.
+
+Maps TOP_K search results from a synthetic keyframe store and times building
+and serializing the whole `ListResponseClip` against keeping the results
+behind a cursor and serializing the first page, then each later page.
+
+Run from the repository root:
+    python -m benchmarks.result_pages --top-k 1500 --page-size 100
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.frame_store import write_json
+from src.api.schemas.clip import ListResponseClip, ResponseClip
+from src.repositories.load_json import LoadJson
+from src.services.result_cursor import ResultCursors
+
+
+def serialize(records: list, **fields) -> int:
+    """
+    Build a response as the router does and return the size of its JSON.
+    """
+    response = ListResponseClip(
+        data=[ResponseClip(**record) for record in records],
+        **fields
+    )
+    return len(response.model_dump_json())
+
+
+def main() -> None:
+    """
+    Parse arguments and print the time and size of each response.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--keyframes", type=int, default=200_000)
+    parser.add_argument("--top-k", type=int, default=1500)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "clip.json")
+        write_json(path, args.keyframes, 300)
+        frames = LoadJson(path, use_bundle=False)
+        cursors = ResultCursors()
+        rng = np.random.default_rng(0)
+        rows = [rng.choice(args.keyframes, args.top_k, replace=False) for _ in range(args.repeats)]
+        scores = np.sort(rng.random(args.top_k, dtype=np.float32))[::-1]
+        results = [frames.map_indices(row, scores) for row in rows]
+
+        start = time.perf_counter()
+        for result in results:
+            size = serialize(result)
+        full_ms = (time.perf_counter() - start) * 1000.0 / args.repeats
+
+        start = time.perf_counter()
+        for result in results:
+            cursor, _ = cursors.create(result)
+            page, cursor, total = cursors.page(cursor, args.page_size)
+            first_size = serialize(page, cursor=cursor, total=total)
+        first_ms = (time.perf_counter() - start) * 1000.0 / args.repeats
+
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            page, next_cursor, total = cursors.page(cursor, args.page_size)
+            serialize(page, cursor=next_cursor, total=total)
+        next_ms = (time.perf_counter() - start) * 1000.0 / args.repeats
+
+    print(f"{len(frames)} keyframes, K={args.top_k}, page size {args.page_size}")
+    print(f"{'full response':<16}{full_ms:>8.2f} ms{size / 1024:>8.0f} KB")
+    print(f"{'first page':<16}{first_ms:>8.2f} ms{first_size / 1024:>8.0f} KB")
+    print(f"{'later page':<16}{next_ms:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
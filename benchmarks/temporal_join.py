@@ -0,0 +1,103 @@
+"""
+Benchmark of the multi-event temporal join.
+
+Generates random hit lists shaped like multi-event search results (TOP_K hits
+per event over a few hundred videos) and times the previous nested
+`all(any(...))` scan, rebuilt here as the baseline, against the indexed
+`temporal_join`, after checking that both keep the same hits. Also times the
+ranked sequence scorer on the same lists.
+
+Run from the repository root:
+    python -m benchmarks.temporal_join --events 5 --hits 1500 --videos 300
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.services.temporal_join import score_sequences, temporal_join
+
+
+def nested_join(list_event, field="video_id", frame_field="frame_id") -> list:
+    """
+    The previous join: scan every other list for every base hit.
+    """
+    def extract_frame_number(frame_id: str) -> int:
+        return int(frame_id.split('.')[0])
+
+    common_elements = []
+    for item in list_event[0]:
+        frame_id_value = extract_frame_number(item[frame_field])
+        if all(
+            any(
+                d[field] == item[field] and extract_frame_number(d[frame_field]) > frame_id_value
+                for d in lst
+            )
+            for lst in list_event[1:]
+        ):
+            common_elements.append(item)
+    return common_elements
+
+
+def make_events(events: int, hits: int, videos: int, frames: int, seed: int) -> list:
+    """
+    Random hit lists; each list holds distinct (video, frame) keyframes.
+    """
+    rng = np.random.default_rng(seed)
+    lists = []
+    for _ in range(events):
+        keys = rng.choice(videos * frames, hits, replace=False)
+        lists.append([
+            {
+                "video_id": f"L01_V{key // frames:03d}",
+                "frame_id": f"{key % frames * 25:05d}.jpg",
+                "score": float(score)
+            } for key, score in zip(keys.tolist(), np.sort(rng.random(hits))[::-1].tolist())
+        ])
+    return lists
+
+
+def timed(function, list_event, repeats: int):
+    """
+    Run a join several times; return its result and mean milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function(list_event)
+    return result, (time.perf_counter() - start) * 1000.0 / repeats
+
+
+def main() -> None:
+    """
+    Parse arguments and print both timings.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=5)
+    parser.add_argument("--hits", type=int, default=1500)
+    parser.add_argument("--videos", type=int, default=300)
+    parser.add_argument("--frames", type=int, default=400, help="keyframes per video")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--top-sequences", type=int, default=100)
+    parser.add_argument("--max-gap", type=int, default=None)
+    args = parser.parse_args()
+
+    list_event = make_events(args.events, args.hits, args.videos, args.frames, seed=0)
+    expected, nested_ms = timed(nested_join, list_event, 1)
+    result, indexed_ms = timed(temporal_join, list_event, args.repeats)
+    if result != expected:
+        raise SystemExit("temporal_join does not match the nested join")
+    print(f"{args.events} events x {args.hits} hits, {args.videos} videos: "
+          f"{len(result)} base hits kept")
+    print(f"nested  {nested_ms:>10.1f} ms")
+    print(f"indexed {indexed_ms:>10.2f} ms  ({nested_ms / indexed_ms:.0f}x)")
+    sequences, sequence_ms = timed(
+        lambda events: score_sequences(events, args.top_sequences, args.max_gap),
+        list_event,
+        args.repeats
+    )
+    print(f"ranked  {sequence_ms:>10.2f} ms  (top {len(sequences)} sequences)")
+
+
+if __name__ == "__main__":
+    main()
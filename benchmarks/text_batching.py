@@ -0,0 +1,150 @@
+"""
+CPU benchmark for the text micro-batching queue.
+
+A stub encoder with a fixed per-call overhead plus per-row matmul work stands
+in for the CLIP text tower, so the benchmark runs without model weights.
+
+Run from the repository root:
+    python -m benchmarks.text_batching --clients 8 16 32 --requests 50
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+
+from src.modules.text_batcher import TextBatcher
+
+
+class StubTextEncoder:
+    """
+    Imitates a text tower: a fixed launch overhead plus a few dense layers.
+    """
+
+    def __init__(
+        self,
+        dim: int = 1024,
+        width: int = 512,
+        seq_len: int = 77,
+        layers: int = 2,
+        overhead_ms: float = 4.0
+    ) -> None:
+        rng = np.random.default_rng(0)
+        self._seq_len = seq_len
+        self._overhead = overhead_ms / 1000.0
+        self._vocab = rng.standard_normal((4096, width), dtype=np.float32)
+        self._layers = [
+            rng.standard_normal((width, width), dtype=np.float32) / np.sqrt(width)
+            for _ in range(layers)
+        ]
+        self._proj = rng.standard_normal((width, dim), dtype=np.float32)
+
+    def encode_texts(
+        self,
+        texts: List[str]
+    ) -> np.ndarray:
+        """
+        Encode a batch of texts into normalized vectors.
+        """
+        time.sleep(self._overhead)
+        tokens = np.array(
+            [
+                [hash((text, i)) % len(self._vocab) for i in range(self._seq_len)]
+                for text in texts
+            ]
+        )
+        hidden = self._vocab[tokens]
+        for weight in self._layers:
+            hidden = np.tanh(hidden @ weight)
+        features = hidden.mean(axis=1) @ self._proj
+        return features / np.linalg.norm(features, axis=-1, keepdims=True)
+
+
+async def run_clients(
+    embed,
+    clients: int,
+    requests: int
+) -> List[float]:
+    """
+    Run closed-loop clients and collect per-request latencies.
+    """
+    latencies = []
+
+    async def client(client_id: int) -> None:
+        for i in range(requests):
+            start = time.perf_counter()
+            await embed(f"client {client_id} query {i}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    return latencies
+
+
+async def bench(
+    mode: str,
+    encoder: StubTextEncoder,
+    clients: int,
+    requests: int,
+    batch_size: int,
+    wait_ms: float
+) -> dict:
+    """
+    Benchmark one mode at one concurrency level.
+    """
+    device = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+    if mode == "batched":
+        batcher = TextBatcher(
+            encode_fn=encoder.encode_texts,
+            max_batch_size=batch_size,
+            max_wait_ms=wait_ms
+        )
+
+        async def embed(text):
+            return await batcher.submit(text)
+    else:
+        async def embed(text):
+            return await loop.run_in_executor(device, encoder.encode_texts, [text])
+
+    start = time.perf_counter()
+    latencies = await run_clients(embed, clients, requests)
+    elapsed = time.perf_counter() - start
+    device.shutdown()
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        "mode": mode,
+        "clients": clients,
+        "qps": len(latencies) / elapsed,
+        "p50": float(np.percentile(latencies_ms, 50)),
+        "p99": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def main() -> None:
+    """
+    Parse arguments and print the benchmark table.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    encoder = StubTextEncoder()
+    print(f"{'mode':<10}{'clients':>8}{'qps':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for clients in args.clients:
+        for mode in ("single", "batched"):
+            row = asyncio.run(
+                bench(mode, encoder, clients, args.requests,
+                      args.batch_size, args.wait_ms)
+            )
+            print(f"{row['mode']:<10}{row['clients']:>8}{row['qps']:>10.1f}"
+                  f"{row['p50']:>10.1f}{row['p99']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
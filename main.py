@@ -6,7 +6,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
-from src.api.routers import clip_router
+from src.api.routers import clip_router, admin_router
 
 app = FastAPI(
     title="Hermes Backend",
@@ -23,6 +23,15 @@ app.add_middleware(
 )
 
 app.include_router(clip_router)
+app.include_router(admin_router)
+
+
+@app.get("/health")
+async def health() -> dict:
+    """
+    Liveness check; answered by the event loop while inference runs on executors.
+    """
+    return {"status": "ok"}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -4,6 +4,14 @@ It imports the Service class from the src.services.service module and
 initializes an instance of it.
 """
 
+import secrets
+from typing import Optional
+
+from fastapi import (status,
+                     Depends,
+                     Header,
+                     HTTPException)
+
 from src.services.service import Service
 
 service = Service()
@@ -14,3 +22,29 @@ async def get_service() -> Service:
     Get the inference service instance.
     """
     return service
+
+
+async def require_admin(
+    x_admin_token: Optional[str] = Header(default=None),
+    service: Service = Depends(get_service)
+) -> None:
+    """
+    Admit a request to the admin API only with the configured token in its
+    X-Admin-Token header. The admin API is disabled while no token is set.
+
+    Raises:
+        HTTPException: 403 if the admin API is disabled, 401 if the token is
+            missing or wrong.
+    """
+    if not service.admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="The admin API is disabled; set ADMIN_TOKEN to enable it"
+        )
+    if x_admin_token is None or not secrets.compare_digest(
+        x_admin_token.encode(), service.admin_token.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid admin token"
+        )
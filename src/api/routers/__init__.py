@@ -2,3 +2,4 @@
 Create package for API router clip
 """
 from .clip_retrieval import clip_router
+from .admin import admin_router
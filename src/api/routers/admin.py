@@ -0,0 +1,124 @@
+"""
+This module defines a FastAPI router for index administration: keyframe
+ingestion and hot index reloads. Every route requires the admin token.
+"""
+import numpy as np
+from fastapi import (status,
+                     Depends,
+                     APIRouter,
+                     HTTPException)
+
+from src.api.schemas.admin import (RequestIngest,
+                                   RequestReload)
+from src.services.service import Service
+from src.api.dependencies.dependency import (get_service,
+                                             require_admin)
+
+
+admin_router = APIRouter(
+    tags=["Admin"],
+    prefix="/admin",
+    dependencies=[Depends(require_admin)]
+)
+
+
+@admin_router.post(
+    "/ingest",
+    status_code=status.HTTP_200_OK
+)
+async def ingest(
+    request: RequestIngest,
+    service: Service = Depends(get_service)
+) -> dict:
+    """
+    Appends keyframes and their embeddings, then swaps every index to the new
+    version; queries in flight finish on the previous one.
+
+    Args:
+        request (RequestIngest): The keyframes and the embedding files per model.
+        service (Service): The service instance owning the indexes.
+
+    Returns:
+        dict: The new index paths, the new JSON path and the keyframe count.
+
+    Raises:
+        HTTPException: If the input is inconsistent or an error occurs.
+    """
+    try:
+        embeddings = {
+            model_type: await service.executor.run(
+                "admin", np.load, service.index_admin.resolve_path(path)
+            )
+            for model_type, path in request.embeddings.items()
+        }
+        return await service.index_admin.ingest(
+            records=request.records,
+            embeddings=embeddings,
+            output_dir=request.output_dir
+        )
+    except (ValueError, KeyError, OSError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)) from e
+
+
+@admin_router.post(
+    "/reload",
+    status_code=status.HTTP_200_OK
+)
+async def reload(
+    request: RequestReload,
+    service: Service = Depends(get_service)
+) -> dict:
+    """
+    Switches models to index versions built offline, with an optional newer
+    keyframe mapping.
+
+    Args:
+        request (RequestReload): The new index path per model and JSON path.
+        service (Service): The service instance owning the indexes.
+
+    Returns:
+        dict: The current index versions.
+
+    Raises:
+        HTTPException: If a version is invalid or an error occurs.
+    """
+    try:
+        return await service.index_admin.reload(
+            faiss_urls=request.faiss,
+            json_url=request.json_path
+        )
+    except (ValueError, OSError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)) from e
+
+
+@admin_router.get(
+    "/indexVersions",
+    status_code=status.HTTP_200_OK
+)
+async def index_versions(
+    service: Service = Depends(get_service)
+) -> dict:
+    """
+    Reports the current index version of every model.
+
+    Args:
+        service (Service): The service instance owning the indexes.
+
+    Returns:
+        dict: The index path and vector count per model.
+    """
+    return service.index_admin.versions()
@@ -2,40 +2,95 @@
 This module defines a FastAPI router for handling clip text retrieval requests.
 """
 import copy
-import io
+import hashlib
+import json
 import time
+from typing import Dict, List, Optional, Type
 from fastapi import (status,
                      Depends,
                      APIRouter,
                      HTTPException,
                      UploadFile,
                      File)
+from fastapi.responses import StreamingResponse
 
 from src.api.schemas.clip import (RequestClipText,
+                                  RequestKeyframe,
                                   ResponseClip,
                                   ListResponseClip,
+                                  ListResponseTextClip,
                                   MultiEventRequest,
+                                  MultiEventSequenceRequest,
+                                  ResponseSequence,
+                                  ListResponseSequence,
                                   MultiModalResquest)
 from src.services.service import Service
 from src.api.dependencies.dependency import get_service
 from src.utils.utility import count_non_empty_fields
 
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 clip_router = APIRouter(
     tags=["Clip"],
     prefix="/clip",
 )
 
 
+def list_response(
+    service: Service,
+    result: List[Dict],
+    page_size: Optional[int] = None,
+    response_class: Type[ListResponseClip] = ListResponseClip,
+    **fields
+) -> ListResponseClip:
+    """
+    Builds the response of a search: every result, or with a page size the
+    first page, the cursor of the next one and the number of results.
+
+    Args:
+        service (Service): The service instance keeping the result cursors.
+        result (List[Dict]): The ranked results.
+        page_size (int): The page size, or None for every result.
+        response_class (Type[ListResponseClip]): The response schema.
+        **fields: Other fields of the response.
+
+    Returns:
+        ListResponseClip: The response.
+
+    Raises:
+        ValueError: If the page size is negative.
+    """
+    if page_size is None:
+        return response_class(
+            data=[
+                ResponseClip(**record) for record in result
+            ],
+            **fields
+        )
+    if page_size < 0:
+        raise ValueError("page_size must not be negative")
+    cursor, _ = service.result_cursors.create(result)
+    page, cursor, total = service.result_cursors.page(cursor, page_size)
+    return response_class(
+        data=[
+            ResponseClip(**record) for record in page
+        ],
+        cursor=cursor,
+        total=total,
+        **fields
+    )
+
+
 @clip_router.post(
     '/clipTextRetrieval',
     status_code=status.HTTP_200_OK,
-    response_model=ListResponseClip
+    response_model=ListResponseTextClip
 )
 async def clip_text_retrieval(
     request: RequestClipText,
     service: Service = Depends(get_service)
-) -> ListResponseClip:
+) -> ListResponseTextClip:
     """
     Retrieves relevant text clips based on the provided query.
 
@@ -44,7 +99,8 @@ async def clip_text_retrieval(
         service (Service): The service instance to handle the clip retrieval logic.
 
     Returns:
-        ListResponseClipText: A list of text clips relevant to the input query.
+        ListResponseTextClip: A list of text clips relevant to the input query, with
+        the per-model timings of an ensemble.
 
     Raises:
         HTTPException: If the input text query is missing or an error occurs during processing.
@@ -56,16 +112,35 @@ async def clip_text_retrieval(
         )
     try:
         a = time.time()
+        model_types = service.text_clip_retrieval.ensemble_models(request.model_type)
+        if model_types is not None:
+            result, timings = await service.text_clip_retrieval.ensemble_text_retrieval(
+                model_types=model_types,
+                text=request.text,
+                top_k=request.top_k,
+                min_score=request.min_score,
+                search_mode=request.search_mode,
+                fusion=request.fusion,
+                weights=request.weights,
+                rrf_k=request.rrf_k
+            )
+            return list_response(
+                service, result, request.page_size, ListResponseTextClip, timings=timings
+            )
         result = await service.text_clip_retrieval.text_retrieval(
             model_type=request.model_type,
-            text=request.text
+            text=request.text,
+            top_k=request.top_k,
+            min_score=request.min_score,
+            search_mode=request.search_mode
         )
         print(time.time() - a)
-        return ListResponseClip(
-            data=[
-                ResponseClip(**record) for record in result
-            ]
-        )
+        return list_response(service, result, request.page_size, ListResponseTextClip)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -79,6 +154,10 @@ async def clip_text_retrieval(
 async def search_by_image(
     model_type: str,
     file: UploadFile = File(...),
+    top_k: Optional[int] = None,
+    min_score: Optional[float] = None,
+    search_mode: str = "knn",
+    page_size: Optional[int] = None,
     service: Service = Depends(get_service)
 ) -> ListResponseClip:
     """
@@ -86,6 +165,10 @@ async def search_by_image(
 
     Args:
         file (UploadFile): The image file to search with.
+        top_k (int): The number of results, defaulting to the service top_k.
+        min_score (float): Drops results scoring below it; the radius in range mode.
+        search_mode (str): "knn" or "range".
+        page_size (int): Returns only the first page and a cursor to the rest.
         service (Service): The service instance used for performing the search.
 
     Returns:
@@ -99,20 +182,34 @@ async def search_by_image(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Image is required"
         )
+    max_upload_bytes = service.image_preprocessor.max_upload_bytes
+    contents = bytearray()
+    digest = hashlib.blake2b(digest_size=16)
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        contents.extend(chunk)
+        digest.update(chunk)
+        if len(contents) > max_upload_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Image is larger than {max_upload_bytes} bytes"
+            )
     try:
         a = time.time()
-        contents = await file.read()
-        image_stream = io.BytesIO(contents)
         result = await service.image_clip_retrieval.image_retrieval(
             model_type=model_type,
-            image=image_stream
+            image=bytes(contents),
+            image_hash=digest.hexdigest(),
+            top_k=top_k,
+            min_score=min_score,
+            search_mode=search_mode
         )
         print(time.time() - a)
-        return ListResponseClip(
-            data=[
-                ResponseClip(**record)for record in result
-            ]
-        )
+        return list_response(service, result, page_size)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -120,6 +217,61 @@ async def search_by_image(
         ) from e
 
 
+@clip_router.post(
+    "/searchByKeyframe",
+    status_code=status.HTTP_200_OK,
+    response_model=ListResponseClip)
+async def search_by_keyframe(
+    request: RequestKeyframe,
+    service: Service = Depends(get_service)
+) -> ListResponseClip:
+    """
+    Perform a search with a keyframe that is already indexed ("more like this").
+    The stored vector is read from the index, so nothing is uploaded or re-encoded.
+
+    Args:
+        request (RequestKeyframe): The model type and the keyframe, given as
+            (video_id, frame_id) or as its FAISS id.
+        service (Service): The service instance used for performing the search.
+
+    Returns:
+        ListResponseClip: An object containing the search results.
+
+    Raises:
+        HTTPException: If the keyframe is missing or unknown, or an error occurs.
+    """
+    if request.indice is None and (not request.video_id or not request.frame_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either indice or video_id and frame_id are required"
+        )
+    try:
+        result = await service.image_clip_retrieval.keyframe_retrieval(
+            model_type=request.model_type,
+            video_id=request.video_id,
+            frame_id=request.frame_id,
+            indice=request.indice,
+            top_k=request.top_k,
+            min_score=request.min_score,
+            search_mode=request.search_mode
+        )
+        return list_response(service, result, request.page_size)
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e.args[0]) if e.args else "Keyframe not found"
+        ) from e
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)) from e
+
+
 @clip_router.post(
     "/multiEventSearch",
     status_code=status.HTTP_200_OK,
@@ -140,14 +292,72 @@ async def multi_event_search(
         a = time.time()
         result = await service.multi_event_retrieval.multi_event_search(
             model_type=request.model_type,
-            list_event=request.list_event
+            list_event=request.list_event,
+            top_k=request.top_k,
+            min_score=request.min_score,
+            search_mode=request.search_mode,
+            cascade=request.cascade
         )
         print(time.time() - a)
-        return ListResponseClip(
+        return list_response(service, result, request.page_size)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)) from e
+
+
+@clip_router.post(
+    "/multiEventSequence",
+    status_code=status.HTTP_200_OK,
+    response_model=ListResponseSequence
+)
+async def multi_event_sequence(
+    request: MultiEventSequenceRequest,
+    service: Service = Depends(get_service)
+) -> ListResponseSequence:
+    """
+    Rank videos by their best chain of frames matching the events in order.
+    """
+    if not request.list_event:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="List of events is required"
+        )
+    if request.max_gap is not None and request.max_gap <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="max_gap must be positive"
+        )
+    try:
+        result = await service.multi_event_retrieval.multi_event_sequence_search(
+            model_type=request.model_type,
+            list_event=request.list_event,
+            top_k=request.top_k,
+            min_score=request.min_score,
+            search_mode=request.search_mode,
+            max_gap=request.max_gap,
+            top_sequences=request.top_sequences,
+            cascade=request.cascade
+        )
+        return ListResponseSequence(
             data=[
-                ResponseClip(**record) for record in result
+                ResponseSequence(
+                    video_id=sequence["video_id"],
+                    score=sequence["score"],
+                    frames=[ResponseClip(**record) for record in sequence["frames"]]
+                ) for sequence in result
             ]
         )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -193,13 +403,12 @@ async def multi_modal_search(
             result = await service.multi_event_retrieval.multi_event_search_with_non_text(
                 list_ocr=list_ocr,
                 list_asr=list_asr,
-                priority=request.priority
-            )
-            return ListResponseClip(
-                data=[
-                    ResponseClip(**record) for record in result
-                ]
+                priority=request.priority,
+                fusion=request.fusion or "intersection",
+                weights=request.weights,
+                rrf_k=request.rrf_k
             )
+            return list_response(service, result, request.page_size)
 
         if request.text:
             result = await service.multi_event_retrieval.multi_modal_search(
@@ -207,15 +416,154 @@ async def multi_modal_search(
                 text=request.text,
                 list_ocr=request.list_ocr,
                 list_asr=request.list_asr,
-                priority=request.priority
-            )
-            return ListResponseClip(
-                data=[
-                    ResponseClip(**record) for record in result
-                ]
+                priority=request.priority,
+                fusion=request.fusion or "temporal",
+                weights=request.weights,
+                rrf_k=request.rrf_k
             )
+            return list_response(service, result, request.page_size)
 
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)) from e
+
+
+@clip_router.get(
+    "/results",
+    status_code=status.HTTP_200_OK,
+    response_model=ListResponseClip
+)
+async def result_page(
+    cursor: str,
+    page_size: int = 100,
+    service: Service = Depends(get_service)
+) -> ListResponseClip:
+    """
+    Gets a page of the results of a paginated search from its cursor, without
+    searching again.
+
+    Args:
+        cursor (str): The cursor returned with the previous page.
+        page_size (int): The maximum number of results in the page.
+        service (Service): The service instance keeping the result cursors.
+
+    Returns:
+        ListResponseClip: The page, the cursor of the next one and the number of results.
+
+    Raises:
+        HTTPException: If the cursor is malformed, or expired (404).
+    """
+    try:
+        page, next_cursor, total = service.result_cursors.page(cursor, page_size)
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e.args[0])
+        ) from e
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+    return ListResponseClip(
+        data=[
+            ResponseClip(**record) for record in page
+        ],
+        cursor=next_cursor,
+        total=total
+    )
+
+
+@clip_router.get(
+    "/results/stream",
+    status_code=status.HTTP_200_OK
+)
+async def result_stream(
+    cursor: str,
+    service: Service = Depends(get_service)
+) -> StreamingResponse:
+    """
+    Streams the results of a paginated search from its cursor to the end as
+    NDJSON, one result per line, mapping them a chunk at a time while sending.
+
+    Args:
+        cursor (str): A cursor of the search, e.g. from a request with page_size 0.
+        service (Service): The service instance keeping the result cursors.
+
+    Returns:
+        StreamingResponse: The application/x-ndjson stream.
+
+    Raises:
+        HTTPException: If the cursor is malformed, or expired (404).
+    """
+    try:
+        chunks = service.result_cursors.stream(cursor)
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e.args[0])
+        ) from e
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+
+    def lines():
+        for chunk in chunks:
+            yield "".join(
+                json.dumps({
+                    "frame_id": record["frame_id"],
+                    "video_id": record["video_id"],
+                    "score": record.get("score")
+                }) + "\n" for record in chunk
+            )
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@clip_router.get(
+    "/cacheStats",
+    status_code=status.HTTP_200_OK
+)
+async def cache_stats(
+    service: Service = Depends(get_service)
+) -> dict:
+    """
+    Reports the hit/miss counters and memory use of the embedding caches.
+
+    Args:
+        service (Service): The service instance owning the caches.
+
+    Returns:
+        dict: The counters of each cache.
+    """
+    return {
+        "text": service.text_cache.stats(),
+        "image": service.image_cache.stats(),
+        "results": service.result_cursors.stats()
+    }
+
+
+@clip_router.get(
+    "/modelStats",
+    status_code=status.HTTP_200_OK
+)
+async def model_stats(
+    service: Service = Depends(get_service)
+) -> dict:
+    """
+    Reports which models are loaded and the memory each one holds.
+
+    Args:
+        service (Service): The service instance owning the model manager.
+
+    Returns:
+        dict: The state of each model.
+    """
+    return service.model_manager.stats()
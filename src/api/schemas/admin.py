@@ -0,0 +1,29 @@
+"""
+Schemas for the index administration API.
+"""
+
+from typing import (List,
+                    Dict,
+                    Optional)
+from pydantic import BaseModel
+
+
+class RequestIngest(BaseModel):
+    """
+    Request schema for appending keyframes to the live indexes.
+    `embeddings` maps every model type to a server-side (n, d) `.npy` file whose
+    rows follow the order of `records`. Paths are relative to, and must lie
+    under, the index version directory.
+    """
+    records: List[Dict]
+    embeddings: Dict[str, str]
+    output_dir: Optional[str] = None
+
+
+class RequestReload(BaseModel):
+    """
+    Request schema for switching to index versions built offline. Paths are
+    relative to, and must lie under, the index version directory.
+    """
+    faiss: Dict[str, str] = {}
+    json_path: Optional[str] = None
@@ -3,16 +3,32 @@ Schemas for clip text retrieval API.
 """
 
 from typing import (List,
-                    Dict)
+                    Dict,
+                    Optional,
+                    Union)
 from pydantic import BaseModel
 
 
 class RequestClipText(BaseModel):
     """
     Request schema for clip text retrieval.
+    `top_k` defaults to the service TOP_K and is clamped to MAX_TOP_K (MAX_RANGE_RESULTS
+    in range mode); `min_score` drops weaker results and is the radius of a "range" search.
+    `page_size` returns only the first page of the results and a cursor to the rest.
+    `model_type` "ensemble" or a list of model types searches with each model
+    concurrently and fuses the results by `fusion`: "rrf" (reciprocal-rank fusion,
+    offset `rrf_k`) or "weighted_sum" (of the per-model normalized scores), with
+    the per-model `weights`.
     """
-    model_type: str
+    model_type: Union[str, List[str]]
     text: str
+    top_k: Optional[int] = None
+    min_score: Optional[float] = None
+    search_mode: str = "knn"
+    fusion: str = "rrf"
+    weights: Optional[Dict[str, float]] = None
+    rrf_k: int = 60
+    page_size: Optional[int] = None
 
 
 class ResponseClip(BaseModel):
@@ -21,25 +37,95 @@ class ResponseClip(BaseModel):
     """
     frame_id: str
     video_id: str
+    score: Optional[float] = None
 
 
 class ListResponseClip(BaseModel):
     """
     Response schema for a list of text clips.
+    A paginated search returns one page, the `cursor` of the next page (None
+    after the last one) and the `total` number of results.
     """
     data: List[ResponseClip]
+    cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class ListResponseTextClip(ListResponseClip):
+    """
+    Response schema for text retrieval; an ensemble also reports the
+    milliseconds each model took.
+    """
+    timings: Optional[Dict[str, float]] = None
+
+class RequestKeyframe(BaseModel):
+    """
+    Request schema for searching with an indexed keyframe.
+    Either `indice` or both `video_id` and `frame_id` are required.
+    """
+    model_type: str
+    video_id: Optional[str] = None
+    frame_id: Optional[str] = None
+    indice: Optional[int] = None
+    top_k: Optional[int] = None
+    min_score: Optional[float] = None
+    search_mode: str = "knn"
+    page_size: Optional[int] = None
+
 
 class MultiEventRequest(BaseModel):
     """
+    `cascade` searches the first event globally and each later one only in the
+    frames of the videos still matching, after the earliest base match.
+    `page_size` returns only the first page of the results and a cursor to the rest.
     """
     model_type: str
     list_event: List[str]
+    top_k: Optional[int] = None
+    min_score: Optional[float] = None
+    search_mode: str = "knn"
+    cascade: bool = False
+    page_size: Optional[int] = None
+
+class MultiEventSequenceRequest(MultiEventRequest):
+    """
+    Request schema for ranked multi-event sequences. Events are in temporal order;
+    `max_gap` bounds the frame-number gap between consecutive events.
+    Sequences are not paginated; `page_size` is ignored.
+    """
+    max_gap: Optional[int] = None
+    top_sequences: int = 100
+
+
+class ResponseSequence(BaseModel):
+    """
+    Response schema for one ranked sequence: one frame per event of a video.
+    """
+    video_id: str
+    score: float
+    frames: List[ResponseClip]
+
+
+class ListResponseSequence(BaseModel):
+    """
+    Response schema for a list of ranked sequences.
+    """
+    data: List[ResponseSequence]
 
 class MultiModalResquest(BaseModel):
     """
+    `fusion` combines the sources named in `priority`: "intersection", "union",
+    "priority", "rrf" (weighted reciprocal-rank fusion by source name in
+    `weights`, offset `rrf_k`) or "temporal". It defaults to "temporal" with a
+    text and to "intersection" without.
+    `page_size` returns only the first page of the results and a cursor to the rest.
     """
     model_type: str
     text: str
     list_ocr: List[Dict]
     list_asr: List[Dict]
     priority: List[str]
+    fusion: Optional[str] = None
+    weights: Optional[Dict[str, float]] = None
+    rrf_k: int = 60
+    page_size: Optional[int] = None
@@ -2,27 +2,42 @@
 This module is used for Apple CLIP model-based text and image embedding.
 """
 
+from typing import Callable, List, Tuple
 import torch
 from torch import device, Tensor
 import torch.nn.functional as F
-from PIL import Image
 from open_clip.factory import (create_model,
                                image_transform_v2,
                                get_tokenizer)
 
+from src.modules.base_clip import BaseCLIP
+from src.modules.embedding_cache import EmbeddingCache
+from src.modules.image_preprocessor import OpenClipTransform
+from src.modules.cpu_text_encoder import OpenClipTextTower
+from src.utils.executor import InferenceExecutor
 
-class AppleCLIP:
+
+class AppleCLIP(BaseCLIP):
     """
     A class for handling text and image embeddings using a CLIP model.
     Provides methods to generate embeddings for text and images.
     """
 
+    model_type = "apple_clip"
+
     def __init__(
         self,
         model: create_model,
         processor: image_transform_v2,
         tokenizer: get_tokenizer,
-        device_type: device
+        device_type: device,
+        batch_size: int = 32,
+        batch_wait_ms: float = 5.0,
+        executor: InferenceExecutor = None,
+        text_cache: EmbeddingCache = None,
+        text_encoder_mode: str = "default",
+        text_encoder_path: str = None,
+        loader: Callable[[], Tuple] = None
     ) -> None:
         """
         Initialize the AppleCLIP class.
@@ -32,50 +47,96 @@ class AppleCLIP:
             processor (image_transform_v2): The image transformation function.
             tokenizer (get_tokenizer): The tokenizer for processing text inputs.
             device_type (device): The device on which the model will run (e.g., CPU or GPU).
+            batch_size (int): The maximum number of queued texts encoded in one pass.
+            batch_wait_ms (float): How long a text query waits for others to batch with.
+            executor (InferenceExecutor): The executor running the blocking forward passes.
+            text_cache (EmbeddingCache): Optional cache of query text embeddings.
+            text_encoder_mode (str): "default", "int8" (exported TorchScript text tower)
+                or "bf16" (CPU bfloat16 autocast).
+            text_encoder_path (str): The exported text tower, required for "int8".
+            loader (Callable[[], Tuple]): Optional function returning
+                `(model, processor, tokenizer)` for lazy loading.
         """
-        self._model = model
-        self._processor = processor
-        self._tokenizer = tokenizer
-        self._device_type = device_type
+        super().__init__(
+            model=model,
+            processor=processor,
+            tokenizer=tokenizer,
+            device_type=device_type,
+            batch_size=batch_size,
+            batch_wait_ms=batch_wait_ms,
+            executor=executor,
+            text_cache=text_cache,
+            text_encoder_mode=text_encoder_mode,
+            text_encoder_path=text_encoder_path,
+            loader=loader
+        )
 
-    async def text_embedding(
+    def encode_texts(
         self,
-        text: str
+        texts: List[str]
     ) -> Tensor:
         """
-        Generate a text embedding using the CLIP model.
+        Generate text embeddings for a batch of texts using the CLIP model.
 
         Args:
-            text (str): The input text to be encoded.
+            texts (List[str]): The input texts to be encoded.
 
         Returns:
-            Tensor: The normalized text embedding as a PyTorch tensor.
+            Tensor: The normalized text embeddings, one row per input text.
         """
-        text = self._tokenizer(
-            text,
+        tokens = self._tokenizer(
+            texts,
             context_length=self._model.context_length
-        ).to(self._device_type)
-        with torch.no_grad(), torch.cuda.amp.autocast():
-            text_features = self._model.encode_text(text)
+        )
+        if self._text_model is not None:
+            with torch.no_grad():
+                return self._text_model(tokens)
+        tokens = tokens.to(self._device_type)
+        with torch.no_grad(), self._autocast(text=True):
+            text_features = self._model.encode_text(tokens)
             text_features = F.normalize(text_features, dim=-1)
         return text_features
 
-    async def image_embedding(
+    def text_tower(self) -> Tuple[OpenClipTextTower, tuple]:
+        """
+        Get the text tower and example inputs used to export a CPU text encoder.
+
+        Returns:
+            Tuple[OpenClipTextTower, tuple]: The text tower and example token inputs.
+        """
+        tokens = self._tokenizer(
+            ["a photo of a dog", "a person riding a bicycle"],
+            context_length=self._model.context_length
+        )
+        return OpenClipTextTower(self._model), (tokens,)
+
+    def image_transform(self) -> Tuple[OpenClipTransform, int]:
+        """
+        Get the picklable image transform and input size for the preprocessing pool.
+
+        Returns:
+            Tuple[OpenClipTransform, int]: The transform and the input resolution.
+        """
+        image_size = self._model.visual.image_size
+        if isinstance(image_size, (tuple, list)):
+            image_size = min(image_size)
+        return OpenClipTransform(self._processor), image_size
+
+    def encode_image(
         self,
-        image
+        pixel_values: Tensor
     ) -> Tensor:
         """
-        Generate an image embedding using the CLIP model.
+        Generate image embeddings for a batch of preprocessed images using the CLIP model.
 
         Args:
-            image: The input image file (path or file-like object) to be encoded.
+            pixel_values (Tensor): The stacked model inputs with shape (n, 3, H, W).
 
         Returns:
-            Tensor: The normalized image embedding as a PyTorch tensor.
+            Tensor: The normalized image embeddings as a PyTorch tensor.
         """
-        image = Image.open(image).convert("RGB")
-        image = self._processor(image).unsqueeze(0).to(self._device_type)
-        with torch.no_grad(), torch.cuda.amp.autocast():
-            image_features = self._model.encode_image(image)
+        pixel_values = pixel_values.to(self._device_type)
+        with torch.no_grad(), self._autocast():
+            image_features = self._model.encode_image(pixel_values)
             image_features = F.normalize(image_features, dim=-1)
         return image_features
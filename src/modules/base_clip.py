@@ -0,0 +1,326 @@
+"""
+This module provides the shared base for the CLIP encoder wrappers.
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+import torch
+from torch import device, Tensor
+
+from src.modules.text_batcher import TextBatcher
+from src.modules.embedding_cache import EmbeddingCache, normalize_text
+from src.modules.cpu_text_encoder import (TEXT_ENCODER_MODES,
+                                          load_text_encoder)
+from src.utils.executor import InferenceExecutor
+
+
+class BaseCLIP(ABC):
+    """
+    Shared plumbing for the CLIP encoder wrappers.
+    Subclasses implement the blocking forward passes in `encode_texts` and
+    `encode_image`, plus `text_tower` and `image_transform`; the async API
+    runs them on the model's executor pool.
+    """
+
+    model_type = "clip"
+    cuda_autocast = True
+
+    def __init__(
+        self,
+        model,
+        processor,
+        tokenizer,
+        device_type: device,
+        batch_size: int = 32,
+        batch_wait_ms: float = 5.0,
+        executor: Optional[InferenceExecutor] = None,
+        text_cache: Optional[EmbeddingCache] = None,
+        text_encoder_mode: str = "default",
+        text_encoder_path: Optional[str] = None,
+        loader: Optional[Callable[[], Tuple]] = None
+    ) -> None:
+        """
+        Initialize the BaseCLIP class.
+
+        Args:
+            model: The CLIP model to be used for encoding, or None to load it later.
+            processor: The image processor or transformation function.
+            tokenizer: The tokenizer for processing text inputs.
+            device_type (device): The device on which the model will run (e.g., CPU or GPU).
+            batch_size (int): The maximum number of queued texts encoded in one pass.
+            batch_wait_ms (float): How long a text query waits for others to batch with.
+            executor (InferenceExecutor): The executor whose `model_type` pool runs
+                the blocking forward passes.
+            text_cache (EmbeddingCache): Optional cache of query text embeddings
+                keyed by model type, text encoder mode and normalized text.
+            text_encoder_mode (str): "default" runs the full model, "int8" runs the
+                exported int8 TorchScript text tower on CPU and "bf16" runs the
+                text tower under CPU bfloat16 autocast.
+            text_encoder_path (str): The exported text tower, required for "int8".
+            loader (Callable[[], Tuple]): Optional blocking function returning
+                `(model, processor, tokenizer)`, used by `load` to (re)load the
+                weights on demand.
+        """
+        self._loader = loader
+        self._model = model
+        self._processor = processor
+        self._tokenizer = tokenizer
+        self._device_type = torch.device(device_type)
+        self._executor = executor or InferenceExecutor()
+        self._text_cache = text_cache
+        self._text_encoder_mode = "default"
+        self._text_model = None
+        self.set_text_encoder_mode(
+            mode=text_encoder_mode,
+            path=text_encoder_path
+        )
+        self._batcher = TextBatcher(
+            encode_fn=self.encode_texts,
+            max_batch_size=batch_size,
+            max_wait_ms=batch_wait_ms,
+            executor=self._executor,
+            pool_name=self.model_type
+        )
+
+    @property
+    def is_loaded(self) -> bool:
+        """
+        Whether the model weights are in memory.
+        """
+        return self._model is not None
+
+    def memory_bytes(self) -> int:
+        """
+        Get the memory held by the model parameters and buffers.
+
+        Returns:
+            int: The number of bytes, or 0 when the model is not loaded.
+        """
+        if self._model is None:
+            return 0
+        tensors = list(self._model.parameters()) + list(self._model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def load(self) -> int:
+        """
+        Load the model weights with the loader if they are not in memory.
+        Blocking; run it on the model's executor pool.
+
+        Returns:
+            int: The memory held by the model in bytes.
+        """
+        if self._model is None:
+            if self._loader is None:
+                raise RuntimeError(f"{self.model_type} has no loader")
+            self._model, self._processor, self._tokenizer = self._loader()
+        return self.memory_bytes()
+
+    def unload(self) -> None:
+        """
+        Release the model weights; `load` brings them back.
+        """
+        if self._loader is None:
+            raise RuntimeError(f"{self.model_type} cannot be reloaded once unloaded")
+        self._model = None
+        if self._device_type.type == "cuda":
+            torch.cuda.empty_cache()
+
+    def set_text_encoder_mode(
+        self,
+        mode: str,
+        path: Optional[str] = None
+    ) -> None:
+        """
+        Select how text queries are encoded.
+
+        Args:
+            mode (str): "default", "int8" or "bf16".
+            path (str): The exported text tower, required for "int8".
+        """
+        if mode not in TEXT_ENCODER_MODES:
+            raise ValueError(f"Unknown text encoder mode: {mode}")
+        text_model = None
+        if mode == "int8":
+            if not path:
+                raise ValueError("The int8 text encoder mode needs an exported text tower")
+            text_model = load_text_encoder(path)
+        self._text_encoder_mode = mode
+        self._text_model = text_model
+
+    def _cache_key(
+        self,
+        text: str
+    ) -> Tuple[str, str]:
+        """
+        Get the text cache key of a normalized text under the current text
+        encoder mode, since "int8" and "bf16" embeddings differ from the full
+        model's. "default" keeps the bare model type, so embeddings persisted
+        before modes were keyed stay valid.
+
+        Args:
+            text (str): The normalized text.
+
+        Returns:
+            Tuple[str, str]: The `(model type and mode, text)` key.
+        """
+        if self._text_encoder_mode == "default":
+            return self.model_type, text
+        return f"{self.model_type}:{self._text_encoder_mode}", text
+
+    def _autocast(
+        self,
+        text: bool = False
+    ):
+        """
+        Get the mixed-precision context for a forward pass.
+
+        Args:
+            text (bool): Whether the pass runs the text tower, which honours the
+                "bf16" text encoder mode on CPU.
+
+        Returns:
+            A context manager: fp16 autocast on CUDA (for models that use it),
+            bf16 autocast for CPU text passes in "bf16" mode, and a no-op otherwise.
+        """
+        if self._device_type.type == "cuda":
+            if self.cuda_autocast:
+                return torch.autocast(device_type="cuda")
+            return nullcontext()
+        if text and self._text_encoder_mode == "bf16":
+            return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+        return nullcontext()
+
+    @abstractmethod
+    def encode_texts(
+        self,
+        texts: List[str]
+    ) -> Tensor:
+        """
+        Encode a list of texts in one blocking forward pass.
+
+        Args:
+            texts (List[str]): The input texts to be encoded.
+
+        Returns:
+            Tensor: The text embeddings with one row per input text.
+        """
+
+    @abstractmethod
+    def text_tower(self) -> Tuple[torch.nn.Module, tuple]:
+        """
+        Get the text tower and example inputs used to export a CPU text encoder.
+
+        Returns:
+            Tuple[torch.nn.Module, tuple]: The text tower and example token inputs.
+        """
+
+    @abstractmethod
+    def image_transform(self) -> Tuple[Callable, int]:
+        """
+        Get the picklable image transform and input size for the preprocessing pool.
+
+        Returns:
+            Tuple[Callable, int]: The transform and the input resolution.
+        """
+
+    @abstractmethod
+    def encode_image(
+        self,
+        pixel_values: Tensor
+    ) -> Tensor:
+        """
+        Encode a batch of preprocessed images in a blocking forward pass.
+
+        Args:
+            pixel_values (Tensor): The stacked model inputs with shape (n, 3, H, W).
+
+        Returns:
+            Tensor: The image embeddings with one row per image.
+        """
+
+    async def text_embedding(
+        self,
+        text: str
+    ) -> Tensor:
+        """
+        Generate a text embedding, batched with concurrent queries to the same model.
+        Cached embeddings are returned without running the model.
+
+        Args:
+            text (str): The input text to be encoded.
+
+        Returns:
+            Tensor: The text embedding as a PyTorch tensor of shape (1, d).
+        """
+        text = normalize_text(text)
+        if self._text_cache is None:
+            return await self._batcher.submit(text)
+        key = self._cache_key(text)
+        cached = await self._text_cache.fetch(key)
+        if cached is not None:
+            return torch.from_numpy(cached.copy())
+        text_features = await self._batcher.submit(text)
+        if self._cache_key(text) == key:
+            # Skipped if the mode changed while the text was encoded.
+            self._text_cache.put(key, text_features.detach().float().cpu().numpy())
+        return text_features
+
+    async def text_embeddings(
+        self,
+        texts: List[str]
+    ) -> Tensor:
+        """
+        Generate embeddings for a list of texts in one forward pass.
+        Cached texts are served from the cache; only the misses are encoded.
+
+        Args:
+            texts (List[str]): The input texts to be encoded.
+
+        Returns:
+            Tensor: A float32 CPU tensor of shape (len(texts), d).
+        """
+        texts = [normalize_text(text) for text in texts]
+        rows = [None] * len(texts)
+        keys = {text: self._cache_key(text) for text in texts}
+        if self._text_cache is not None:
+            for i, text in enumerate(texts):
+                rows[i] = await self._text_cache.fetch(keys[text])
+        missing = list(dict.fromkeys(
+            text for text, row in zip(texts, rows) if row is None
+        ))
+        if missing:
+            text_features = await self._executor.run(
+                self.model_type,
+                self.encode_texts,
+                missing
+            )
+            text_features = text_features.detach().float().cpu().numpy()
+            encoded = {}
+            for text, vector in zip(missing, text_features):
+                encoded[text] = vector[None, :]
+                if self._text_cache is not None and self._cache_key(text) == keys[text]:
+                    self._text_cache.put(keys[text], encoded[text])
+            rows = [encoded[text] if row is None else row
+                    for text, row in zip(texts, rows)]
+        return torch.from_numpy(np.concatenate(rows, axis=0))
+
+    async def image_embedding(
+        self,
+        pixel_values: Tensor
+    ) -> Tensor:
+        """
+        Generate image embeddings on the model's executor pool.
+
+        Args:
+            pixel_values (Tensor): The stacked model inputs with shape (n, 3, H, W).
+
+        Returns:
+            Tensor: The image embeddings as a PyTorch tensor of shape (n, d).
+        """
+        return await self._executor.run(
+            self.model_type,
+            self.encode_image,
+            pixel_values
+        )
@@ -0,0 +1,116 @@
+"""
+This module builds and loads CPU-optimized text encoders: the CLIP text
+towers traced with TorchScript, optionally with int8 dynamically quantized
+linear layers.
+"""
+
+from typing import Optional
+
+import torch
+from torch import nn, Tensor
+import torch.nn.functional as F
+
+TEXT_ENCODER_MODES = ("default", "int8", "bf16")
+
+
+class OpenClipTextTower(nn.Module):
+    """
+    The text half of an open_clip model, returning normalized embeddings.
+    """
+
+    def __init__(self, model: nn.Module) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, tokens: Tensor) -> Tensor:
+        return F.normalize(self.model.encode_text(tokens), dim=-1)
+
+
+class HFClipTextTower(nn.Module):
+    """
+    The text half of a Hugging Face CLIPModel.
+    """
+
+    def __init__(self, model: nn.Module) -> None:
+        super().__init__()
+        self.text_model = model.text_model
+        self.text_projection = model.text_projection
+
+    def forward(self, input_ids: Tensor, attention_mask: Tensor) -> Tensor:
+        outputs = self.text_model(
+            input_ids=input_ids,
+            attention_mask=attention_mask
+        )
+        return self.text_projection(outputs[1])
+
+
+def quantize_text_tower(tower: nn.Module) -> nn.Module:
+    """
+    Apply int8 dynamic quantization to the linear layers of a text tower.
+
+    Args:
+        tower (nn.Module): The fp32 text tower on CPU.
+
+    Returns:
+        nn.Module: The quantized text tower.
+    """
+    return torch.ao.quantization.quantize_dynamic(
+        tower.eval(),
+        {nn.Linear},
+        dtype=torch.qint8
+    )
+
+
+def export_text_tower(
+    tower: nn.Module,
+    example_inputs: tuple,
+    output_path: str,
+    quantize: bool = True,
+    onnx_path: Optional[str] = None
+) -> torch.jit.ScriptModule:
+    """
+    Trace a text tower with TorchScript and save it, optionally quantized.
+
+    Args:
+        tower (nn.Module): The fp32 text tower on CPU.
+        example_inputs (tuple): Example token tensors used for tracing.
+        output_path (str): Where the TorchScript file is written.
+        quantize (bool): Whether to apply int8 dynamic quantization first.
+        onnx_path (str): Optional path of an fp32 ONNX export of the tower.
+
+    Returns:
+        torch.jit.ScriptModule: The traced text tower.
+    """
+    tower = tower.cpu().float().eval()
+    if onnx_path:
+        # ONNX runtimes apply their own quantization, so export the fp32 graph.
+        input_names = ["input_ids", "attention_mask"][:len(example_inputs)]
+        torch.onnx.export(
+            tower,
+            example_inputs,
+            onnx_path,
+            input_names=input_names,
+            output_names=["text_features"],
+            dynamic_axes={name: {0: "batch"} for name in input_names},
+            opset_version=17
+        )
+    if quantize:
+        tower = quantize_text_tower(tower)
+    with torch.no_grad():
+        traced = torch.jit.trace(tower, example_inputs, check_trace=False)
+    traced = torch.jit.freeze(traced)
+    traced.save(output_path)
+    return traced
+
+
+def load_text_encoder(path: str) -> torch.jit.ScriptModule:
+    """
+    Load an exported text tower for CPU inference.
+
+    Args:
+        path (str): The path of the TorchScript file.
+
+    Returns:
+        torch.jit.ScriptModule: The text tower in eval mode.
+    """
+    return torch.jit.load(path, map_location="cpu").eval()
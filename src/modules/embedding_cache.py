@@ -0,0 +1,239 @@
+"""
+This module implements a memory-bounded LRU cache for query embeddings.
+"""
+
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import (Dict,
+                    Hashable,
+                    Optional,
+                    Tuple)
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a query text for cache lookups.
+
+    Both CLIP tokenizers lowercase and collapse whitespace, so texts that only
+    differ in case or spacing produce the same embedding.
+
+    Args:
+        text (str): The raw query text.
+
+    Returns:
+        str: The normalized text.
+    """
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """
+    An LRU cache of embeddings bounded by entry count and by bytes.
+
+    Entries are float32 NumPy rows keyed by `(model_type, key)`. When a store
+    path is given, entries are also written to a SQLite file so they survive
+    restarts and are shared by every worker on the machine. The store is only
+    touched by one background thread: `fetch` reads it there and `put` writes
+    behind, so lock contention between workers never blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 20000,
+        max_bytes: int = 256 * 1024 * 1024,
+        store_path: Optional[str] = None
+    ) -> None:
+        """
+        Initialize the EmbeddingCache class.
+
+        Args:
+            max_entries (int): The maximum number of entries kept in memory.
+            max_bytes (int): The maximum number of embedding bytes kept in memory.
+            store_path (str): Optional path of the on-disk SQLite store.
+        """
+        self._max_entries = max(0, int(max_entries))
+        self._max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[Tuple[str, Hashable], np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._store = None
+        self._store_pool = None
+        if store_path:
+            self._store_pool = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="embedding-store"
+            )
+            self._store = sqlite3.connect(
+                store_path,
+                timeout=5.0,
+                check_same_thread=False,
+                isolation_level=None
+            )
+            self._store.execute("PRAGMA journal_mode=WAL")
+            self._store.execute("PRAGMA synchronous=NORMAL")
+            self._store.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model_type TEXT NOT NULL, key TEXT NOT NULL, "
+                "dim INTEGER NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model_type, key))"
+            )
+
+    def _insert(
+        self,
+        key: Tuple[str, Hashable],
+        value: np.ndarray
+    ) -> None:
+        """
+        Insert an entry in memory and evict the least recently used ones.
+        Must be called with the lock held.
+        """
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes
+        if value.nbytes > self._max_bytes or self._max_entries == 0:
+            return
+        self._entries[key] = value
+        self._bytes += value.nbytes
+        while (len(self._entries) > self._max_entries
+               or self._bytes > self._max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def _load(
+        self,
+        key: Tuple[str, Hashable]
+    ) -> Optional[np.ndarray]:
+        """
+        Read an entry from the on-disk store; runs on the store thread.
+        """
+        row = self._store.execute(
+            "SELECT dim, vector FROM embeddings WHERE model_type = ? AND key = ?",
+            (key[0], str(key[1]))
+        ).fetchone()
+        if row is None:
+            return None
+        dim, blob = row
+        return np.frombuffer(blob, dtype=np.float32).reshape(-1, dim)
+
+    def _lookup(
+        self,
+        key: Tuple[str, Hashable]
+    ) -> Optional[np.ndarray]:
+        """
+        Look up an entry in memory and mark it as recently used.
+        Must be called with the lock held.
+        """
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def get(
+        self,
+        key: Tuple[str, Hashable]
+    ) -> Optional[np.ndarray]:
+        """
+        Look up an embedding in memory and mark it as recently used. The on-disk
+        store is not read; use `fetch` for that.
+
+        Args:
+            key (Tuple[str, Hashable]): The `(model_type, key)` pair.
+
+        Returns:
+            Optional[np.ndarray]: The cached embedding, or None on a miss.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            return value
+
+    async def fetch(
+        self,
+        key: Tuple[str, Hashable]
+    ) -> Optional[np.ndarray]:
+        """
+        Look up an embedding in memory, then in the on-disk store. The store
+        is read on its background thread, so the event loop is never blocked.
+
+        Args:
+            key (Tuple[str, Hashable]): The `(model_type, key)` pair.
+
+        Returns:
+            Optional[np.ndarray]: The cached embedding, or None on a miss.
+        """
+        with self._lock:
+            value = self._lookup(key)
+        if value is not None:
+            return value
+        if self._store is not None:
+            value = await asyncio.get_running_loop().run_in_executor(
+                self._store_pool, self._load, key
+            )
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self._insert(key, value)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def _write(
+        self,
+        key: Tuple[str, Hashable],
+        value: np.ndarray
+    ) -> None:
+        """
+        Write an entry to the on-disk store; runs on the store thread.
+        """
+        self._store.execute(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+            (key[0], str(key[1]), value.shape[-1], value.tobytes())
+        )
+
+    def put(
+        self,
+        key: Tuple[str, Hashable],
+        value: np.ndarray
+    ) -> None:
+        """
+        Store an embedding. The on-disk copy is written behind on the store thread.
+
+        Args:
+            key (Tuple[str, Hashable]): The `(model_type, key)` pair.
+            value (np.ndarray): The embedding with shape (1, d).
+        """
+        # A private copy: the caller's array stays writable, and its later
+        # writes cannot change the cached embedding.
+        value = np.array(value, dtype=np.float32, order="C", copy=True)
+        value.setflags(write=False)
+        with self._lock:
+            self._insert(key, value)
+        if self._store is not None:
+            self._store_pool.submit(self._write, key, value)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the cache counters.
+
+        Returns:
+            Dict[str, int]: Hits, misses, disk hits, entries and bytes in memory.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
@@ -0,0 +1,233 @@
+"""
+This module implements the process-pool image decode and preprocessing stage.
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import (Callable,
+                    Dict,
+                    Optional,
+                    Tuple)
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+
+class OpenClipTransform:
+    """
+    Picklable adapter around an open_clip image transform.
+    """
+
+    def __init__(self, transform: Callable) -> None:
+        self._transform = transform
+
+    def __call__(self, image: Image.Image) -> np.ndarray:
+        return self._transform(image).numpy()
+
+
+class HFClipTransform:
+    """
+    Picklable adapter around a Hugging Face CLIP image processor.
+    """
+
+    def __init__(self, image_processor: Callable) -> None:
+        self._image_processor = image_processor
+
+    def __call__(self, image: Image.Image) -> np.ndarray:
+        return self._image_processor(
+            images=image,
+            return_tensors="np"
+        )["pixel_values"][0]
+
+
+def _init_worker() -> None:
+    """
+    Set up a freshly forked worker process.
+    """
+    try:
+        import torch
+        # Forked workers must not enter the parent's OpenMP pool.
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+def _worker_ready() -> None:
+    """
+    No-op task whose submission makes the pool fork its workers.
+    """
+
+
+def decode_image(
+    data: bytes,
+    draft_size: int,
+    max_pixels: int
+) -> Image.Image:
+    """
+    Decode upload bytes into an RGB image, downscaling JPEGs while decoding.
+
+    Args:
+        data (bytes): The raw upload bytes.
+        draft_size (int): The smallest side the model input needs.
+        max_pixels (int): The maximum number of pixels accepted.
+
+    Returns:
+        Image.Image: The decoded RGB image.
+
+    Raises:
+        ValueError: If the bytes are not an image or the image is larger than `max_pixels`.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+    except UnidentifiedImageError as e:
+        raise ValueError("Upload is not a supported image") from e
+    except Image.DecompressionBombError as e:
+        raise ValueError(str(e)) from e
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ValueError(
+            f"Image has {width}x{height} pixels, the limit is {max_pixels}"
+        )
+    if image.format == "JPEG" and draft_size:
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale while both sides stay
+        # at least `draft_size`, which is all the resize step needs.
+        image.draft("RGB", (draft_size, draft_size))
+    return image.convert("RGB")
+
+
+def preprocess_image(
+    transform: Callable,
+    draft_size: int,
+    data: bytes,
+    max_pixels: int
+) -> np.ndarray:
+    """
+    Decode and transform an upload into a (3, H, W) float32 array.
+    Runs inside a worker process.
+
+    Args:
+        transform (Callable): The image transform of the model.
+        draft_size (int): The input resolution of the model, used for JPEG draft mode.
+        data (bytes): The raw upload bytes.
+        max_pixels (int): The maximum number of pixels accepted.
+
+    Returns:
+        np.ndarray: The model input, ready to be stacked into a batch.
+    """
+    image = decode_image(data, draft_size, max_pixels)
+    return np.ascontiguousarray(transform(image), dtype=np.float32)
+
+
+class ImagePreprocessor:
+    """
+    Turns uploaded image bytes into model-ready arrays on a process pool,
+    so decoding large images never competes with the request threads.
+
+    The workers are forked as soon as the preprocessor is built, so it must be
+    built before the process starts any thread: a fork copies the locks of
+    other threads (executors, OpenMP, SQLite writers) in whatever state they
+    are in. Fork is still used rather than spawn, which would re-import
+    `__main__` and with it the whole service in every worker. Transforms are
+    registered once models load, after that point, so they travel with each
+    task instead of through the worker initializer.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_upload_bytes: int = 20 * 1024 * 1024,
+        max_pixels: int = 40_000_000
+    ) -> None:
+        """
+        Initialize the ImagePreprocessor class.
+
+        Args:
+            max_workers (int): The number of preprocessing processes.
+            max_upload_bytes (int): The maximum accepted upload size in bytes.
+            max_pixels (int): The maximum accepted image size in pixels.
+        """
+        self._max_workers = max(1, int(max_workers))
+        self.max_upload_bytes = int(max_upload_bytes)
+        self.max_pixels = int(max_pixels)
+        self._transforms: Dict[str, Tuple[Callable, int]] = {}
+        self._pool: Optional[ProcessPoolExecutor] = ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker
+        )
+        # A fork pool starts all of its workers on its first task.
+        self._pool.submit(_worker_ready).result()
+
+    def register(
+        self,
+        model_type: str,
+        transform: Callable,
+        input_size: int
+    ) -> None:
+        """
+        Register the image transform of a model.
+
+        Args:
+            model_type (str): The model type the transform belongs to.
+            transform (Callable): A picklable callable mapping a PIL image to an array.
+            input_size (int): The input resolution of the model, used for JPEG draft mode.
+        """
+        self._transforms[model_type] = (transform, int(input_size))
+
+    def is_registered(
+        self,
+        model_type: str
+    ) -> bool:
+        """
+        Whether a model type has a registered transform.
+        """
+        return model_type in self._transforms
+
+    async def preprocess(
+        self,
+        model_type: str,
+        data: bytes
+    ) -> np.ndarray:
+        """
+        Decode and transform an upload for a model.
+
+        Args:
+            model_type (str): The model whose transform is applied.
+            data (bytes): The raw upload bytes.
+
+        Returns:
+            np.ndarray: A (3, H, W) float32 array ready to be stacked.
+
+        Raises:
+            ValueError: If the upload exceeds the size or pixel limits, or the
+                model type has no registered transform.
+            RuntimeError: If the preprocessor was shut down.
+        """
+        if model_type not in self._transforms:
+            raise ValueError("Model type not supported")
+        if len(data) > self.max_upload_bytes:
+            raise ValueError(
+                f"Upload has {len(data)} bytes, the limit is {self.max_upload_bytes}"
+            )
+        if self._pool is None:
+            raise RuntimeError("Image preprocessor is shut down")
+        transform, draft_size = self._transforms[model_type]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool,
+            preprocess_image,
+            transform,
+            draft_size,
+            data,
+            self.max_pixels
+        )
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker processes.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
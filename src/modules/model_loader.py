@@ -0,0 +1,99 @@
+"""
+This module loads the pretrained CLIP models and wraps them in their encoder classes.
+"""
+
+from typing import Tuple
+
+from torch import device
+from open_clip import (create_model_from_pretrained,
+                       get_tokenizer)
+from transformers import (CLIPProcessor,
+                          AutoTokenizer,
+                          CLIPModel)
+
+from src.modules.base_clip import BaseCLIP
+from src.modules.original_clip import OriginalCLIP
+from src.modules.apple_clip import AppleCLIP
+from src.modules.laion_clip import LaionCLIP
+
+ENCODER_CLASSES = {
+    "original_clip": OriginalCLIP,
+    "apple_clip": AppleCLIP,
+    "laion_clip": LaionCLIP,
+}
+
+
+def load_clip_weights(
+    model_type: str,
+    model_name: str,
+    tokenizer_name: str,
+    device_type: device
+) -> Tuple:
+    """
+    Load a pretrained CLIP model onto a device with its processor and tokenizer.
+
+    Args:
+        model_type (str): "original_clip", "apple_clip" or "laion_clip".
+        model_name (str): The Hugging Face or open_clip identifier of the model.
+        tokenizer_name (str): The identifier of the tokenizer (open_clip models only).
+        device_type (device): The device the model is moved to.
+
+    Returns:
+        Tuple: The model, the image processor and the tokenizer.
+    """
+    if model_type == "original_clip":
+        model = CLIPModel.from_pretrained(model_name).to(device_type).eval()
+        return (
+            model,
+            CLIPProcessor.from_pretrained(model_name),
+            AutoTokenizer.from_pretrained(model_name)
+        )
+    if model_type in ("apple_clip", "laion_clip"):
+        model, processor = create_model_from_pretrained(model_name)
+        model.to(device_type).eval()
+        return model, processor, get_tokenizer(tokenizer_name)
+    raise ValueError(f"Model type not supported: {model_type}")
+
+
+def load_clip_encoder(
+    model_type: str,
+    model_name: str,
+    tokenizer_name: str,
+    device_type: device,
+    lazy: bool = False,
+    **encoder_kwargs
+) -> BaseCLIP:
+    """
+    Load a pretrained CLIP model onto a device and wrap it in its encoder class.
+
+    Args:
+        model_type (str): "original_clip", "apple_clip" or "laion_clip".
+        model_name (str): The Hugging Face or open_clip identifier of the model.
+        tokenizer_name (str): The identifier of the tokenizer (open_clip models only).
+        device_type (device): The device the model is moved to.
+        lazy (bool): Whether to defer loading the weights until `encoder.load()`.
+        **encoder_kwargs: Extra arguments for the encoder class, e.g. the executor.
+
+    Returns:
+        BaseCLIP: The encoder instance.
+    """
+    if model_type not in ENCODER_CLASSES:
+        raise ValueError(f"Model type not supported: {model_type}")
+
+    def loader() -> Tuple:
+        return load_clip_weights(
+            model_type=model_type,
+            model_name=model_name,
+            tokenizer_name=tokenizer_name,
+            device_type=device_type
+        )
+
+    model, processor, tokenizer = (None, None, None) if lazy else loader()
+    return ENCODER_CLASSES[model_type](
+        model=model,
+        processor=processor,
+        tokenizer=tokenizer,
+        device_type=device_type,
+        loader=loader,
+        **encoder_kwargs
+    )
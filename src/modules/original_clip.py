@@ -2,22 +2,39 @@
 Implements CLIP model-based text and image embedding.
 """
 
-from PIL import Image
+from typing import Callable, List, Tuple
+import torch
 from torch import device, Tensor
 from transformers import AutoTokenizer, AutoProcessor, CLIPModel
 
+from src.modules.base_clip import BaseCLIP
+from src.modules.embedding_cache import EmbeddingCache
+from src.modules.image_preprocessor import HFClipTransform
+from src.modules.cpu_text_encoder import HFClipTextTower
+from src.utils.executor import InferenceExecutor
 
-class OriginalCLIP:
+
+class OriginalCLIP(BaseCLIP):
     """
     Handles text and image embeddings using the CLIP model.
     """
 
+    model_type = "original_clip"
+    cuda_autocast = False
+
     def __init__(
         self,
         model: CLIPModel,
         processor: AutoProcessor,
         tokenizer: AutoTokenizer,
-        device_type: device
+        device_type: device,
+        batch_size: int = 32,
+        batch_wait_ms: float = 5.0,
+        executor: InferenceExecutor = None,
+        text_cache: EmbeddingCache = None,
+        text_encoder_mode: str = "default",
+        text_encoder_path: str = None,
+        loader: Callable[[], Tuple] = None
     ) -> None:
         """
         Initializes the OriginalClip with the provided model, processor, tokenizer, and device.
@@ -27,50 +44,112 @@ class OriginalCLIP:
             processor (AutoProcessor): Processor for image data.
             tokenizer (AutoTokenizer): Tokenizer for text data.
             device_type (device): The device type (e.g., 'cpu' or 'cuda').
+            batch_size (int): The maximum number of queued texts encoded in one pass.
+            batch_wait_ms (float): How long a text query waits for others to batch with.
+            executor (InferenceExecutor): The executor running the blocking forward passes.
+            text_cache (EmbeddingCache): Optional cache of query text embeddings.
+            text_encoder_mode (str): "default", "int8" (exported TorchScript text tower)
+                or "bf16" (CPU bfloat16 autocast).
+            text_encoder_path (str): The exported text tower, required for "int8".
+            loader (Callable[[], Tuple]): Optional function returning
+                `(model, processor, tokenizer)` for lazy loading.
         """
-        self._model = model
-        self._processor = processor
-        self._tokenizer = tokenizer
-        self._device_type = device_type
+        super().__init__(
+            model=model,
+            processor=processor,
+            tokenizer=tokenizer,
+            device_type=device_type,
+            batch_size=batch_size,
+            batch_wait_ms=batch_wait_ms,
+            executor=executor,
+            text_cache=text_cache,
+            text_encoder_mode=text_encoder_mode,
+            text_encoder_path=text_encoder_path,
+            loader=loader
+        )
 
-    async def text_embedding(
+    def encode_texts(
         self,
-        text: str
+        texts: List[str]
     ) -> Tensor:
         """
-        Generates a text embedding for the given input text.
+        Generates text embeddings for a batch of input texts.
 
         Args:
-            text (str): The input text to embed.
+            texts (List[str]): The input texts to embed.
 
         Returns:
-            Tensor: The text embedding as a tensor.
+            Tensor: The text embeddings, one row per input text.
         """
+        if self._text_model is not None:
+            # The traced tower was exported with fixed-length inputs.
+            inputs = self._tokenizer(
+                texts,
+                padding="max_length",
+                truncation=True,
+                max_length=self._tokenizer.model_max_length,
+                return_tensors="pt"
+            )
+            with torch.no_grad():
+                return self._text_model(
+                    inputs["input_ids"],
+                    inputs["attention_mask"]
+                )
         inputs = self._tokenizer(
-            text,
+            texts,
             padding=True,
             return_tensors="pt"
         ).to(self._device_type)
-        text_features = self._model.get_text_features(**inputs)
+        with torch.no_grad(), self._autocast(text=True):
+            text_features = self._model.get_text_features(**inputs)
         return text_features
 
-    async def image_embedding(
+    def text_tower(self) -> Tuple[HFClipTextTower, tuple]:
+        """
+        Gets the text tower and example inputs used to export a CPU text encoder.
+
+        Returns:
+            Tuple[HFClipTextTower, tuple]: The text tower and example token inputs.
+        """
+        inputs = self._tokenizer(
+            ["a photo of a dog", "a person riding a bicycle"],
+            padding="max_length",
+            truncation=True,
+            max_length=self._tokenizer.model_max_length,
+            return_tensors="pt"
+        )
+        return (
+            HFClipTextTower(self._model),
+            (inputs["input_ids"], inputs["attention_mask"])
+        )
+
+    def image_transform(self) -> Tuple[HFClipTransform, int]:
+        """
+        Gets the picklable image transform and input size for the preprocessing pool.
+
+        Returns:
+            Tuple[HFClipTransform, int]: The transform and the input resolution.
+        """
+        return (
+            HFClipTransform(self._processor.image_processor),
+            self._model.config.vision_config.image_size
+        )
+
+    def encode_image(
         self,
-        image
+        pixel_values: Tensor
     ) -> Tensor:
         """
-        Generates an image embedding for the given input image.
+        Generates image embeddings for a batch of preprocessed images.
 
         Args:
-            image: The input image to embed.
+            pixel_values (Tensor): The stacked model inputs with shape (n, 3, H, W).
 
         Returns:
-            Tensor: The image embedding as a tensor.
+            Tensor: The image embeddings as a tensor.
         """
-        image = Image.open(image).convert("RGB")
-        inputs = self._processor(
-            images=image,
-            return_tensors="pt"
-        ).to(self._device_type)
-        image_features = self._model.get_image_features(**inputs)
+        with torch.no_grad():
+            image_features = self._model.get_image_features(
+                pixel_values=pixel_values.to(self._device_type)
+            )
         return image_features
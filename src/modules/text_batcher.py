@@ -0,0 +1,156 @@
+"""
+This module implements a dynamic micro-batching queue for text embedding.
+"""
+
+import asyncio
+from typing import (Any,
+                    Callable,
+                    List,
+                    Optional,
+                    Tuple)
+
+from src.utils.executor import InferenceExecutor
+
+
+class TextBatcher:
+    """
+    Gathers concurrent text queries for a short window and encodes them
+    in a single batched forward pass.
+
+    Every caller awaits its own future and receives its own row of the
+    batched result, so the API stays one text in, one embedding out.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], Any],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        executor: Optional[InferenceExecutor] = None,
+        pool_name: str = "text"
+    ) -> None:
+        """
+        Initialize the TextBatcher class.
+
+        Args:
+            encode_fn (Callable[[List[str]], Any]): A blocking function that encodes
+                a list of texts and returns one row per text.
+            max_batch_size (int): The maximum number of texts encoded in one pass.
+            max_wait_ms (float): How long the first query of a batch waits for others.
+            executor (InferenceExecutor): The executor running the forward pass; the
+                default loop executor is used when not given.
+            pool_name (str): The executor pool the forward pass runs on.
+        """
+        self._encode_fn = encode_fn
+        self._executor = executor
+        self._pool_name = pool_name
+        self._max_batch_size = max(1, int(max_batch_size))
+        self._max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def run_batch(
+        self,
+        texts: List[str]
+    ) -> Any:
+        """
+        Run the blocking encode function for one batch off the event loop.
+
+        Args:
+            texts (List[str]): The texts of the batch.
+
+        Returns:
+            Any: The batched embeddings, one row per text.
+        """
+        if self._executor is not None:
+            return await self._executor.run(self._pool_name, self._encode_fn, texts)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._encode_fn, texts)
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        """
+        Start the batching worker on the running event loop if needed.
+
+        Returns:
+            asyncio.Queue: The queue feeding the worker.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def _collect(
+        self,
+        first: Tuple[str, asyncio.Future]
+    ) -> List[Tuple[str, asyncio.Future]]:
+        """
+        Collect queued queries until the batch is full or the window closes.
+
+        Args:
+            first (Tuple[str, asyncio.Future]): The query that opened the batch.
+
+        Returns:
+            List[Tuple[str, asyncio.Future]]: The queries of the batch.
+        """
+        batch = [first]
+        deadline = self._loop.time() + self._max_wait
+        while len(batch) < self._max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(
+                    await asyncio.wait_for(self._queue.get(), timeout)
+                )
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        """
+        Worker loop: build batches, encode them and resolve every caller.
+        """
+        while True:
+            first = await self._queue.get()
+            batch = await self._collect(first)
+            batch = [(text, future) for text, future in batch
+                     if not future.done()]
+            if not batch:
+                continue
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+            positions = {text: i for i, text in enumerate(unique_texts)}
+            try:
+                embeddings = await self.run_batch(unique_texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for text, future in batch:
+                if not future.done():
+                    row = positions[text]
+                    future.set_result(embeddings[row:row + 1])
+
+    async def submit(
+        self,
+        text: str
+    ) -> Any:
+        """
+        Queue a text for the next batch and wait for its embedding.
+
+        Args:
+            text (str): The input text to be encoded.
+
+        Returns:
+            Any: The embedding of the text with shape (1, d).
+        """
+        queue = self._ensure_worker()
+        future = self._loop.create_future()
+        await queue.put((text, future))
+        return await future
@@ -0,0 +1,101 @@
+"""
+Reads and writes the metadata manifest stored next to a built FAISS index.
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+import faiss
+
+
+def manifest_path(
+    index_path: str
+) -> str:
+    """
+    Gets the manifest path of an index, e.g. `apple.faiss` -> `apple.manifest.json`.
+
+    Args:
+        index_path (str): The path to the FAISS index file.
+
+    Returns:
+        str: The path to its manifest.
+    """
+    return f"{os.path.splitext(index_path)[0]}.manifest.json"
+
+
+def write_manifest(
+    index_path: str,
+    manifest: Dict
+) -> str:
+    """
+    Writes the manifest of an index.
+
+    Args:
+        index_path (str): The path to the FAISS index file.
+        manifest (Dict): The metadata of the index.
+
+    Returns:
+        str: The path of the written manifest.
+    """
+    path = manifest_path(index_path)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def read_manifest(
+    index_path: str
+) -> Optional[Dict]:
+    """
+    Reads the manifest of an index if there is one.
+
+    Args:
+        index_path (str): The path to the FAISS index file.
+
+    Returns:
+        Optional[Dict]: The metadata, or None for indexes built elsewhere.
+    """
+    path = manifest_path(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_manifest(
+    index: faiss.Index,
+    manifest: Dict
+) -> None:
+    """
+    Checks that an index matches its manifest.
+
+    Args:
+        index (faiss.Index): The loaded index.
+        manifest (Dict): Its metadata.
+
+    Raises:
+        ValueError: If the dimension or the number of vectors differ.
+    """
+    if manifest.get("dim", index.d) != index.d:
+        raise ValueError(f"Index dimension {index.d} does not match manifest {manifest['dim']}")
+    if manifest.get("ntotal", index.ntotal) != index.ntotal:
+        raise ValueError(
+            f"Index holds {index.ntotal} vectors, manifest says {manifest['ntotal']}"
+        )
+
+
+def apply_search_params(
+    index: faiss.Index,
+    params: Dict
+) -> None:
+    """
+    Sets search-time parameters such as `nprobe` or `efSearch` on an index.
+
+    Args:
+        index (faiss.Index): A CPU index.
+        params (Dict): Parameter names and values.
+    """
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        space.set_index_parameter(index, name, value)
@@ -2,10 +2,31 @@
 Implements a FAISS-based search for CLIP embeddings.
 """
 
-from typing import List
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple, Union
 import faiss
+import numpy as np
 from torch import Tensor
 
+from src.utils.executor import InferenceExecutor
+from src.repositories.index_manifest import (read_manifest,
+                                             write_manifest,
+                                             check_manifest,
+                                             apply_search_params)
+from src.repositories.rerank_store import RerankStore, append_vectors
+
+# The largest k a FAISS GPU index returns per query.
+GPU_MAX_K = 2048
+# Indexes searched on a GPU, by model type and GPU device.
+# The original and LAION indexes are searched on CPU.
+GPU_DEVICES = {
+    "apple_clip": 1
+}
+
+logger = logging.getLogger(__name__)
+
 
 class ClipFaiss:
     """
@@ -16,7 +37,14 @@ class ClipFaiss:
         self,
         original_faiss_url: str,
         apple_faiss_url: str,
-        laion_faiss_url: str
+        laion_faiss_url: str,
+        executor: InferenceExecutor = None,
+        lazy: bool = False,
+        mmap: bool = False,
+        max_top_k: int = 2048,
+        max_range_results: int = 10000,
+        subset_scan_limit: int = 200000,
+        rerank_candidates: int = 0
     ) -> None:
         """
         Initializes the FAISS index and loads it onto a GPU.
@@ -24,83 +52,764 @@ class ClipFaiss:
         Args:
             faiss_url (str): The path to the FAISS index file.
             device_type (device): The device type (e.g., 'cpu' or 'cuda').
+            executor (InferenceExecutor): The executor whose per-index pools
+                (`original_index`, `apple_index`, `laion_index`) run the searches.
+            lazy (bool): Whether to defer reading the indexes until `load_index`.
+            mmap (bool): Whether to memory-map the index files read-only instead of
+                reading them into private memory, so that worker processes share
+                the same page-cache pages.
+            max_top_k (int): The upper bound of a k-nearest-neighbour request; GPU
+                indexes support at most 2048.
+            max_range_results (int): The upper bound of the results kept per query
+                by a range search.
+            subset_scan_limit (int): Filtered searches over at most this many ids
+                score the candidate vectors directly instead of using an IDSelector.
+            rerank_candidates (int): Overrides the number of candidates re-ranked per
+                query for indexes whose manifest names exact vectors; 0 keeps the
+                manifest's value. GPU indexes use at most `GPU_MAX_K`.
+        """
+        self._executor = executor or InferenceExecutor()
+        self._faiss_urls = {
+            "original_clip": original_faiss_url,
+            "apple_clip": apple_faiss_url,
+            "laion_clip": laion_faiss_url
+        }
+        self._pool_names = {
+            "original_clip": "original_index",
+            "apple_clip": "apple_index",
+            "laion_clip": "laion_index"
+        }
+        self._gpu_devices = dict(GPU_DEVICES)
+        self._gpu_resources = {}
+        # GPU indexes cannot reconstruct stored vectors, so the CPU copies are kept.
+        self._cpu_indexes = {}
+        self._search_indexes = {}
+        self._manifests = {}
+        self._mmap = mmap
+        self._max_top_k = max_top_k
+        self._max_range_results = max_range_results
+        self._subset_scan_limit = subset_scan_limit
+        self._rerank_candidates = rerank_candidates
+        # Exact vectors re-ranking the results of compressed indexes.
+        self._rerank_stores = {}
+        # Serializes loads and version swaps; searches read without locking.
+        self._swap_lock = threading.Lock()
+        if not lazy:
+            for model_type in self._faiss_urls:
+                self.load_index(model_type)
+
+    def _open_index(
+        self,
+        model_type: str,
+        path: str
+    ) -> Tuple[faiss.Index, faiss.Index, Optional[object], dict, Optional[RerankStore]]:
+        """
+        Reads an index file and prepares it for search without publishing it.
+
+        Args:
+            model_type (str): The model the index belongs to.
+            path (str): The path to the FAISS index file.
+
+        Returns:
+            Tuple: The CPU index, the search index, its GPU resources if it lives on
+            a GPU, its manifest, and the exact vectors re-ranking its results if the
+            manifest names them.
+
+        Raises:
+            ValueError: If the manifest does not match the index.
+        """
+        index = self.read_index(path, mmap=self._mmap)
+        manifest = read_manifest(path) or {}
+        check_manifest(index, manifest)
+        store = None
+        if manifest.get("rerank"):
+            rerank = manifest["rerank"]
+            candidates = self._rerank_candidates or rerank.get("candidates", 4000)
+            if model_type in self._gpu_devices and candidates > GPU_MAX_K:
+                logger.warning(
+                    "The %s index is searched on a GPU, which returns at most %d "
+                    "re-rank candidates; using %d instead of %d",
+                    model_type, GPU_MAX_K, GPU_MAX_K, candidates
+                )
+                candidates = GPU_MAX_K
+            store = RerankStore(
+                vectors_url=rerank["vectors"],
+                normalize=rerank.get("normalize", True),
+                candidates=candidates
+            )
+            if store.shape != (index.ntotal, index.d):
+                raise ValueError(
+                    f"Re-rank vectors {store.shape} do not match the index "
+                    f"({index.ntotal}, {index.d})"
+                )
+        # Set before any GPU copy, which inherits parameters such as nprobe.
+        apply_search_params(index, manifest.get("search_params", {}))
+        ivf_index = faiss.try_extract_index_ivf(index)
+        if ivf_index is not None:
+            # Lets IVF indexes reconstruct stored vectors by id.
+            ivf_index.make_direct_map()
+        search_index = index
+        resources = None
+        if model_type in self._gpu_devices:
+            resources = faiss.StandardGpuResources()
+            search_index = faiss.index_cpu_to_gpu(
+                provider=resources,
+                device=self._gpu_devices[model_type],
+                index=index
+            )
+        return index, search_index, resources, manifest, store
+
+    def _publish(
+        self,
+        model_type: str,
+        opened: Tuple[faiss.Index, faiss.Index, Optional[object], dict, Optional[RerankStore]]
+    ) -> None:
+        """
+        Makes an opened index the one new searches use. Searches already running
+        keep their reference to the previous index until they finish.
+        """
+        index, search_index, resources, manifest, store = opened
+        # Published first: a newer store also covers every id of the older index.
+        if store is not None:
+            self._rerank_stores[model_type] = store
+        else:
+            self._rerank_stores.pop(model_type, None)
+        if resources is not None:
+            self._gpu_resources[model_type] = resources
+        else:
+            self._gpu_resources.pop(model_type, None)
+        self._manifests[model_type] = manifest
+        self._cpu_indexes[model_type] = index
+        self._search_indexes[model_type] = search_index
+
+    def load_index(
+        self,
+        model_type: str
+    ) -> int:
+        """
+        Reads the index of a model and moves it to its GPU if it has one.
+        Blocking; run it on an executor thread.
+
+        Args:
+            model_type (str): The model whose index is loaded.
+
+        Returns:
+            int: The approximate memory held by the index in bytes.
+        """
+        with self._swap_lock:
+            if model_type not in self._cpu_indexes:
+                self._publish(
+                    model_type,
+                    self._open_index(model_type, self._faiss_urls[model_type])
+                )
+        return self.index_bytes(model_type)
+
+    def faiss_url(
+        self,
+        model_type: str
+    ) -> str:
+        """
+        Gets the path of the current version of a model's index.
+        """
+        return self._faiss_urls[model_type]
+
+    def ntotal(
+        self,
+        model_type: str
+    ) -> int:
+        """
+        Gets the number of vectors in the current version of a model's index,
+        reading only the file header when the index is not loaded.
+
+        Args:
+            model_type (str): The model whose index is counted.
+
+        Returns:
+            int: The number of vectors.
+        """
+        index = self._cpu_indexes.get(model_type)
+        if index is None:
+            index = self.read_index(self._faiss_urls[model_type], mmap=True)
+        return index.ntotal
+
+    def write_appended(
+        self,
+        model_type: str,
+        vectors: np.ndarray,
+        output_path: str
+    ) -> int:
+        """
+        Writes a new version of a model's index with vectors appended, leaving the
+        live index untouched. The new vectors get the ids following the current
+        ones. Blocking; run it on an executor thread.
+
+        Args:
+            model_type (str): The model whose index is extended.
+            vectors (np.ndarray): The (n, d) vectors to append.
+            output_path (str): Where the new version is written.
+
+        Returns:
+            int: The number of vectors in the new version.
+        """
+        source = self._faiss_urls[model_type]
+        # A private in-memory copy; the live index may be memory-mapped read-only.
+        index = faiss.read_index(source)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != index.d:
+            raise ValueError(f"{model_type} vectors must have shape (n, {index.d})")
+        index.add(vectors)
+        faiss.write_index(index, output_path)
+        manifest = read_manifest(source)
+        if manifest is not None:
+            manifest["ntotal"] = index.ntotal
+            if manifest.get("rerank"):
+                vectors_url = f"{os.path.splitext(output_path)[0]}.vectors.npy"
+                append_vectors(manifest["rerank"]["vectors"], vectors, vectors_url)
+                manifest["rerank"]["vectors"] = os.path.abspath(vectors_url)
+            write_manifest(output_path, manifest)
+        return index.ntotal
+
+    def reload_index(
+        self,
+        model_type: str,
+        faiss_url: str
+    ) -> int:
+        """
+        Switches a model to a new version of its index. A loaded index is opened
+        on the side and swapped in atomically; an unloaded one is read from the new
+        path on its next load. Versions may only append vectors, so ids keep their
+        meaning. Blocking; run it on an executor thread.
+
+        Args:
+            model_type (str): The model whose index is replaced.
+            faiss_url (str): The path to the new version.
+
+        Returns:
+            int: The number of vectors in the new version.
+
+        Raises:
+            ValueError: If the new version has fewer vectors than the current one.
+        """
+        staged = self.prepare_index(model_type, faiss_url)
+        self.publish_indexes({model_type: staged})
+        return staged[2]
+
+    def prepare_index(
+        self,
+        model_type: str,
+        faiss_url: str
+    ) -> Tuple[str, Optional[tuple], int]:
+        """
+        Checks a new version of an index and, if the current one is loaded, opens
+        it without publishing it, so that several versions can be switched to
+        together by `publish_indexes`. Blocking; run it on an executor thread.
+
+        Args:
+            model_type (str): The model whose index is replaced.
+            faiss_url (str): The path to the new version.
+
+        Returns:
+            Tuple[str, Optional[tuple], int]: The path, the opened index (None if
+            the model is not loaded) and the number of vectors of the new version.
+
+        Raises:
+            ValueError: If the new version has fewer vectors than the current one.
+        """
+        with self._swap_lock:
+            current = self.ntotal(model_type)
+            loaded = model_type in self._cpu_indexes
+        if loaded:
+            opened = self._open_index(model_type, faiss_url)
+            ntotal = opened[0].ntotal
+        else:
+            opened = None
+            ntotal = self.read_index(faiss_url, mmap=True).ntotal
+        if ntotal < current:
+            raise ValueError(
+                f"The new {model_type} index has {ntotal} vectors, "
+                f"fewer than the current {current}"
+            )
+        return faiss_url, opened, ntotal
+
+    def publish_indexes(
+        self,
+        staged: Dict[str, Tuple[str, Optional[tuple], int]]
+    ) -> None:
+        """
+        Switches models to versions returned by `prepare_index`, all under one
+        lock so that no load or swap interleaves. Blocking; run it on an executor
+        thread.
+
+        Args:
+            staged (Dict[str, Tuple]): Per model type, the result of `prepare_index`.
+        """
+        with self._swap_lock:
+            publish = {}
+            for model_type, (faiss_url, opened, _) in staged.items():
+                # An index unloaded since it was prepared is read on its next load.
+                if model_type in self._cpu_indexes:
+                    # One loaded since it was prepared is opened now, before any swap.
+                    publish[model_type] = opened or self._open_index(model_type, faiss_url)
+            for model_type, opened in publish.items():
+                self._publish(model_type, opened)
+            for model_type, (faiss_url, _, _) in staged.items():
+                self._faiss_urls[model_type] = faiss_url
+
+    @staticmethod
+    def read_index(
+        path: str,
+        mmap: bool = False
+    ) -> faiss.Index:
+        """
+        Reads an index file, optionally memory-mapped.
+
+        Args:
+            path (str): The path to the FAISS index file.
+            mmap (bool): Whether to map the file read-only instead of copying it.
+
+        Returns:
+            faiss.Index: The index.
+        """
+        if not mmap:
+            return faiss.read_index(path)
+        # IO_FLAG_MMAP_IFC (faiss >= 1.8) maps both flat codes and IVF lists;
+        # older releases only map IVF inverted lists with IO_FLAG_MMAP.
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+
+    def unload_index(
+        self,
+        model_type: str
+    ) -> None:
+        """
+        Releases the index of a model; `load_index` reads it again.
+
+        Args:
+            model_type (str): The model whose index is released.
+        """
+        with self._swap_lock:
+            self._search_indexes.pop(model_type, None)
+            self._cpu_indexes.pop(model_type, None)
+            self._manifests.pop(model_type, None)
+            self._gpu_resources.pop(model_type, None)
+            self._rerank_stores.pop(model_type, None)
+
+    def manifest(
+        self,
+        model_type: str
+    ) -> dict:
+        """
+        Gets the manifest written by the index builder for a loaded index.
+
+        Args:
+            model_type (str): The model whose index is described.
+
+        Returns:
+            dict: The metadata, empty for indexes without a manifest.
+        """
+        return self._manifests.get(model_type, {})
+
+    def is_loaded(
+        self,
+        model_type: str
+    ) -> bool:
+        """
+        Whether the index of a model is in memory.
+        """
+        return model_type in self._search_indexes
+
+    def index_bytes(
+        self,
+        model_type: str
+    ) -> int:
+        """
+        Estimates the memory held by the index of a model from its file size.
+
+        Args:
+            model_type (str): The model whose index is measured.
+
+        Returns:
+            int: The approximate number of bytes, or 0 when it is not loaded.
+        """
+        if model_type not in self._cpu_indexes:
+            return 0
+        if self._mmap and model_type not in self._gpu_devices:
+            # Mapped pages live in the shared page cache, which the kernel reclaims.
+            return 0
+        return os.path.getsize(self._faiss_urls[model_type])
+
+    def _get_index(
+        self,
+        model_type: str,
+        cpu: bool = False
+    ) -> Tuple[str, faiss.Index]:
+        """
+        Gets the executor pool and the index of a model.
+
+        Args:
+            model_type (str): The model whose index is used.
+            cpu (bool): Whether the CPU copy is needed rather than the search index.
+
+        Returns:
+            Tuple[str, faiss.Index]: The pool name and the index.
+        """
+        indexes = self._cpu_indexes if cpu else self._search_indexes
+        if model_type not in indexes:
+            raise RuntimeError(f"The {model_type} index is not loaded")
+        return self._pool_names[model_type], indexes[model_type]
+
+    @staticmethod
+    def _search(
+        index: faiss.Index,
+        top_k: int,
+        query_vectors: Union[Tensor, np.ndarray],
+        store: Optional[RerankStore] = None,
+        max_k: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Runs a blocking FAISS search; called on an executor thread. With a re-rank
+        store, the index only proposes candidates, which are then scored exactly.
+
+        Args:
+            index (faiss.Index): The index to search.
+            top_k (int): The number of nearest neighbors to retrieve.
+            query_vectors (Union[Tensor, np.ndarray]): The query vectors to search
+                against the index.
+            store (RerankStore): The exact vectors re-ranking a compressed index.
+            max_k (int): The most results the index returns per query, e.g.
+                `GPU_MAX_K` on a GPU; bounds the candidates of re-ranking.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The (n, top_k) similarity scores and the
+            parallel indices of the top-k nearest neighbors.
+        """
+        if isinstance(query_vectors, Tensor):
+            query_vectors = query_vectors.cpu().detach().float().numpy()
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        if store is None:
+            return index.search(query_vectors, top_k)
+        candidates = min(max(top_k, store.candidates), index.ntotal, max_k or index.ntotal)
+        _, candidate_ids = index.search(query_vectors, candidates)
+        return store.rerank(query_vectors, candidate_ids, top_k)
+
+    @staticmethod
+    def _range_search(
+        index: faiss.Index,
+        min_score: float,
+        max_results: int,
+        query_vectors: Union[Tensor, np.ndarray]
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """
+        Runs a blocking FAISS range search; called on an executor thread.
+
+        Args:
+            index (faiss.Index): The CPU index to search; GPU indexes have no range search.
+            min_score (float): The inner-product radius; results score above it.
+            max_results (int): The number of best results kept per query.
+            query_vectors (Union[Tensor, np.ndarray]): The query vectors.
 
+        Returns:
+            Tuple[List[np.ndarray], List[np.ndarray]]: Per query, the scores in
+            descending order and the parallel indices.
+        """
+        if isinstance(query_vectors, Tensor):
+            query_vectors = query_vectors.cpu().detach().float().numpy()
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        lims, distances, ids = index.range_search(query_vectors, float(min_score))
+        scores, indices = [], []
+        for start, end in zip(lims[:-1], lims[1:]):
+            order = np.argsort(-distances[start:end], kind="stable")[:max_results]
+            scores.append(distances[start:end][order])
+            indices.append(ids[start:end][order])
+        return scores, indices
+
+    @staticmethod
+    def _selector_params(
+        index: faiss.Index,
+        selector: faiss.IDSelector
+    ) -> faiss.SearchParameters:
+        """
+        Builds search parameters restricting a search to the selected ids, keeping
+        the index's own nprobe or efSearch, which explicit parameters would reset.
+        """
+        ivf_index = faiss.try_extract_index_ivf(index)
+        if ivf_index is not None:
+            return faiss.SearchParametersIVF(sel=selector, nprobe=ivf_index.nprobe)
+        if isinstance(index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+        return faiss.SearchParameters(sel=selector)
+
+    @staticmethod
+    def _filtered_search(
+        index: faiss.Index,
+        top_k: int,
+        query_vectors: Union[Tensor, np.ndarray],
+        ids: np.ndarray,
+        scan_limit: int,
+        store: Optional[RerankStore] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Runs a blocking FAISS search restricted to a set of ids; called on an
+        executor thread. Small candidate sets are scored directly against their
+        stored vectors, so the cost follows the candidate count rather than the
+        index size; larger ones use an IDSelector, whose results are re-ranked
+        with the store if there is one.
+
+        Args:
+            index (faiss.Index): The CPU index to search.
+            top_k (int): The number of nearest neighbors to retrieve.
+            query_vectors (Union[Tensor, np.ndarray]): The query vectors.
+            ids (np.ndarray): The candidate ids.
+            scan_limit (int): The largest candidate set scored directly.
+            store (RerankStore): Exact vectors scored instead of the index's own.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The (n, k) scores and parallel indices.
+        """
+        if isinstance(query_vectors, Tensor):
+            query_vectors = query_vectors.cpu().detach().float().numpy()
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        if store is not None and len(ids) <= scan_limit:
+            vectors = store.vectors(ids)
+        elif len(ids) <= scan_limit and index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            vectors = index.reconstruct_batch(ids)
+        else:
+            vectors = None
+        if vectors is not None:
+            scores = query_vectors @ vectors.T
+            top_k = min(top_k, len(ids))
+            top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            return (
+                np.take_along_axis(top_scores, order, axis=1),
+                ids[np.take_along_axis(top, order, axis=1)]
+            )
+        params = ClipFaiss._selector_params(index, faiss.IDSelectorBatch(ids))
+        if store is None:
+            return index.search(query_vectors, top_k, params=params)
+        candidates = min(max(top_k, store.candidates), len(ids))
+        _, candidate_ids = index.search(query_vectors, candidates, params=params)
+        return store.rerank(query_vectors, candidate_ids, top_k)
+
+    @staticmethod
+    def _reconstruct(
+        index: faiss.Index,
+        indice: int,
+        store: Optional[RerankStore] = None
+    ) -> np.ndarray:
+        """
+        Reads a stored vector back from an index; called on an executor thread.
+
+        Args:
+            index (faiss.Index): The CPU index holding the vector.
+            indice (int): The FAISS id of the vector.
+            store (RerankStore): Exact vectors read instead of the index's
+                compressed copy.
+
+        Returns:
+            np.ndarray: The stored vector with shape (1, d).
+        """
+        if store is not None:
+            return store.vectors(np.array([int(indice)]))
+        return index.reconstruct(int(indice)).reshape(1, -1)
+
+    async def reconstruct(
+        self,
+        model_type: str,
+        indice: int
+    ) -> np.ndarray:
         """
-        self._original_index = faiss.read_index(original_faiss_url)
-        # self._original_res = faiss.StandardGpuResources()
-        # self._original_gpu_index = faiss.index_cpu_to_gpu(
-        #     provider=self._original_res,
-        #     device=1,
-        #     index=self._original_index
-        # )
-        self._apple_index = faiss.read_index(apple_faiss_url)
-        self._apple_res = faiss.StandardGpuResources()
-        self._apple_gpu_index = faiss.index_cpu_to_gpu(
-            provider=self._apple_res,
-            device=1,
-            index=self._apple_index
+        Gets the stored embedding of a keyframe from the index of a model.
+
+        Args:
+            model_type (str): The model whose index holds the vector.
+            indice (int): The FAISS id of the keyframe.
+
+        Returns:
+            np.ndarray: The stored vector with shape (1, d).
+        """
+        pool_name, index = self._get_index(model_type, cpu=True)
+        if not 0 <= int(indice) < index.ntotal:
+            raise KeyError(f"Index id {indice} is not in the {model_type} index")
+        return await self._executor.run(
+            pool_name,
+            self._reconstruct,
+            index,
+            indice,
+            self._rerank_stores.get(model_type)
         )
-        self._laion_index = faiss.read_index(laion_faiss_url)
-        # self._laion_res = faiss.StandardGpuResources()
-        # self._laion_gpu_index = faiss.index_cpu_to_gpu(
-        #     provider=self._laion_res,
-        #     device=1,
-        #     index=self._laion_index
-        # )
 
     async def original_search(
         self,
         top_k: int,
-        query_vectors: Tensor
-    ) -> List[int]:
+        query_vectors: Union[Tensor, np.ndarray],
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
         Searches the original FAISS index for the top-k nearest neighbors.
 
         Args:
             top_k (int): The number of nearest neighbors to retrieve.
-            query_vectors (Tensor): The query vectors to search against the index.
+            query_vectors (Union[Tensor, np.ndarray]): The query vectors to search
+                against the index.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range", see `multi_search`.
 
         Returns:
-            List[int]: A list of indices of the top-k nearest neighbors.
+            Tuple[np.ndarray, np.ndarray]: The similarity scores and the parallel
+            indices of the top-k nearest neighbors.
         """
-        query_vectors = query_vectors.cpu().detach().numpy()
-        _, indices = self._original_index.search(query_vectors, top_k)
-        return indices
+        scores, indices = await self.multi_search(
+            model_type="original_clip",
+            top_k=top_k,
+            query_vectors=query_vectors,
+            min_score=min_score,
+            search_mode=search_mode
+        )
+        return scores, indices
 
     async def apple_search(
         self,
         top_k: int,
-        query_vectors: Tensor
-    ) -> List[int]:
+        query_vectors: Union[Tensor, np.ndarray],
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
         Searches the Apple FAISS index for the top-k nearest neighbors.
 
         Args:
             top_k (int): The number of nearest neighbors to retrieve.
-            query_vectors (Tensor): The query vectors to search against the index.
+            query_vectors (Union[Tensor, np.ndarray]): The query vectors to search
+                against the index.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range", see `multi_search`.
 
         Returns:
-            List[int]: A list of indices of the top-k nearest neighbors.
+            Tuple[np.ndarray, np.ndarray]: The similarity scores and the parallel
+            indices of the top-k nearest neighbors.
         """
-        query_vectors = query_vectors.cpu().detach().numpy()
-        _, indices = self._apple_gpu_index.search(query_vectors, top_k)
-        return indices
+        scores, indices = await self.multi_search(
+            model_type="apple_clip",
+            top_k=top_k,
+            query_vectors=query_vectors,
+            min_score=min_score,
+            search_mode=search_mode
+        )
+        return scores, indices
 
     async def laion_search(
         self,
         top_k: int,
-        query_vectors: Tensor
-    ) -> List[int]:
+        query_vectors: Union[Tensor, np.ndarray],
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
         Searches the LAION FAISS index for the top-k nearest neighbors.
 
         Args:
             top_k (int): The number of nearest neighbors to retrieve.
-            query_vectors (Tensor): The query vectors to search against the index.
+            query_vectors (Union[Tensor, np.ndarray]): The query vectors to search
+                against the index.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range", see `multi_search`.
 
         Returns:
-            List[int]: A list of indices of the top-k nearest neighbors.
+            Tuple[np.ndarray, np.ndarray]: The similarity scores and the parallel
+            indices of the top-k nearest neighbors.
         """
-        query_vectors = query_vectors.cpu().detach().numpy()
-        _, indices = self._laion_index.search(query_vectors, top_k)
-        return indices
+        scores, indices = await self.multi_search(
+            model_type="laion_clip",
+            top_k=top_k,
+            query_vectors=query_vectors,
+            min_score=min_score,
+            search_mode=search_mode
+        )
+        return scores, indices
+
+    async def multi_search(
+        self,
+        model_type: str,
+        top_k: int,
+        query_vectors: Union[Tensor, np.ndarray],
+        min_score: Optional[float] = None,
+        search_mode: str = "knn",
+        id_filter: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Searches the index of a model with a whole (n, d) query matrix in one call.
+
+        Args:
+            model_type (str): The model whose index is searched.
+            top_k (int): The number of nearest neighbors to retrieve per query,
+                clamped to the configured maximum of the search mode.
+            query_vectors (Union[Tensor, np.ndarray]): The (n, d) query vectors.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" for the top-k neighbours, or "range" for every
+                result above `min_score`, best first and at most `top_k`.
+            id_filter (np.ndarray): Restricts a "knn" search to these FAISS ids.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: One row of similarity scores and one
+            parallel row of indices per query vector. Rows are separate arrays of
+            varying length when `min_score` is given.
+
+        Raises:
+            ValueError: If the search mode is unknown or range mode has no `min_score`.
+        """
+        if search_mode == "range":
+            if min_score is None:
+                raise ValueError("Range search requires min_score")
+            if id_filter is not None:
+                raise ValueError("Range search cannot be restricted to ids")
+            pool_name, index = self._get_index(model_type, cpu=True)
+            return await self._executor.run(
+                pool_name,
+                self._range_search,
+                index,
+                min_score,
+                max(1, min(int(top_k), self._max_range_results)),
+                query_vectors
+            )
+        if search_mode != "knn":
+            raise ValueError(f"Unknown search mode: {search_mode}")
+        if id_filter is not None:
+            if len(id_filter) == 0:
+                rows = len(query_vectors)
+                return [np.empty(0, np.float32)] * rows, [np.empty(0, np.int64)] * rows
+            # GPU indexes do not take IDSelectors, so the CPU copy is searched.
+            pool_name, index = self._get_index(model_type, cpu=True)
+            scores, indices = await self._executor.run(
+                pool_name,
+                self._filtered_search,
+                index,
+                max(1, min(int(top_k), self._max_top_k)),
+                query_vectors,
+                id_filter,
+                self._subset_scan_limit,
+                self._rerank_stores.get(model_type)
+            )
+        else:
+            pool_name, index = self._get_index(model_type)
+            max_k = GPU_MAX_K if model_type in self._gpu_resources else index.ntotal
+            scores, indices = await self._executor.run(
+                pool_name,
+                self._search,
+                index,
+                max(1, min(int(top_k), self._max_top_k, index.ntotal, max_k)),
+                query_vectors,
+                self._rerank_stores.get(model_type),
+                max_k
+            )
+        if min_score is None:
+            return scores, indices
+        # Rows are sorted best first, so the cutoff keeps a prefix of each.
+        keep = [int(np.count_nonzero(row >= min_score)) for row in scores]
+        return (
+            [row[:n] for row, n in zip(scores, keep)],
+            [row[:n] for row, n in zip(indices, keep)]
+        )
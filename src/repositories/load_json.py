@@ -3,28 +3,467 @@ Loads and processes JSON data for video and frame mapping.
 """
 
 import json
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.repositories.metadata_bundle import (MetadataBundle,
+                                              bundle_path,
+                                              is_bundle,
+                                              write_bundle)
+from src.utils.utility import release_free_memory
+
+BUNDLE_KIND = "clip"
+
+
+class _Columns:
+    """
+    One immutable version of the keyframe columns, indexed by FAISS id.
+    """
+
+    def __init__(
+        self,
+        video_codes: np.ndarray,
+        frame_numbers: np.ndarray,
+        format_codes: np.ndarray,
+        video_names: np.ndarray,
+        frame_formats: np.ndarray,
+        video_order: Optional[np.ndarray] = None,
+        video_offsets: Optional[np.ndarray] = None
+    ) -> None:
+        # -1 marks ids without a keyframe.
+        self.video_codes = video_codes
+        self.frame_numbers = frame_numbers
+        self.format_codes = format_codes
+        # Sorted, so names are found with a binary search.
+        self.video_names = video_names
+        self.frame_formats = frame_formats
+        # The ids of each video, grouped by video code: video c owns
+        # video_order[video_offsets[c]:video_offsets[c + 1]].
+        if video_order is None:
+            valid = np.flatnonzero(video_codes >= 0)
+            video_order = valid[np.argsort(video_codes[valid], kind="stable")]
+            video_offsets = np.searchsorted(
+                video_codes[video_order], np.arange(len(video_names) + 1)
+            )
+        self.video_order = video_order
+        self.video_offsets = video_offsets
+
+    @property
+    def count(self) -> int:
+        """
+        The number of keyframes.
+        """
+        return len(self.video_order)
+
+    def video_code(
+        self,
+        video_id: str
+    ) -> int:
+        """
+        Gets the code of a video, or -1 if it has no keyframe.
+        """
+        code = int(np.searchsorted(self.video_names, video_id))
+        if code < len(self.video_names) and self.video_names[code] == video_id:
+            return code
+        return -1
+
+    def video_indices(
+        self,
+        code: int
+    ) -> np.ndarray:
+        """
+        Gets the ids of a video, in increasing order.
+        """
+        return self.video_order[self.video_offsets[code]:self.video_offsets[code + 1]]
 
 
 class LoadJson:
     """
-    Loads a JSON file and creates a mapping of indices to video and frame IDs.
+    Loads a JSON file into a columnar keyframe store indexed by FAISS id: the
+    video code, frame number and frame id format of every keyframe in NumPy
+    arrays, with tables of the video names and frame id formats. The store
+    holds no Python object per keyframe or per video, and results are mapped
+    with one gather per column.
+
+    The columns can be compiled into a metadata bundle (`save_bundle` or
+    `python -m src.tools.compile_metadata`), which is memory-mapped on start
+    instead of parsed.
     """
 
     def __init__(
         self,
-        json_url: str
+        json_url: str,
+        use_bundle: bool = True
     ) -> None:
         """
         Initializes the LoadJson class by loading the JSON data and creating a mapping.
+        A bundle is opened instead when `json_url` is one, or when the bundle
+        compiled from the JSON file (`clip.json` -> `clip.bundle`) is up to date.
 
         Args:
-            json_url (str): The path to the JSON file containing the data.
+            json_url (str): The path to the JSON file containing the data, or to a bundle.
+            use_bundle (bool): Whether an up-to-date bundle may replace the JSON file.
         """
+        if is_bundle(json_url):
+            self._columns = self._open_bundle(MetadataBundle(json_url, BUNDLE_KIND))
+            return
+        if use_bundle and is_bundle(bundle_path(json_url)):
+            bundle = MetadataBundle(bundle_path(json_url), BUNDLE_KIND)
+            if bundle.is_fresh(json_url):
+                self._columns = self._open_bundle(bundle)
+                return
+        self._columns = _Columns(
+            video_codes=np.empty(0, dtype=np.int32),
+            frame_numbers=np.empty(0, dtype=np.int32),
+            format_codes=np.empty(0, dtype=np.int16),
+            video_names=np.empty(0, dtype=str),
+            frame_formats=np.empty(0, dtype=str)
+        )
         with open(json_url, "r", encoding="utf-8") as f:
-            self._mapping = json.load(f)
-        self._data = {
-            obj['indice']: {
-                'video_id': obj['video_id'],
-                'frame_id': obj['frame_id']
-            } for obj in self._mapping
-        }
+            self.append(json.load(f))
+        # The parsed records are gone; hand their heap back.
+        release_free_memory()
+
+    @staticmethod
+    def frame_number(
+        frame_id: Union[str, int]
+    ) -> int:
+        """
+        Converts a frame id such as "0123.jpg", "0123" or 123 to its frame number.
+
+        Args:
+            frame_id (Union[str, int]): The frame id.
+
+        Returns:
+            int: The frame number.
+        """
+        return int(str(frame_id).split('.', maxsplit=1)[0])
+
+    def get_indice(
+        self,
+        video_id: str,
+        frame_id: Union[str, int]
+    ) -> int:
+        """
+        Gets the FAISS id of a keyframe.
+
+        Args:
+            video_id (str): The video id, e.g. "L01_V001".
+            frame_id (Union[str, int]): The frame id, with or without extension.
+
+        Returns:
+            int: The FAISS id of the keyframe.
+
+        Raises:
+            KeyError: If the keyframe is not in the mapping.
+        """
+        columns = self._columns
+        code = columns.video_code(video_id)
+        if code >= 0:
+            indices = columns.video_indices(code)
+            matches = indices[columns.frame_numbers[indices] == self.frame_number(frame_id)]
+            if len(matches):
+                return int(matches[0])
+        raise KeyError(f"Keyframe {video_id}/{frame_id} is not indexed")
+
+    def get_video_indices(
+        self,
+        video_ids: Iterable[str]
+    ) -> np.ndarray:
+        """
+        Gets the FAISS ids of every keyframe of some videos.
+
+        Args:
+            video_ids (Iterable[str]): The video ids; unknown ones are skipped.
+
+        Returns:
+            np.ndarray: The sorted int64 ids.
+        """
+        columns = self._columns
+        codes = [columns.video_code(video_id) for video_id in set(video_ids)]
+        arrays = [columns.video_indices(code) for code in codes if code >= 0]
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(arrays))
+
+    def get_indices_after(
+        self,
+        video_frames: Dict[str, int]
+    ) -> np.ndarray:
+        """
+        Gets the FAISS ids of the keyframes of some videos that come after a frame.
+
+        Args:
+            video_frames (Dict[str, int]): Per video id, the frame number the
+                keyframes must come strictly after; unknown videos are skipped.
+
+        Returns:
+            np.ndarray: The sorted int64 ids.
+        """
+        columns = self._columns
+        arrays = []
+        for video_id, frame_number in video_frames.items():
+            code = columns.video_code(video_id)
+            if code >= 0:
+                indices = columns.video_indices(code)
+                arrays.append(indices[columns.frame_numbers[indices] > frame_number])
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(arrays))
+
+    def map_indices(
+        self,
+        indices: np.ndarray,
+        scores: Optional[np.ndarray] = None
+    ) -> List[Dict]:
+        """
+        Maps a row of FAISS ids to their keyframes with one gather per column.
+
+        Args:
+            indices (np.ndarray): The FAISS ids; -1 and unknown ids are skipped.
+            scores (np.ndarray): The similarity scores parallel to `indices`, added
+                to each result as "score" when given.
+
+        Returns:
+            List[Dict]: New dicts with "video_id", "frame_id" and possibly "score".
+        """
+        columns = self._columns
+        indices = np.asarray(indices, dtype=np.int64)
+        keep = (indices >= 0) & (indices < len(columns.video_codes))
+        keep[keep] = columns.video_codes[indices[keep]] >= 0
+        indices = indices[keep]
+        video_ids = columns.video_names[columns.video_codes[indices]].tolist()
+        frame_formats = columns.frame_formats[columns.format_codes[indices]].tolist()
+        frame_numbers = columns.frame_numbers[indices].tolist()
+        if scores is None:
+            return [
+                {'video_id': video_id, 'frame_id': frame_format % number}
+                for video_id, frame_format, number
+                in zip(video_ids, frame_formats, frame_numbers)
+            ]
+        return [
+            {'video_id': video_id, 'frame_id': frame_format % number, 'score': score}
+            for video_id, frame_format, number, score
+            in zip(video_ids, frame_formats, frame_numbers, np.asarray(scores)[keep].tolist())
+        ]
+
+    def __len__(self) -> int:
+        """
+        The number of indexed keyframes.
+        """
+        return self._columns.count
+
+    def checkpoint(self) -> object:
+        """
+        Gets the current version of the mapping, to be restored by `rollback`
+        if a change made after it has to be undone.
+
+        Returns:
+            object: An opaque version of the mapping.
+        """
+        return self._columns
+
+    def rollback(
+        self,
+        checkpoint: object
+    ) -> None:
+        """
+        Restores a version of the mapping returned by `checkpoint`.
+
+        Args:
+            checkpoint (object): The version to restore.
+        """
+        self._columns = checkpoint
+
+    @staticmethod
+    def _parse_frame_ids(
+        frame_ids: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Splits frame ids such as "0123.jpg" into frame numbers and the %-format
+        strings that rebuild them, e.g. "%04d.jpg".
+        """
+        parts = np.char.partition(frame_ids, '.')
+        stems, dots, extensions = parts[:, 0], parts[:, 1], parts[:, 2]
+        numbers = stems.astype(np.int64)
+        widths = np.char.str_len(stems).astype(str)
+        formats = np.char.add(
+            np.char.add(np.char.add("%0", widths), "d"),
+            np.char.add(dots, np.char.replace(extensions, "%", "%%"))
+        )
+        return numbers, formats
+
+    @staticmethod
+    def _merge_table(
+        table: np.ndarray,
+        values: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Merges values into a sorted string table; returns the new table, the new
+        codes of its old entries and the codes of the values.
+        """
+        merged = np.union1d(table, values)
+        return merged, np.searchsorted(merged, table), np.searchsorted(merged, values)
+
+    def append(
+        self,
+        records: List[Dict]
+    ) -> None:
+        """
+        Adds keyframes to the mapping. A new version of the columns is built and
+        swapped in, so lookups running concurrently see either the old or the
+        extended mapping.
+
+        Args:
+            records (List[Dict]): Entries with "indice", "video_id" and "frame_id".
+
+        Raises:
+            ValueError: If a record is incomplete or its indice is already mapped
+                to another keyframe.
+        """
+        if not records:
+            return
+        columns = self._columns
+        try:
+            indices = np.array([obj['indice'] for obj in records], dtype=np.int64)
+            video_ids = np.array([obj['video_id'] for obj in records], dtype=str)
+            frame_ids = np.array([str(obj['frame_id']) for obj in records], dtype=str)
+        except KeyError as e:
+            raise ValueError("Records need indice, video_id and frame_id") from e
+        known = (indices >= 0) & (indices < len(columns.video_codes))
+        known[known] = columns.video_codes[indices[known]] >= 0
+        for position in np.flatnonzero(known).tolist():
+            current = self.map_indices(indices[position:position + 1])[0]
+            if (current['video_id'], current['frame_id']) != (video_ids[position], frame_ids[position]):
+                raise ValueError(f"Indice {indices[position]} is already mapped to another keyframe")
+        new = ~known
+        if not new.any():
+            return
+        indices, video_ids = indices[new], video_ids[new]
+        if indices.min() < 0 or np.any(np.diff(np.sort(indices)) == 0):
+            raise ValueError("Records need distinct, non-negative indices")
+        frame_numbers, frame_formats = self._parse_frame_ids(frame_ids[new])
+        video_names, old_video_codes, new_video_codes = self._merge_table(
+            columns.video_names, video_ids
+        )
+        formats, old_format_codes, new_format_codes = self._merge_table(
+            columns.frame_formats, frame_formats
+        )
+
+        size = max(len(columns.video_codes), int(indices.max()) + 1)
+        valid = np.flatnonzero(columns.video_codes >= 0)
+        video_codes = np.full(size, -1, dtype=np.int32)
+        video_codes[valid] = old_video_codes[columns.video_codes[valid]]
+        video_codes[indices] = new_video_codes
+        numbers = np.zeros(size, dtype=np.int32)
+        numbers[valid] = columns.frame_numbers[valid]
+        numbers[indices] = frame_numbers
+        format_codes = np.zeros(size, dtype=np.int16)
+        format_codes[valid] = old_format_codes[columns.format_codes[valid]]
+        format_codes[indices] = new_format_codes
+        self._columns = _Columns(
+            video_codes=video_codes,
+            frame_numbers=numbers,
+            format_codes=format_codes,
+            video_names=video_names,
+            frame_formats=formats
+        )
+
+    def extend_from(
+        self,
+        json_url: str
+    ) -> int:
+        """
+        Adds the keyframes of a newer version of the JSON file.
+
+        Args:
+            json_url (str): The path to the newer JSON file or bundle.
+
+        Returns:
+            int: The number of indexed keyframes afterwards.
+        """
+        if is_bundle(json_url):
+            self.append(LoadJson(json_url).records())
+        else:
+            with open(json_url, "r", encoding="utf-8") as f:
+                self.append(json.load(f))
+        return len(self)
+
+    def records(self) -> List[Dict]:
+        """
+        Gets every keyframe as an entry of the JSON format, in FAISS id order.
+
+        Returns:
+            List[Dict]: Entries with "indice", "video_id" and "frame_id".
+        """
+        indices = np.flatnonzero(self._columns.video_codes >= 0)
+        return [
+            dict(indice=indice, **keyframe)
+            for indice, keyframe in zip(indices.tolist(), self.map_indices(indices))
+        ]
+
+    def save(
+        self,
+        json_url: str
+    ) -> None:
+        """
+        Writes the mapping in the format it was loaded from.
+
+        Args:
+            json_url (str): The path to write.
+        """
+        with open(json_url, "w", encoding="utf-8") as f:
+            json.dump(self.records(), f, ensure_ascii=False)
+
+    @staticmethod
+    def _open_bundle(
+        bundle: MetadataBundle
+    ) -> _Columns:
+        """
+        Builds the columns on the memory-mapped arrays of a bundle.
+        """
+        return _Columns(
+            video_codes=bundle.array("video_codes"),
+            frame_numbers=bundle.array("frame_numbers"),
+            format_codes=bundle.array("format_codes"),
+            video_names=bundle.strings("video_names").to_array(),
+            frame_formats=bundle.strings("frame_formats").to_array(),
+            video_order=bundle.array("video_order"),
+            video_offsets=bundle.array("video_offsets")
+        )
+
+    def save_bundle(
+        self,
+        bundle_url: str,
+        source_url: Optional[str] = None
+    ) -> str:
+        """
+        Writes the columns as a metadata bundle.
+
+        Args:
+            bundle_url (str): The bundle directory to write.
+            source_url (str): The JSON file holding the same mapping; LoadJson then
+                opens the bundle in its place while the file is unchanged.
+
+        Returns:
+            str: The path of the bundle.
+        """
+        columns = self._columns
+        return write_bundle(
+            bundle_url,
+            kind=BUNDLE_KIND,
+            arrays={
+                "video_codes": columns.video_codes,
+                "frame_numbers": columns.frame_numbers,
+                "format_codes": columns.format_codes,
+                "video_order": columns.video_order,
+                "video_offsets": columns.video_offsets
+            },
+            strings={
+                "video_names": columns.video_names.tolist(),
+                "frame_formats": columns.frame_formats.tolist()
+            },
+            source_url=source_url,
+            meta={"count": columns.count}
+        )
@@ -0,0 +1,264 @@
+"""
+Reads and writes precompiled metadata bundles: a directory of `.npy` arrays
+and string tables that are memory-mapped on open instead of parsed.
+"""
+
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+BUNDLE_MANIFEST = "bundle.json"
+BUNDLE_VERSION = 1
+
+
+class StringTable:
+    """
+    Variable-length UTF-8 strings stored as one byte blob and the offsets of
+    each string in it; string i is data[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(
+        self,
+        offsets: np.ndarray,
+        data: np.ndarray
+    ) -> None:
+        """
+        Initialize the StringTable class.
+
+        Args:
+            offsets (np.ndarray): The (n + 1,) int64 offsets.
+            data (np.ndarray): The uint8 blob.
+        """
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, stop = self._offsets[i], self._offsets[i + 1]
+        return self._data[start:stop].tobytes().decode("utf-8")
+
+    def take(
+        self,
+        codes: Sequence[int]
+    ) -> List[str]:
+        """
+        Gets several strings.
+
+        Args:
+            codes (Sequence[int]): The string numbers.
+
+        Returns:
+            List[str]: The strings.
+        """
+        return [self[code] for code in codes]
+
+    def to_array(self) -> np.ndarray:
+        """
+        Decodes the whole table into a NumPy string array; meant for small tables.
+        """
+        return np.array([self[i] for i in range(len(self))], dtype=str)
+
+
+def bundle_path(
+    source_url: str
+) -> str:
+    """
+    Gets the bundle compiled from a source file, e.g. `clip.json` -> `clip.bundle`.
+
+    Args:
+        source_url (str): The path to the source metadata.
+
+    Returns:
+        str: The path to its bundle directory.
+    """
+    return f"{os.path.splitext(source_url)[0]}.bundle"
+
+
+def is_bundle(
+    url: str
+) -> bool:
+    """
+    Whether a path is a metadata bundle.
+    """
+    return os.path.isfile(os.path.join(url, BUNDLE_MANIFEST))
+
+
+def source_stamp(
+    source_url: str
+) -> Dict:
+    """
+    Identifies a version of a source file by its size and modification time.
+    """
+    stat = os.stat(source_url)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_bundle(
+    url: str,
+    kind: str,
+    arrays: Dict[str, np.ndarray],
+    strings: Optional[Dict[str, Sequence[str]]] = None,
+    source_url: Optional[str] = None,
+    meta: Optional[Dict] = None
+) -> str:
+    """
+    Writes a bundle. It is built in a temporary directory and renamed into
+    place, so readers never see a partial bundle. A directory cannot be
+    renamed over another atomically, so an existing bundle is first renamed
+    aside: between the two renames readers find no bundle and fall back to
+    the source file. The previous bundle is restored if the swap fails.
+
+    Args:
+        url (str): The bundle directory to write.
+        kind (str): What the bundle holds, e.g. "clip"; checked on open.
+        arrays (Dict[str, np.ndarray]): Fixed-width columns by name.
+        strings (Dict[str, Sequence[str]]): String tables by name.
+        source_url (str): The file the bundle was compiled from, recorded so that
+            a stale bundle is not used.
+        meta (Dict): Extra metadata stored in the manifest.
+
+    Returns:
+        str: The path of the bundle.
+    """
+    tmp_url = f"{url}.tmp"
+    shutil.rmtree(tmp_url, ignore_errors=True)
+    os.makedirs(tmp_url)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_url, f"{name}.npy"), np.ascontiguousarray(array))
+    for name, values in (strings or {}).items():
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        np.save(os.path.join(tmp_url, f"{name}.offsets.npy"), offsets)
+        np.save(os.path.join(tmp_url, f"{name}.data.npy"),
+                np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    manifest = {
+        "kind": kind,
+        "version": BUNDLE_VERSION,
+        "arrays": sorted(arrays),
+        "strings": sorted(strings or {}),
+        "source": None if source_url is None else dict(
+            path=os.path.abspath(source_url), **source_stamp(source_url)
+        ),
+        "meta": meta or {}
+    }
+    with open(os.path.join(tmp_url, BUNDLE_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    old_url = f"{url}.old"
+    shutil.rmtree(old_url, ignore_errors=True)
+    replacing = os.path.exists(url)
+    if replacing:
+        os.rename(url, old_url)
+    try:
+        os.rename(tmp_url, url)
+    except OSError:
+        if replacing:
+            os.rename(old_url, url)
+        raise
+    # Open readers keep their mappings of the removed files.
+    shutil.rmtree(old_url, ignore_errors=True)
+    return url
+
+
+class MetadataBundle:
+    """
+    An opened bundle. Only the manifest is read on open; arrays are memory-mapped
+    read-only on first access, so pages are loaded on demand and shared between
+    worker processes through the page cache.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        kind: str
+    ) -> None:
+        """
+        Initialize the MetadataBundle class.
+
+        Args:
+            url (str): The bundle directory.
+            kind (str): The expected kind.
+
+        Raises:
+            ValueError: If the bundle is of another kind or format version.
+        """
+        self._url = url
+        with open(os.path.join(url, BUNDLE_MANIFEST), "r", encoding="utf-8") as f:
+            self._manifest = json.load(f)
+        if self._manifest.get("kind") != kind:
+            raise ValueError(f"{url} holds {self._manifest.get('kind')} metadata, not {kind}")
+        if self._manifest.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"{url} has bundle version {self._manifest.get('version')}")
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    @property
+    def meta(self) -> Dict:
+        """
+        The extra metadata of the bundle.
+        """
+        return self._manifest["meta"]
+
+    def is_fresh(
+        self,
+        source_url: str
+    ) -> bool:
+        """
+        Whether the bundle was compiled from the current version of a source file.
+        """
+        source = self._manifest.get("source")
+        if source is None or not os.path.exists(source_url):
+            return False
+        stamp = source_stamp(source_url)
+        return source["size"] == stamp["size"] and source["mtime_ns"] == stamp["mtime_ns"]
+
+    def _load(
+        self,
+        name: str
+    ) -> np.ndarray:
+        if name not in self._arrays:
+            path = os.path.join(self._url, f"{name}.npy")
+            try:
+                self._arrays[name] = np.load(path, mmap_mode="r")
+            except ValueError:
+                # Empty arrays cannot be mapped.
+                self._arrays[name] = np.load(path)
+        return self._arrays[name]
+
+    def array(
+        self,
+        name: str
+    ) -> np.ndarray:
+        """
+        Gets a fixed-width column.
+
+        Args:
+            name (str): The column name.
+
+        Returns:
+            np.ndarray: The read-only memory-mapped column.
+        """
+        if name not in self._manifest["arrays"]:
+            raise KeyError(f"{self._url} has no array {name}")
+        return self._load(name)
+
+    def strings(
+        self,
+        name: str
+    ) -> StringTable:
+        """
+        Gets a string table.
+
+        Args:
+            name (str): The table name.
+
+        Returns:
+            StringTable: The memory-mapped table.
+        """
+        if name not in self._manifest["strings"]:
+            raise KeyError(f"{self._url} has no string table {name}")
+        return StringTable(self._load(f"{name}.offsets"), self._load(f"{name}.data"))
@@ -0,0 +1,136 @@
+"""
+Exact float32 vectors used to re-rank the candidates of a compressed FAISS index.
+"""
+
+import os
+from typing import Tuple
+
+import numpy as np
+
+
+class RerankStore:
+    """
+    Memory-maps the (n, d) float32 embeddings of an index from a `.npy` file.
+    Only the rows of the candidates being re-ranked are read, so the full
+    vectors stay on disk and in the shared page cache instead of private memory.
+    """
+
+    def __init__(
+        self,
+        vectors_url: str,
+        normalize: bool = True,
+        candidates: int = 4000
+    ) -> None:
+        """
+        Initialize the RerankStore class.
+
+        Args:
+            vectors_url (str): The path to the `.npy` embeddings, row i holding id i.
+            normalize (bool): Whether rows are L2-normalized when read, for files
+                holding raw embeddings.
+            candidates (int): The number of compressed-index results re-ranked per query.
+        """
+        self._vectors_url = vectors_url
+        self._vectors = np.load(vectors_url, mmap_mode="r")
+        self._normalize = normalize
+        self._candidates = candidates
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """
+        The (n, d) shape of the stored vectors.
+        """
+        return self._vectors.shape
+
+    @property
+    def candidates(self) -> int:
+        """
+        The number of candidates re-ranked per query.
+        """
+        return self._candidates
+
+    def nbytes(self) -> int:
+        """
+        The size of the mapped file in bytes.
+        """
+        return os.path.getsize(self._vectors_url)
+
+    def vectors(
+        self,
+        ids: np.ndarray
+    ) -> np.ndarray:
+        """
+        Reads the exact vectors of some ids.
+
+        Args:
+            ids (np.ndarray): The ids, best sorted so that reads are sequential.
+
+        Returns:
+            np.ndarray: The (len(ids), d) float32 vectors.
+        """
+        vectors = np.asarray(self._vectors[ids], dtype=np.float32)
+        if self._normalize:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.maximum(norms, 1e-12)
+        return vectors
+
+    def rerank(
+        self,
+        query_vectors: np.ndarray,
+        candidate_ids: np.ndarray,
+        top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores the candidates of each query exactly and keeps the best.
+
+        Args:
+            query_vectors (np.ndarray): The (n, d) float32 queries.
+            candidate_ids (np.ndarray): The (n, c) candidate ids, -1 for none.
+            top_k (int): The number of results kept per query.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The (n, top_k) exact scores in descending
+            order and the parallel ids, padded with -inf and -1.
+        """
+        scores_out = np.full((len(query_vectors), top_k), -np.inf, dtype=np.float32)
+        ids_out = np.full((len(query_vectors), top_k), -1, dtype=np.int64)
+        for row, (query, ids) in enumerate(zip(query_vectors, candidate_ids)):
+            ids = np.sort(ids[ids >= 0])
+            if len(ids) == 0:
+                continue
+            scores = self.vectors(ids) @ query
+            k = min(top_k, len(ids))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            scores_out[row, :k] = scores[top]
+            ids_out[row, :k] = ids[top]
+        return scores_out, ids_out
+
+
+def append_vectors(
+    vectors_url: str,
+    new_vectors: np.ndarray,
+    output_url: str,
+    chunk_rows: int = 65536
+) -> None:
+    """
+    Writes a copy of a `.npy` embedding file with rows appended, in chunks so
+    that the existing rows are never all in memory.
+
+    Args:
+        vectors_url (str): The current `.npy` file.
+        new_vectors (np.ndarray): The (m, d) rows to append.
+        output_url (str): The `.npy` file to write.
+        chunk_rows (int): The number of rows copied at a time.
+    """
+    current = np.load(vectors_url, mmap_mode="r")
+    total = current.shape[0] + new_vectors.shape[0]
+    output = np.lib.format.open_memmap(
+        output_url, mode="w+", dtype=current.dtype, shape=(total, current.shape[1])
+    )
+    for start in range(0, current.shape[0], chunk_rows):
+        stop = min(start + chunk_rows, current.shape[0])
+        output[start:stop] = current[start:stop]
+    output[current.shape[0]:] = new_vectors
+    output.flush()
+    del output
@@ -2,13 +2,20 @@
 Implements text retrieval using CLIP embeddings and FAISS index.
 """
 
-from io import BytesIO
-from typing import List, Dict
+import hashlib
+from typing import List, Dict, Optional
 
+import numpy as np
+import torch
+
+from src.modules.embedding_cache import EmbeddingCache
+from src.modules.image_preprocessor import ImagePreprocessor
 from src.modules.original_clip import OriginalCLIP
 from src.modules.apple_clip import AppleCLIP
 from src.modules.laion_clip import LaionCLIP
 from src.repositories.load_faiss import ClipFaiss
+from src.repositories.load_json import LoadJson
+from src.services.model_manager import ModelManager
 
 
 class ImageClipRetrieval:
@@ -23,7 +30,11 @@ class ImageClipRetrieval:
         apple_clip: AppleCLIP,
         laion_clip: LaionCLIP,
         faiss: ClipFaiss,
-        data: Dict
+        data: LoadJson,
+        preprocessor: ImagePreprocessor,
+        frames: LoadJson,
+        models: ModelManager,
+        image_cache: Optional[EmbeddingCache] = None
     ) -> None:
         """
         Initializes the ClipSearch class with the provided CLIP models, FAISS index, and data.
@@ -34,7 +45,13 @@ class ImageClipRetrieval:
             apple_clip (AppleCLIP): An instance of the AppleCLIP model for generating embeddings.
             laion_clip (LaionCLIP): An instance of the LaionCLIP model for generating embeddings.
             faiss (ClipFaiss): An instance of the ClipFaiss class for performing FAISS
-            data (Dict): A dictionary mapping indices to video and frame information.
+            data (LoadJson): The keyframe store mapping indices to video and frame information.
+            preprocessor (ImagePreprocessor): The process pool decoding and transforming uploads.
+            frames (LoadJson): The keyframe mapping, used to resolve (video_id, frame_id) to ids.
+            models (ModelManager): Keeps the encoder and index of a model loaded
+                while it is used.
+            image_cache (EmbeddingCache): Optional cache of upload embeddings keyed by
+                `(model_type, content hash)`.
         """
         self._top_k = top_k
         self._original_clip = original_clip
@@ -42,130 +59,336 @@ class ImageClipRetrieval:
         self._laion_clip = laion_clip
         self._faiss = faiss
         self._data = data
+        self._preprocessor = preprocessor
+        self._frames = frames
+        self._models = models
+        self._image_cache = image_cache
+        self._encoders = {
+            "original_clip": original_clip,
+            "apple_clip": apple_clip,
+            "laion_clip": laion_clip
+        }
 
     async def mapping_results(
         self,
-        data: Dict,
-        indices: List[int]
+        data: LoadJson,
+        indices: np.ndarray,
+        scores: Optional[np.ndarray] = None
     ) -> List:
         """
         Maps the search result indices to the corresponding data entries.
 
         Args:
-            data (Dict): A dictionary where keys are indices and values are associated data.
-            indices (List[int]): A list of indices retrieved from a search operation.
+            data (LoadJson): The keyframe store mapping indices to their entries.
+            indices (np.ndarray): A row of indices retrieved from a search operation.
+            scores (np.ndarray): The similarity scores parallel to `indices`, added
+                to each entry as "score" when given.
 
         Returns:
             List: A list of data entries corresponding to the indices.
         """
-        filtered_list = [data[indice] for indice in indices if indice in data]
-        return filtered_list
+        return data.map_indices(indices, scores)
+
+    @staticmethod
+    def content_hash(image: bytes) -> str:
+        """
+        Computes the content hash used as the image cache key.
+
+        Args:
+            image (bytes): The raw upload bytes.
+
+        Returns:
+            str: The hex digest of the upload.
+        """
+        return hashlib.blake2b(image, digest_size=16).hexdigest()
+
+    async def pixel_values(
+        self,
+        model_type: str,
+        image: bytes
+    ) -> torch.Tensor:
+        """
+        Decodes and transforms an upload on the preprocessing pool and stacks it
+        into a model input batch.
+
+        Args:
+            model_type (str): The model whose transform is applied.
+            image (bytes): The raw upload bytes.
+
+        Returns:
+            torch.Tensor: The model input with shape (1, 3, H, W).
+        """
+        if not self._preprocessor.is_registered(model_type):
+            # Transforms come from the loaded model, so register them on first use.
+            transform, input_size = self._encoders[model_type].image_transform()
+            self._preprocessor.register(
+                model_type=model_type,
+                transform=transform,
+                input_size=input_size
+            )
+        pixels = await self._preprocessor.preprocess(
+            model_type=model_type,
+            data=image
+        )
+        return torch.from_numpy(np.stack([pixels]))
+
+    async def image_vector(
+        self,
+        model_type: str,
+        image: bytes,
+        image_hash: Optional[str] = None
+    ) -> np.ndarray:
+        """
+        Embeds an upload, reusing the cached embedding of identical bytes.
+        A cache hit skips both decoding and the model.
+
+        Args:
+            model_type (str): The model used for the embedding.
+            image (bytes): The raw upload bytes.
+            image_hash (str): The content hash of the upload, computed if not given.
+
+        Returns:
+            np.ndarray: The image embedding with shape (1, d).
+        """
+        key = None
+        if self._image_cache is not None:
+            key = (model_type, image_hash or self.content_hash(image))
+            cached = self._image_cache.get(key)
+            if cached is not None:
+                return cached
+        vector_embedding = await self._encoders[model_type].image_embedding(
+            pixel_values=await self.pixel_values(
+                model_type=model_type,
+                image=image
+            )
+        )
+        vector_embedding = vector_embedding.detach().float().cpu().numpy()
+        if key is not None:
+            self._image_cache.put(key, vector_embedding)
+        return vector_embedding
 
     async def original_image_retrieval(
         self,
-        image: BytesIO
+        image: bytes,
+        image_hash: Optional[str] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         Retrieves text data using the original CLIP model.
 
         Args:
-            text (str): The input text to retrieve data for.
+            image (bytes): The raw bytes of the query image.
+            image_hash (str): The content hash of the image, computed if not given.
+            top_k (int): The number of results, defaulting to the service top_k.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range".
 
         Returns:
             List[Dict]: A list of dictionaries containing the retrieval results.
         """
-        vector_embedding = await self._original_clip.image_embedding(
-            image=image
+        vector_embedding = await self.image_vector(
+            model_type="original_clip",
+            image=image,
+            image_hash=image_hash
         )
-        indices = await self._faiss.original_search(
-            top_k=self._top_k,
-            query_vectors=vector_embedding
+        scores, indices = await self._faiss.original_search(
+            top_k=self._top_k if top_k is None else top_k,
+            query_vectors=vector_embedding,
+            min_score=min_score,
+            search_mode=search_mode
         )
         result = await self.mapping_results(
             data=self._data,
-            indices=indices[0]
+            indices=indices[0],
+            scores=scores[0]
         )
         return result
 
     async def apple_image_retrieval(
         self,
-        image: BytesIO
+        image: bytes,
+        image_hash: Optional[str] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         Retrieves text data using the apple CLIP model.
 
         Args:
-            text (str): The input text to retrieve data for.
+            image (bytes): The raw bytes of the query image.
+            image_hash (str): The content hash of the image, computed if not given.
+            top_k (int): The number of results, defaulting to the service top_k.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range".
 
         Returns:
             List[Dict]: A list of dictionaries containing the retrieval results.
         """
-        vector_embedding = await self._apple_clip.image_embedding(
-            image=image
+        vector_embedding = await self.image_vector(
+            model_type="apple_clip",
+            image=image,
+            image_hash=image_hash
         )
-        indices = await self._faiss.apple_search(
-            top_k=self._top_k,
-            query_vectors=vector_embedding
+        scores, indices = await self._faiss.apple_search(
+            top_k=self._top_k if top_k is None else top_k,
+            query_vectors=vector_embedding,
+            min_score=min_score,
+            search_mode=search_mode
         )
         result = await self.mapping_results(
             data=self._data,
-            indices=indices[0]
+            indices=indices[0],
+            scores=scores[0]
         )
         return result
 
     async def laion_image_retrieval(
         self,
-        image: BytesIO
+        image: bytes,
+        image_hash: Optional[str] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         Retrieves text data using the laion CLIP model.
 
         Args:
-            text (str): The input text to retrieve data for.
+            image (bytes): The raw bytes of the query image.
+            image_hash (str): The content hash of the image, computed if not given.
+            top_k (int): The number of results, defaulting to the service top_k.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range".
 
         Returns:
             List[Dict]: A list of dictionaries containing the retrieval results.
         """
-        vector_embedding = await self._laion_clip.image_embedding(
-            image=image
+        vector_embedding = await self.image_vector(
+            model_type="laion_clip",
+            image=image,
+            image_hash=image_hash
         )
-        indices = await self._faiss.laion_search(
-            top_k=self._top_k,
-            query_vectors=vector_embedding
+        scores, indices = await self._faiss.laion_search(
+            top_k=self._top_k if top_k is None else top_k,
+            query_vectors=vector_embedding,
+            min_score=min_score,
+            search_mode=search_mode
+        )
+        result = await self.mapping_results(
+            data=self._data,
+            indices=indices[0],
+            scores=scores[0]
         )
+        return result
+
+    async def keyframe_retrieval(
+        self,
+        model_type: str,
+        video_id: Optional[str] = None,
+        frame_id: Optional[str] = None,
+        indice: Optional[int] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
+    ) -> List[Dict]:
+        """
+        Retrieves keyframes similar to a keyframe that is already indexed, using
+        its stored vector instead of re-encoding the image.
+
+        Args:
+            model_type (str): The type of model whose index is searched.
+            video_id (str): The video of the query keyframe.
+            frame_id (str): The frame of the query keyframe.
+            indice (int): The FAISS id of the query keyframe, used instead of
+                `video_id` and `frame_id` when given.
+            top_k (int): The number of results, defaulting to the service top_k.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range".
+
+        Returns:
+            List[Dict]: A list of dictionaries containing the retrieval results.
+        """
+        if model_type not in self._encoders:
+            return {
+                "error": "Model type not supported"
+            }
+        if indice is None:
+            if not video_id or frame_id is None:
+                raise ValueError("Either indice or video_id and frame_id are required")
+            indice = self._frames.get_indice(
+                video_id=video_id,
+                frame_id=frame_id
+            )
+        async with self._models.use(model_type):
+            vector_embedding = await self._faiss.reconstruct(
+                model_type=model_type,
+                indice=indice
+            )
+            scores, indices = await self._faiss.multi_search(
+                model_type=model_type,
+                top_k=self._top_k if top_k is None else top_k,
+                query_vectors=vector_embedding,
+                min_score=min_score,
+                search_mode=search_mode
+            )
         result = await self.mapping_results(
             data=self._data,
-            indices=indices[0]
+            indices=indices[0],
+            scores=scores[0]
         )
         return result
 
     async def image_retrieval(
         self,
         model_type: str,
-        image: BytesIO
+        image: bytes,
+        image_hash: Optional[str] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         Retrieves text data based on the specified model type.
 
         Args:
             model_type (str): The type of model to use for retrieval.
-            text (str): The input text to retrieve data for.
+            image (bytes): The raw bytes of the query image.
+            image_hash (str): The content hash of the image, computed if not given.
+            top_k (int): The number of results, defaulting to the service top_k.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range".
 
         Returns:
             List[Dict]: A list of dictionaries containing the retrieval results.
         """
-        if model_type == "original_clip":
-            return await self.original_image_retrieval(
-                image=image
-            )
-        if model_type == "apple_clip":
-            return await self.apple_image_retrieval(
-                image=image
-            )
-        if model_type == "laion_clip":
+        if model_type not in self._models.model_types:
+            return {
+                "error": "Model type not supported"
+            }
+        async with self._models.use(model_type):
+            if model_type == "original_clip":
+                return await self.original_image_retrieval(
+                    image=image,
+                    image_hash=image_hash,
+                    top_k=top_k,
+                    min_score=min_score,
+                    search_mode=search_mode
+                )
+            if model_type == "apple_clip":
+                return await self.apple_image_retrieval(
+                    image=image,
+                    image_hash=image_hash,
+                    top_k=top_k,
+                    min_score=min_score,
+                    search_mode=search_mode
+                )
             return await self.laion_image_retrieval(
-                image=image
+                image=image,
+                image_hash=image_hash,
+                top_k=top_k,
+                min_score=min_score,
+                search_mode=search_mode
             )
-        return {
-            "error": "Model type not supported"
-        }
@@ -0,0 +1,251 @@
+"""
+Adds keyframes to the live indexes and switches to new index versions without
+restarting the service.
+"""
+
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.repositories.load_faiss import ClipFaiss
+from src.repositories.load_json import LoadJson
+from src.repositories.metadata_bundle import bundle_path
+from src.utils.executor import InferenceExecutor
+
+MODEL_TYPES = ("original_clip", "apple_clip", "laion_clip")
+
+
+class IndexAdmin:
+    """
+    Appends keyframes and reloads index versions. Every change writes new files
+    and opens every new index version first; only then is the keyframe mapping
+    extended and are the indexes swapped together, so that a failure leaves
+    the previous versions in place and queries in flight finish on the version
+    they started with. Every path must lie under the output directory.
+    """
+
+    def __init__(
+        self,
+        faiss: ClipFaiss,
+        frames: LoadJson,
+        executor: InferenceExecutor,
+        output_dir: str
+    ) -> None:
+        """
+        Initialize the IndexAdmin class.
+
+        Args:
+            faiss (ClipFaiss): The indexes of the three models.
+            frames (LoadJson): The keyframe mapping shared by the indexes.
+            executor (InferenceExecutor): Runs the blocking writes on its "admin" pool.
+            output_dir (str): The directory new index versions are written to, and
+                the only one versions, mappings and embeddings are read from.
+        """
+        self._faiss = faiss
+        self._frames = frames
+        self._executor = executor
+        self._output_dir = os.path.realpath(output_dir)
+        self._lock = asyncio.Lock()
+
+    def resolve_path(
+        self,
+        path: str
+    ) -> str:
+        """
+        Resolve a path given to the admin API, relative paths being taken from
+        the output directory.
+
+        Args:
+            path (str): The path.
+
+        Returns:
+            str: The absolute path, with symbolic links resolved.
+
+        Raises:
+            ValueError: If the path lies outside the output directory.
+        """
+        resolved = os.path.realpath(os.path.join(self._output_dir, path))
+        if os.path.commonpath([resolved, self._output_dir]) != self._output_dir:
+            raise ValueError(f"{path} is outside the index version directory")
+        return resolved
+
+    def versions(self) -> Dict[str, Dict]:
+        """
+        Report the current index version of every model.
+
+        Returns:
+            Dict[str, Dict]: Per model type, the index path and its vector count.
+        """
+        return {
+            model_type: {
+                "faiss": self._faiss.faiss_url(model_type),
+                "ntotal": self._faiss.ntotal(model_type)
+            } for model_type in MODEL_TYPES
+        }
+
+    async def ingest(
+        self,
+        records: List[Dict],
+        embeddings: Dict[str, np.ndarray],
+        output_dir: Optional[str] = None
+    ) -> Dict:
+        """
+        Append keyframes with their embedding under every model.
+
+        Args:
+            records (List[Dict]): The new keyframes, each with "video_id" and "frame_id".
+            embeddings (Dict[str, np.ndarray]): Per model type, the (n, d) vectors of
+                the records, in the same order.
+            output_dir (str): Where the new versions go, defaulting to the configured
+                one; it must lie under it.
+
+        Returns:
+            Dict: The new index paths, the new JSON path and the keyframe count.
+
+        Raises:
+            ValueError: If a model is missing, the row counts differ, the indexes
+                are out of sync with the mapping or `output_dir` is outside the
+                configured one.
+        """
+        if not records:
+            raise ValueError("No records to ingest")
+        missing = [m for m in MODEL_TYPES if m not in embeddings]
+        if missing:
+            raise ValueError(f"Embeddings are required for {', '.join(missing)}")
+        for model_type in MODEL_TYPES:
+            if len(embeddings[model_type]) != len(records):
+                raise ValueError(
+                    f"{model_type} has {len(embeddings[model_type])} vectors "
+                    f"for {len(records)} records"
+                )
+        output_dir = self.resolve_path(output_dir or self._output_dir)
+        async with self._lock:
+            start = len(self._frames)
+            for model_type in MODEL_TYPES:
+                ntotal = await self._executor.run("admin", self._faiss.ntotal, model_type)
+                if ntotal != start:
+                    raise ValueError(
+                        f"The {model_type} index has {ntotal} vectors "
+                        f"but the mapping has {start}"
+                    )
+            end = start + len(records)
+            os.makedirs(output_dir, exist_ok=True)
+            # Write every new version before anything becomes visible.
+            faiss_urls = {}
+            for model_type in MODEL_TYPES:
+                faiss_urls[model_type] = os.path.join(output_dir, f"{model_type}.{end}.faiss")
+                await self._executor.run(
+                    "admin",
+                    self._faiss.write_appended,
+                    model_type,
+                    embeddings[model_type],
+                    faiss_urls[model_type]
+                )
+            staged = await self._prepare(faiss_urls)
+            json_url = os.path.join(output_dir, f"clip.{end}.json")
+            await self._publish(
+                staged,
+                self._frames.append,
+                [
+                    {
+                        "indice": start + row,
+                        "video_id": record["video_id"],
+                        "frame_id": record["frame_id"]
+                    } for row, record in enumerate(records)
+                ],
+                json_url
+            )
+        return {
+            "faiss": faiss_urls,
+            "json": json_url,
+            "ntotal": end
+        }
+
+    async def reload(
+        self,
+        faiss_urls: Dict[str, str],
+        json_url: Optional[str] = None
+    ) -> Dict[str, Dict]:
+        """
+        Switch models to index versions built offline, e.g. by `src.tools.build_index`.
+
+        Args:
+            faiss_urls (Dict[str, str]): Per model type, the path of the new version.
+            json_url (str): A newer keyframe mapping covering the new vectors.
+
+        Returns:
+            Dict[str, Dict]: The current versions afterwards.
+
+        Raises:
+            ValueError: If a model type is unknown, a version drops vectors or a
+                path is outside the output directory.
+        """
+        unknown = [m for m in faiss_urls if m not in MODEL_TYPES]
+        if unknown:
+            raise ValueError(f"Model type not supported: {', '.join(unknown)}")
+        faiss_urls = {
+            model_type: self.resolve_path(faiss_url)
+            for model_type, faiss_url in faiss_urls.items()
+        }
+        json_url = self.resolve_path(json_url) if json_url else None
+        async with self._lock:
+            staged = await self._prepare(faiss_urls)
+            if json_url:
+                await self._publish(staged, self._frames.extend_from, json_url)
+            else:
+                await self._executor.run("admin", self._faiss.publish_indexes, staged)
+        return self.versions()
+
+    async def _prepare(
+        self,
+        faiss_urls: Dict[str, str]
+    ) -> Dict[str, Tuple]:
+        """
+        Open every new index version without publishing any.
+        """
+        staged = {}
+        for model_type, faiss_url in faiss_urls.items():
+            staged[model_type] = await self._executor.run(
+                "admin",
+                self._faiss.prepare_index,
+                model_type,
+                faiss_url
+            )
+        return staged
+
+    async def _publish(
+        self,
+        staged: Dict[str, Tuple],
+        extend: Callable,
+        source: Union[List[Dict], str],
+        json_url: Optional[str] = None
+    ) -> None:
+        """
+        Extend the keyframe mapping, save it to `json_url` if given, then swap
+        every staged index; the mapping is rolled back if any step fails. The
+        mapping grows first, so new ids resolve once they are searchable.
+
+        Args:
+            staged (Dict[str, Tuple]): The prepared index versions.
+            extend (Callable): Blocking function extending the mapping from `source`.
+            source: The new keyframes or the path of the newer mapping.
+            json_url (str): Where the extended mapping is saved.
+        """
+        checkpoint = self._frames.checkpoint()
+        try:
+            await self._executor.run("admin", extend, source)
+            if json_url:
+                await self._executor.run("admin", self._frames.save, json_url)
+                # Lets a restart on the new mapping skip parsing it.
+                await self._executor.run(
+                    "admin",
+                    self._frames.save_bundle,
+                    bundle_path(json_url),
+                    json_url
+                )
+            await self._executor.run("admin", self._faiss.publish_indexes, staged)
+        except BaseException:
+            self._frames.rollback(checkpoint)
+            raise
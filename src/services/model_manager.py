@@ -0,0 +1,313 @@
+"""
+Lazy loading of CLIP encoders and their FAISS indexes under a memory budget.
+"""
+
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import (AsyncIterator,
+                    Callable,
+                    Dict,
+                    Iterable,
+                    List,
+                    Optional)
+
+from src.utils.executor import InferenceExecutor
+
+
+class _ModelSlot:
+    """
+    Bookkeeping for one model type.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], int],
+        unload: Callable[[], None]
+    ) -> None:
+        self.load = load
+        self.unload = unload
+        self.loaded = False
+        self.nbytes = 0
+        # The size of the last load, kept after unloading to make room for the next.
+        self.last_nbytes = 0
+        # Budget set aside while the model loads.
+        self.reserved = 0
+        # Whether a load of unknown size is running.
+        self.sizing = False
+        self.in_use = 0
+        self.last_used = 0.0
+        self.load_seconds = 0.0
+        self.load_lock = threading.Lock()
+
+
+class ModelManager:
+    """
+    Loads an encoder and its FAISS index on first use and keeps the total
+    memory of the loaded models under a budget by evicting the least recently
+    used model that no request is currently using. Room is made before a load,
+    from the size of the model's previous load or, before its first one, the
+    largest size seen of any model. While no size is known, loads run one at
+    a time and alone, so that the first one is measured before the next is
+    admitted. Models left over budget while in use are evicted once idle.
+    """
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        memory_budget_bytes: int = 0,
+        load_wait_seconds: float = 30.0
+    ) -> None:
+        """
+        Initialize the ModelManager class.
+
+        Args:
+            executor (InferenceExecutor): The executor whose model pools run the loads.
+            memory_budget_bytes (int): The memory budget for loaded models; 0 means
+                no limit.
+            load_wait_seconds (float): How long a load waits for models in use to
+                become idle when nothing can be evicted to make room for it.
+        """
+        self._executor = executor
+        self._memory_budget = max(0, int(memory_budget_bytes))
+        self._load_wait = float(load_wait_seconds)
+        self._slots: Dict[str, _ModelSlot] = {}
+        self._lock = threading.Lock()
+        # Notified whenever budget may have been freed.
+        self._released = threading.Condition(self._lock)
+
+    def register(
+        self,
+        model_type: str,
+        load: Callable[[], int],
+        unload: Callable[[], None]
+    ) -> None:
+        """
+        Register how a model type is loaded and released.
+
+        Args:
+            model_type (str): The model type.
+            load (Callable[[], int]): Blocking function loading the encoder and its
+                index and returning the memory they hold in bytes.
+            unload (Callable[[], None]): Function releasing the encoder and its index.
+        """
+        self._slots[model_type] = _ModelSlot(load=load, unload=unload)
+
+    def _get_slot(
+        self,
+        model_type: str
+    ) -> _ModelSlot:
+        if model_type not in self._slots:
+            raise ValueError("Model type not supported")
+        return self._slots[model_type]
+
+    def ensure_loaded(
+        self,
+        model_type: str
+    ) -> None:
+        """
+        Load a model if needed, evicting others first to make room for it.
+        Blocking; `use` runs it on the model's executor pool.
+
+        Args:
+            model_type (str): The model type.
+
+        Raises:
+            RuntimeError: If no room could be made within `load_wait_seconds`.
+        """
+        slot = self._get_slot(model_type)
+        with slot.load_lock:
+            if slot.loaded:
+                return
+            self._reserve(model_type, slot)
+            start = time.perf_counter()
+            try:
+                nbytes = slot.load()
+            except BaseException:
+                with self._released:
+                    slot.reserved = 0
+                    slot.sizing = False
+                    self._released.notify_all()
+                raise
+            with self._released:
+                slot.loaded = True
+                slot.nbytes = nbytes
+                slot.last_nbytes = nbytes
+                slot.reserved = 0
+                slot.sizing = False
+                slot.load_seconds = time.perf_counter() - start
+                slot.last_used = time.monotonic()
+                self._released.notify_all()
+        # The estimate may have been short of the actual size.
+        self._evict(keep=model_type)
+
+    def _used_bytes(self) -> int:
+        """
+        The memory of loaded models plus that reserved by loads in progress.
+        Must be called with the lock held.
+        """
+        return sum(
+            s.nbytes if s.loaded else s.reserved for s in self._slots.values()
+        )
+
+    def _idle_victim(
+        self,
+        keep: str
+    ) -> Optional[_ModelSlot]:
+        """
+        Pick the least recently used idle model other than `keep` and mark it
+        unloaded, so new requests wait on its load lock. Must be called with
+        the lock held.
+        """
+        idle = [
+            s for name, s in self._slots.items()
+            if s.loaded and s.in_use == 0 and name != keep
+        ]
+        if not idle:
+            return None
+        victim = min(idle, key=lambda s: s.last_used)
+        victim.loaded = False
+        self._released.notify_all()
+        return victim
+
+    @staticmethod
+    def _unload(
+        victim: _ModelSlot
+    ) -> None:
+        """
+        Release a model picked by `_idle_victim`.
+        """
+        with victim.load_lock:
+            if victim.loaded:
+                # A request reloaded it before the lock was taken.
+                return
+            victim.unload()
+            victim.nbytes = 0
+
+    def _reserve(
+        self,
+        model_type: str,
+        slot: _ModelSlot
+    ) -> None:
+        """
+        Evict idle models until the expected size of a model fits in the
+        budget, waiting for models in use to become idle if none is, then set
+        that size aside for its load. A model larger than the whole budget
+        loads once every other model is unloaded. Loads wait while one of
+        unknown size runs, and a load of unknown size waits for every other
+        load to finish.
+        """
+        deadline = time.monotonic() + self._load_wait
+        while True:
+            with self._released:
+                needed = slot.last_nbytes or max(
+                    s.last_nbytes for s in self._slots.values()
+                )
+                others = [s for s in self._slots.values() if s is not slot]
+                busy = any(s.sizing for s in others) or (
+                    not needed and any(s.reserved for s in others)
+                )
+                used = self._used_bytes()
+                if not busy and (not self._memory_budget or used == 0
+                                 or used + needed <= self._memory_budget):
+                    slot.reserved = needed
+                    slot.sizing = not needed
+                    return
+                victim = None if busy else self._idle_victim(keep=model_type)
+                if victim is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RuntimeError(
+                            f"Cannot load {model_type}: {used} of {self._memory_budget} "
+                            "budget bytes are held by models in use"
+                        )
+                    self._released.wait(remaining)
+                    continue
+            self._unload(victim)
+
+    def _evict(
+        self,
+        keep: Optional[str] = None
+    ) -> None:
+        """
+        Unload least recently used idle models while over the memory budget.
+        """
+        while self._memory_budget:
+            with self._lock:
+                if self._used_bytes() <= self._memory_budget:
+                    return
+                victim = self._idle_victim(keep=keep)
+                if victim is None:
+                    return
+            self._unload(victim)
+
+    @asynccontextmanager
+    async def use(
+        self,
+        model_type: str
+    ) -> AsyncIterator[None]:
+        """
+        Keep a model loaded for the duration of a request.
+
+        Args:
+            model_type (str): The model type.
+
+        Raises:
+            ValueError: If the model type is not registered.
+        """
+        slot = self._get_slot(model_type)
+        with self._lock:
+            slot.in_use += 1
+            slot.last_used = time.monotonic()
+            loaded = slot.loaded
+        try:
+            if not loaded:
+                await self._executor.run(model_type, self.ensure_loaded, model_type)
+            yield
+        finally:
+            with self._released:
+                slot.in_use -= 1
+                idle = slot.in_use == 0
+                if idle:
+                    self._released.notify_all()
+                over = self._memory_budget and self._used_bytes() > self._memory_budget
+            if idle and over:
+                # Models loaded while others were in use are evicted once idle.
+                await self._executor.run(model_type, self._evict)
+
+    def preload(
+        self,
+        model_types: Iterable[str]
+    ) -> None:
+        """
+        Load models up front for a warm start. Blocking.
+
+        Args:
+            model_types (Iterable[str]): The model types to load, in order.
+        """
+        for model_type in model_types:
+            self.ensure_loaded(model_type)
+
+    @property
+    def model_types(self) -> List[str]:
+        """
+        The registered model types.
+        """
+        return list(self._slots)
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Report the state and memory of every model.
+
+        Returns:
+            Dict[str, Dict]: Per model type: loaded, bytes, in-use count and load time.
+        """
+        with self._lock:
+            return {
+                name: {
+                    "loaded": slot.loaded,
+                    "bytes": slot.nbytes,
+                    "in_use": slot.in_use,
+                    "load_seconds": round(slot.load_seconds, 3)
+                } for name, slot in self._slots.items()
+            }
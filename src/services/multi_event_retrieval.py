@@ -1,11 +1,21 @@
 """
 """
 
-from typing import List, Dict, Union
+import asyncio
+import math
+from typing import List, Dict, Optional, Set, Tuple, Union
+import numpy as np
 from src.modules.original_clip import OriginalCLIP
 from src.modules.apple_clip import AppleCLIP
 from src.modules.laion_clip import LaionCLIP
 from src.repositories.load_faiss import ClipFaiss
+from src.repositories.load_json import LoadJson
+from src.services.model_manager import ModelManager
+from src.services.result_fusion import FUSION_MODES, frame_keys, fuse
+from src.services.temporal_join import earliest_frames, score_sequences, temporal_join
+from src.utils.executor import InferenceExecutor
+
+MAPPING_POOL = "event_mapping"
 
 
 class MultiEventRetrieval:
@@ -19,9 +29,33 @@ class MultiEventRetrieval:
         apple_clip: AppleCLIP,
         laion_clip: LaionCLIP,
         faiss: ClipFaiss,
-        data: Dict
+        data: LoadJson,
+        models: ModelManager,
+        frames: LoadJson,
+        executor: Optional[InferenceExecutor] = None,
+        event_chunk_size: int = 0,
+        event_concurrency: int = 2
     ) -> None:
         """
+        Initialize the MultiEventRetrieval class.
+
+        Args:
+            top_k (int): The default number of hits searched per event.
+            original_clip (OriginalCLIP): The original CLIP encoder.
+            apple_clip (AppleCLIP): The Apple CLIP encoder.
+            laion_clip (LaionCLIP): The LAION CLIP encoder.
+            faiss (ClipFaiss): The FAISS indexes.
+            data (LoadJson): The keyframe mapping of search results.
+            models (ModelManager): Keeps the models in use loaded.
+            frames (LoadJson): The keyframe store used to restrict searches.
+            executor (InferenceExecutor): Runs the mapping of search results off the
+                event loop, on its "event_mapping" pool; inline when None.
+            event_chunk_size (int): The number of events embedded and searched together
+                as one stage of the multi-event pipeline; 0 splits each query into
+                `event_concurrency` chunks, so that even a query of two events is
+                pipelined.
+            event_concurrency (int): The number of event chunks in flight at once, so
+                that one chunk is searched while the next is embedded.
         """
         self._top_k = top_k
         self._original_clip = original_clip
@@ -29,97 +63,175 @@ class MultiEventRetrieval:
         self._laion_clip = laion_clip
         self._faiss = faiss
         self._data = data
+        self._models = models
+        self._frames = frames
+        self._executor = executor
+        self._event_chunk_size = max(0, int(event_chunk_size))
+        self._event_concurrency = max(1, int(event_concurrency))
+        self._encoders = {
+            "original_clip": original_clip,
+            "apple_clip": apple_clip,
+            "laion_clip": laion_clip
+        }
 
     async def mapping_results(
         self,
-        data: Dict,
-        indices: List[int]
+        data: LoadJson,
+        indices: np.ndarray,
+        scores: Optional[np.ndarray] = None
     ) -> List:
         """
         """
-        filtered_list = [data[indice] for indice in indices if indice in data]
-        return filtered_list
+        if self._executor is None:
+            return data.map_indices(indices, scores)
+        return await self._executor.run(MAPPING_POOL, data.map_indices, indices, scores)
 
     async def original_text_retrieval(
         self,
-        text: str
+        text: str,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         """
         vector_embedding = await self._original_clip.text_embedding(
             text=text
         )
-        indices = await self._faiss.original_search(
-            top_k=self._top_k,
-            query_vectors=vector_embedding
+        scores, indices = await self._faiss.original_search(
+            top_k=self._top_k if top_k is None else top_k,
+            query_vectors=vector_embedding,
+            min_score=min_score,
+            search_mode=search_mode
         )
         result = await self.mapping_results(
             data=self._data,
-            indices=indices[0]
+            indices=indices[0],
+            scores=scores[0]
         )
         return result
 
     async def apple_text_retrieval(
         self,
-        text: str
+        text: str,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         """
         vector_embedding = await self._apple_clip.text_embedding(
             text=text
         )
-        indices = await self._faiss.apple_search(
-            top_k=self._top_k,
-            query_vectors=vector_embedding
+        scores, indices = await self._faiss.apple_search(
+            top_k=self._top_k if top_k is None else top_k,
+            query_vectors=vector_embedding,
+            min_score=min_score,
+            search_mode=search_mode
         )
         result = await self.mapping_results(
             data=self._data,
-            indices=indices[0]
+            indices=indices[0],
+            scores=scores[0]
         )
         return result
 
     async def laion_text_retrieval(
         self,
-        text: str
+        text: str,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         """
         vector_embedding = await self._laion_clip.text_embedding(
             text=text
         )
-        indices = await self._faiss.laion_search(
-            top_k=self._top_k,
-            query_vectors=vector_embedding
+        scores, indices = await self._faiss.laion_search(
+            top_k=self._top_k if top_k is None else top_k,
+            query_vectors=vector_embedding,
+            min_score=min_score,
+            search_mode=search_mode
         )
         result = await self.mapping_results(
             data=self._data,
-            indices=indices[0]
+            indices=indices[0],
+            scores=scores[0]
         )
         return result
 
     async def text_retrieval(
         self,
         model_type: str,
-        text: str
+        text: str,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         """
-        if model_type == "original_clip":
-            return await self.original_text_retrieval(
-                text=text
-            )
-        elif model_type == "apple_clip":
-            return await self.apple_text_retrieval(
-                text=text
-            )
-        elif model_type == "laion_clip":
+        if model_type not in self._models.model_types:
+            return {
+                "error": "Model type not supported"
+            }
+        async with self._models.use(model_type):
+            if model_type == "original_clip":
+                return await self.original_text_retrieval(
+                    text=text,
+                    top_k=top_k,
+                    min_score=min_score,
+                    search_mode=search_mode
+                )
+            if model_type == "apple_clip":
+                return await self.apple_text_retrieval(
+                    text=text,
+                    top_k=top_k,
+                    min_score=min_score,
+                    search_mode=search_mode
+                )
             return await self.laion_text_retrieval(
-                text=text
+                text=text,
+                top_k=top_k,
+                min_score=min_score,
+                search_mode=search_mode
             )
-        else:
+
+    async def restricted_text_retrieval(
+        self,
+        model_type: str,
+        text: str,
+        video_ids: Set[str],
+        top_k: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Searches the text query only among the keyframes of some videos, so that
+        the search scales with the candidates and none of them are pushed out of
+        the top-k by frames of other videos.
+        """
+        if model_type not in self._encoders:
             return {
                 "error": "Model type not supported"
             }
+        id_filter = self._frames.get_video_indices(video_ids)
+        if len(id_filter) == 0:
+            return []
+        async with self._models.use(model_type):
+            vector_embedding = await self._encoders[model_type].text_embedding(
+                text=text
+            )
+            scores, indices = await self._faiss.multi_search(
+                model_type=model_type,
+                top_k=self._top_k if top_k is None else top_k,
+                query_vectors=vector_embedding,
+                id_filter=id_filter
+            )
+        result = await self.mapping_results(
+            data=self._data,
+            indices=indices[0],
+            scores=scores[0]
+        )
+        return result
 
     async def find_common_elements_by_field(
         self,
@@ -131,54 +243,204 @@ class MultiEventRetrieval:
         Tìm các đối tượng có cùng giá trị video_id trong list đầu tiên và xuất hiện trong n-1 list còn lại.
         Chỉ thêm vào danh sách kết quả nếu phần tử có mặt trong tất cả các danh sách còn lại.
         """
-        base_list = list_event[0]  # Danh sách cơ sở (list đầu tiên)
-        common_elements = []
+        common_elements = temporal_join(
+            list_event=list_event,
+            field=field,
+            frame_field=frame_field
+        )
 
-        def extract_frame_number(frame_id: str) -> int:
-            """Chuyển frame_id thành số nguyên để so sánh."""
-            return int(frame_id.split('.')[0])
+        # Giới hạn kết quả trả về (nếu cần thiết)
+        half_size = len(common_elements) // 100
+        return common_elements[:half_size] if half_size > 0 else common_elements
 
-        for item in base_list:
-            video_id_value = item[field]  # Lấy video_id từ phần tử hiện tại
-            frame_id_value = extract_frame_number(
-                item[frame_field])  # Lấy frame_id dưới dạng số nguyên
+    async def event_results(
+        self,
+        model_type: str,
+        list_event: List[str],
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
+    ) -> List[List[Dict]]:
+        """
+        Embeds, searches and maps the events as a pipeline of chunks of
+        `event_chunk_size` events (by default, as many chunks as
+        `event_concurrency`, of at least one event): each chunk is embedded in one encoder pass,
+        searched in one FAISS call and its rows mapped concurrently, while up to
+        `event_concurrency` chunks are in flight, so the encoder, index and
+        mapping pools work on different chunks at the same time.
+        `top_k`, `min_score` and `search_mode` apply to the search of each event.
+        """
+        semaphore = asyncio.Semaphore(self._event_concurrency)
 
-            # Kiểm tra xem phần tử hiện tại có trong tất cả các list khác không
-            in_all_other_lists = all(
-                any(
-                    d[field] == video_id_value and extract_frame_number(
-                        d[frame_field]) > frame_id_value
-                    for d in lst
+        async def chunk_results(chunk: List[str]) -> List[List[Dict]]:
+            async with semaphore:
+                vector_embeddings = await self._encoders[model_type].text_embeddings(
+                    texts=chunk
                 )
-                for lst in list_event[1:]
-            )
+                scores, indices = await self._faiss.multi_search(
+                    model_type=model_type,
+                    top_k=self._top_k if top_k is None else top_k,
+                    query_vectors=vector_embeddings,
+                    min_score=min_score,
+                    search_mode=search_mode
+                )
+            return await asyncio.gather(*(
+                self.mapping_results(
+                    data=self._data,
+                    indices=row,
+                    scores=row_scores
+                ) for row, row_scores in zip(indices, scores)
+            ))
 
-            # Chỉ thêm phần tử vào danh sách kết quả nếu nó có mặt trong tất cả các danh sách khác
-            if in_all_other_lists:
-                common_elements.append(item)
+        size = self._event_chunk_size or max(
+            1, math.ceil(len(list_event) / self._event_concurrency)
+        )
+        async with self._models.use(model_type):
+            chunks = await asyncio.gather(*(
+                chunk_results(list_event[start:start + size])
+                for start in range(0, len(list_event), size)
+            ))
+        return [hits for chunk in chunks for hits in chunk]
 
-        # Giới hạn kết quả trả về (nếu cần thiết)
-        half_size = len(common_elements) // 100
-        return common_elements[:half_size] if half_size > 0 else common_elements
+    async def cascade_event_results(
+        self,
+        model_type: str,
+        list_event: List[str],
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
+    ) -> List[List[Dict]]:
+        """
+        Like `event_results`, but only the first event searches the whole corpus.
+        Each later event searches the keyframes of the videos whose base hits
+        survived the previous events, after the earliest surviving base hit,
+        so the search space shrinks at every step. The join keeps the same
+        base hits as with independent searches or more, as each restricted
+        search returns its top-k among the frames the join can use.
+        Restricted steps are k-NN searches trimmed by `min_score`, even in
+        range mode.
+        """
+        top_k = self._top_k if top_k is None else top_k
+        async with self._models.use(model_type):
+            vector_embeddings = await self._encoders[model_type].text_embeddings(
+                texts=list_event
+            )
+            scores, indices = await self._faiss.multi_search(
+                model_type=model_type,
+                top_k=top_k,
+                query_vectors=vector_embeddings[:1],
+                min_score=min_score,
+                search_mode=search_mode
+            )
+            base = await self.mapping_results(
+                data=self._data,
+                indices=indices[0],
+                scores=scores[0]
+            )
+            list_result = [base]
+            survivors = base
+            for position in range(1, len(list_event)):
+                id_filter = self._frames.get_indices_after(earliest_frames(survivors))
+                if len(id_filter) == 0:
+                    list_result.extend([] for _ in range(position, len(list_event)))
+                    break
+                scores, indices = await self._faiss.multi_search(
+                    model_type=model_type,
+                    top_k=top_k,
+                    query_vectors=vector_embeddings[position:position + 1],
+                    min_score=min_score,
+                    id_filter=id_filter
+                )
+                hits = await self.mapping_results(
+                    data=self._data,
+                    indices=indices[0],
+                    scores=scores[0]
+                )
+                list_result.append(hits)
+                survivors = temporal_join([survivors, hits])
+        return list_result
 
     async def multi_event_search(
         self,
         model_type: str,
-        list_event: List[str]
+        list_event: List[str],
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn",
+        cascade: bool = False
     ) -> List[Dict]:
-        list_result = []
-        for event in list_event:
-            result = await self.text_retrieval(
-                model_type=model_type,
-                text=event
-            )
-            list_result.append(result)
+        """
+        Keeps the base-event frames followed by all other events.
+        `top_k`, `min_score` and `search_mode` apply to the search of each event;
+        `cascade` restricts each event's search to the candidates left by the
+        previous ones.
+        """
+        if model_type not in self._encoders:
+            return {
+                "error": "Model type not supported"
+            }
+        search = self.cascade_event_results if cascade else self.event_results
+        list_result = await search(
+            model_type=model_type,
+            list_event=list_event,
+            top_k=top_k,
+            min_score=min_score,
+            search_mode=search_mode
+        )
         result = await self.find_common_elements_by_field(
             list_event=list_result,
             field="video_id"
         )
         return result
 
+    async def multi_event_sequence_search(
+        self,
+        model_type: str,
+        list_event: List[str],
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn",
+        max_gap: Optional[int] = None,
+        top_sequences: int = 100,
+        cascade: bool = False
+    ) -> List[Dict]:
+        """
+        Ranks videos by their best chain of frames matching the events in order.
+
+        Args:
+            model_type (str): The model embedding the events.
+            list_event (List[str]): The event descriptions, in temporal order.
+            top_k (int): The hits searched per event.
+            min_score (float): The similarity cutoff of each event's hits.
+            search_mode (str): "knn" or "range".
+            max_gap (int): The largest frame-number gap between consecutive events.
+            top_sequences (int): The number of sequences returned.
+            cascade (bool): Whether each event only searches the candidates left
+                by the previous ones.
+
+        Returns:
+            List[Dict]: The sequences by decreasing summed score, each with
+            "video_id", "score" and one frame per event as "frames".
+
+        Raises:
+            ValueError: If the model type is not supported.
+        """
+        if model_type not in self._encoders:
+            raise ValueError("Model type not supported")
+        search = self.cascade_event_results if cascade else self.event_results
+        list_result = await search(
+            model_type=model_type,
+            list_event=list_event,
+            top_k=top_k,
+            min_score=min_score,
+            search_mode=search_mode
+        )
+        return score_sequences(
+            list_event=list_result,
+            top_k=top_sequences,
+            max_gap=max_gap
+        )
+
     async def prioritize_results(
         self,
         result: List[Dict],
@@ -187,50 +449,74 @@ class MultiEventRetrieval:
         priority: List[str]
     ) -> List[Dict]:
         """
-        Prioritize results based on provided priority.
+        Prioritize results based on provided priority: for each source in
+        `priority`, the results found in that source. Results are matched by
+        keyframe through hashed frame keys.
         """
+        video_codes: Dict[str, int] = {}
+        result_keys = frame_keys(result, video_codes)
+        sources = {"clip": result, "ocr": list_ocr, "asr": list_asr}
         prioritized_results = []
         for item in priority:
-            if item == 'asr':
-                prioritized_results.extend(
-                    [
-                        r for r in result if r in list_asr
-                    ]
-                )
-            elif item == 'ocr':
-                prioritized_results.extend(
-                    [
-                        r for r in result if r in list_ocr
-                    ]
-                )
-            elif item == 'clip':
-                prioritized_results.extend(
-                    [
-                        r for r in result if r in result
-                    ]
-                )
+            if item not in sources:
+                continue
+            found = np.isin(result_keys, frame_keys(sources[item], video_codes))
+            prioritized_results.extend(result[i] for i in np.flatnonzero(found).tolist())
         return prioritized_results
 
+    @staticmethod
+    def fusion_sources(
+        lists: Dict[str, List[Dict]],
+        priority: List[str],
+        weights: Optional[Dict[str, float]] = None
+    ) -> Tuple[List[str], List[List[Dict]], Optional[List[float]]]:
+        """
+        Orders the named hit lists for `fuse`: the sources named in `priority`
+        first, then the others.
+
+        Args:
+            lists (Dict[str, List[Dict]]): The hit lists by source name.
+            priority (List[str]): The source names, highest priority first.
+            weights (Dict[str, float]): The reciprocal-rank-fusion weight by source
+                name; 1 for unnamed sources.
+
+        Returns:
+            Tuple[List[str], List[List[Dict]], Optional[List[float]]]: The source
+            names, their hit lists and their weights, in priority order.
+        """
+        names = [name for name in dict.fromkeys(priority or []) if name in lists]
+        names += [name for name in lists if name not in names]
+        source_weights = None if weights is None else [
+            float(weights.get(name, 1.0)) for name in names
+        ]
+        return names, [lists[name] for name in names], source_weights
+
     async def multi_event_search_with_non_text(
         self,
         list_ocr: Union[List[Dict], None] = None,
         list_asr: Union[List[Dict], None] = None,
-        priority: Union[List[str], None] = None
+        priority: Union[List[str], None] = None,
+        fusion: str = "intersection",
+        weights: Optional[Dict[str, float]] = None,
+        rrf_k: int = 60
     ) -> List[Dict]:
         """
-        """
-        ocr_set = {tuple(item.items()) for item in list_ocr}
-        asr_set = {tuple(item.items()) for item in list_asr}
-        intersection = ocr_set.intersection(asr_set)
-        result = [dict(item) for item in intersection]
+        Fuses the OCR and ASR hits, in `priority` order (see `fuse` for the modes).
 
-        prioritized_results = await self.prioritize_results(
-            result=result,
-            list_ocr=list_ocr,
-            list_asr=list_asr,
-            priority=priority
+        Raises:
+            ValueError: If the fusion mode is unknown.
+        """
+        _, sources, source_weights = self.fusion_sources(
+            lists={"ocr": list_ocr or [], "asr": list_asr or []},
+            priority=priority,
+            weights=weights
+        )
+        return fuse(
+            sources=sources,
+            mode=fusion,
+            weights=source_weights,
+            rrf_k=rrf_k
         )
-        return prioritized_results
 
     async def multi_modal_search(
         self,
@@ -238,51 +524,64 @@ class MultiEventRetrieval:
         text: str = None,
         list_ocr: Union[List[Dict], None] = None,
         list_asr: Union[List[Dict], None] = None,
-        priority: Union[List[str], None] = None
+        priority: Union[List[str], None] = None,
+        fusion: str = "temporal",
+        weights: Optional[Dict[str, float]] = None,
+        rrf_k: int = 60
     ) -> List[Dict]:
         """
+        Fuses the CLIP hits of `text` with the OCR and ASR hits. Only the
+        non-empty sources named in `priority` take part, in that order (see
+        `fuse` for the modes); the "temporal" default keeps the first source's
+        hits followed by every other source in the same video.
+
+        Raises:
+            ValueError: If the fusion mode or the model type is unknown.
         """
-        combine = []
-        result_clip = await self.text_retrieval(
-            model_type=model_type,
-            text=text
-        )
-        if list_asr and list_ocr:
-            for item in priority:
-                if item == 'asr':
-                    combine.append(list_asr)
-                elif item == 'ocr':
-                    combine.append(list_ocr)
-                elif item == 'clip':
-                    combine.append(result_clip)
-            result = await self.find_common_elements_by_field(
-                list_event=combine,
-                field="video_id"
-            )
-            return result
-        elif list_asr:
-            for item in priority:
-                if item == 'asr':
-                    combine.append(list_asr)
-                elif item == 'clip':
-                    combine.append(result_clip)
-            print("pass cluster")
-            result = await self.find_common_elements_by_field(
-                list_event=combine,
-                field="video_id"
-            )
-            print("pass cluster 2")
-            return result
-        elif list_ocr:
-            for item in priority:
-                if item == 'ocr':
-                    combine.append(list_ocr)
-                elif item == 'clip':
-                    combine.append(result_clip)
-            result = await self.find_common_elements_by_field(
-                list_event=combine,
-                field="video_id"
-            )
-            return result
-        else:
+        if fusion not in FUSION_MODES:
+            raise ValueError(f"Unknown fusion mode: {fusion}")
+        priority = priority or []
+        if "clip" in priority and model_type not in self._encoders:
+            raise ValueError("Model type not supported")
+        if not list_ocr and not list_asr:
             return []
+        lists = {
+            name: events for name, events in (("ocr", list_ocr), ("asr", list_asr))
+            if events and name in priority
+        }
+        if "clip" in priority:
+            # In the modes that need every source, CLIP frames only survive if
+            # their video is in every OCR/ASR list that takes part, so the
+            # search is restricted to those videos.
+            candidate_videos = None
+            if fusion in ("temporal", "intersection"):
+                for events in lists.values():
+                    videos = {item["video_id"] for item in events}
+                    candidate_videos = videos if candidate_videos is None else candidate_videos & videos
+            if candidate_videos is None:
+                lists["clip"] = await self.text_retrieval(
+                    model_type=model_type,
+                    text=text
+                )
+            else:
+                lists["clip"] = await self.restricted_text_retrieval(
+                    model_type=model_type,
+                    text=text,
+                    video_ids=candidate_videos
+                )
+        _, sources, source_weights = self.fusion_sources(
+            lists=lists,
+            priority=priority,
+            weights=weights
+        )
+        result = fuse(
+            sources=sources,
+            mode=fusion,
+            weights=source_weights,
+            rrf_k=rrf_k
+        )
+        if fusion == "temporal":
+            # Giới hạn kết quả trả về (nếu cần thiết)
+            half_size = len(result) // 100
+            return result[:half_size] if half_size > 0 else result
+        return result
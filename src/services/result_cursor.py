@@ -0,0 +1,211 @@
+"""
+Server-side cursors over ranked results, so that pages and streams of a search
+are served without running it again.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import (Dict,
+                    Iterator,
+                    List,
+                    Optional,
+                    Tuple)
+
+import numpy as np
+
+
+class _RankedResults:
+    """
+    The results of one search as three parallel NumPy columns instead of a
+    dict per result; NaN marks a result without a score.
+    """
+
+    __slots__ = ("video_ids", "frame_ids", "scores", "expires")
+
+    def __init__(
+        self,
+        results: List[Dict],
+        expires: float
+    ) -> None:
+        self.video_ids = np.array([record["video_id"] for record in results], dtype=str)
+        self.frame_ids = np.array([str(record["frame_id"]) for record in results], dtype=str)
+        self.scores = np.array(
+            [record.get("score") for record in results], dtype=np.float64
+        )
+        self.expires = expires
+
+    def __len__(self) -> int:
+        return len(self.video_ids)
+
+    def records(
+        self,
+        start: int,
+        stop: int
+    ) -> List[Dict]:
+        """
+        Rebuilds the result dicts of a slice.
+        """
+        return [
+            {
+                "video_id": video_id,
+                "frame_id": frame_id,
+                "score": None if score != score else score
+            }
+            for video_id, frame_id, score in zip(
+                self.video_ids[start:stop].tolist(),
+                self.frame_ids[start:stop].tolist(),
+                self.scores[start:stop].tolist()
+            )
+        ]
+
+
+class ResultCursors:
+    """
+    A TTL cache of ranked result sets behind opaque cursors. A cursor names a
+    result set and a position in it; each page returns the cursor of the next.
+    Result sets live in the memory of one worker process, so deployments with
+    several workers need requests of a cursor routed to the same worker.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 600.0,
+        max_entries: int = 1000
+    ) -> None:
+        """
+        Initialize the ResultCursors class.
+
+        Args:
+            ttl_seconds (float): How long a result set stays available after its search.
+            max_entries (int): The maximum number of result sets kept; the oldest
+                are dropped first.
+        """
+        self._ttl = float(ttl_seconds)
+        self._max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[str, _RankedResults]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        """
+        Drops expired result sets. Must be called with the lock held.
+        """
+        # All entries share one TTL, so insertion order is expiry order.
+        while self._entries:
+            token, entry = next(iter(self._entries.items()))
+            if entry.expires > now:
+                break
+            del self._entries[token]
+
+    def create(
+        self,
+        results: List[Dict]
+    ) -> Tuple[str, int]:
+        """
+        Keeps the results of a search.
+
+        Args:
+            results (List[Dict]): The ranked results.
+
+        Returns:
+            Tuple[str, int]: The cursor of the first result and the number of results.
+        """
+        entry = _RankedResults(results, time.monotonic() + self._ttl)
+        token = secrets.token_urlsafe(12)
+        with self._lock:
+            self._expire(time.monotonic())
+            self._entries[token] = entry
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return f"{token}.0", len(entry)
+
+    def _lookup(
+        self,
+        cursor: str
+    ) -> Tuple[str, _RankedResults, int]:
+        """
+        Resolves a cursor to its result set and position.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+            KeyError: If its result set expired or never existed.
+        """
+        token, _, offset = cursor.rpartition(".")
+        if not token or not offset.isdigit():
+            raise ValueError(f"Malformed cursor: {cursor}")
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(token)
+        if entry is None:
+            raise KeyError(f"Cursor {cursor} expired or is unknown")
+        return token, entry, int(offset)
+
+    def page(
+        self,
+        cursor: str,
+        page_size: int
+    ) -> Tuple[List[Dict], Optional[str], int]:
+        """
+        Gets the page of results starting at a cursor.
+
+        Args:
+            cursor (str): A cursor returned by `create` or a previous page.
+            page_size (int): The maximum number of results in the page; 0 returns
+                no results and the cursor itself, e.g. to stream from it.
+
+        Returns:
+            Tuple[List[Dict], Optional[str], int]: The results, the cursor of the
+            next page (None after the last one) and the size of the result set.
+
+        Raises:
+            ValueError: If the cursor is malformed or the page size negative.
+            KeyError: If the result set expired or never existed.
+        """
+        if page_size < 0:
+            raise ValueError("page_size must not be negative")
+        token, entry, offset = self._lookup(cursor)
+        stop = min(offset + page_size, len(entry))
+        next_cursor = f"{token}.{stop}" if stop < len(entry) else None
+        return entry.records(offset, stop), next_cursor, len(entry)
+
+    def stream(
+        self,
+        cursor: str,
+        chunk_size: int = 256
+    ) -> Iterator[List[Dict]]:
+        """
+        Iterates over the results from a cursor to the end, rebuilding them one
+        chunk at a time. The result set is resolved before iteration starts.
+
+        Args:
+            cursor (str): A cursor returned by `create` or a page.
+            chunk_size (int): The number of results rebuilt at a time.
+
+        Returns:
+            Iterator[List[Dict]]: The chunks of results.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+            KeyError: If the result set expired or never existed.
+        """
+        _, entry, offset = self._lookup(cursor)
+
+        def chunks() -> Iterator[List[Dict]]:
+            for start in range(offset, len(entry), chunk_size):
+                yield entry.records(start, start + chunk_size)
+        return chunks()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the number of live result sets.
+
+        Returns:
+            Dict[str, int]: The live result sets and the results they hold.
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "entries": len(self._entries),
+                "results": sum(len(entry) for entry in self._entries.values())
+            }
@@ -0,0 +1,226 @@
+"""
+Fusion of the ranked hit lists of several sources (CLIP, OCR, ASR) on integer
+frame keys.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.repositories.load_json import LoadJson
+from src.services.temporal_join import EventHits, temporal_join
+
+FUSION_MODES = ("intersection", "union", "priority", "rrf", "temporal")
+
+
+def frame_keys(
+    hits: List[Dict],
+    video_codes: Dict[str, int],
+    field: str = "video_id",
+    frame_field: str = "frame_id"
+) -> np.ndarray:
+    """
+    Packs the (video, frame number) of each hit into an int64 key.
+
+    Args:
+        hits (List[Dict]): The hits.
+        video_codes (Dict[str, int]): Video codes shared by the sources of a query;
+            unseen videos are added.
+        field (str): The video key of a hit.
+        frame_field (str): The frame key of a hit.
+
+    Returns:
+        np.ndarray: One key per hit, equal for hits of the same keyframe.
+    """
+    codes = np.array(
+        [video_codes.setdefault(hit[field], len(video_codes)) for hit in hits],
+        dtype=np.int64
+    )
+    frames = np.array(
+        [LoadJson.frame_number(hit[frame_field]) for hit in hits],
+        dtype=np.int64
+    )
+    return EventHits.keys(codes, frames)
+
+
+def _rank_table(
+    sources: Sequence[List[Dict]],
+    field: str,
+    frame_field: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ranks every distinct keyframe in every source.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The (m,) sorted distinct keys of all
+        sources, and the (n_sources, m) rank of each key in each source (the
+        position of its first hit), -1 where a source does not hold it.
+    """
+    video_codes: Dict[str, int] = {}
+    uniques = []
+    for hits in sources:
+        keys = frame_keys(hits, video_codes, field, frame_field)
+        # return_index gives the first, i.e. best ranked, hit of each key.
+        uniques.append(np.unique(keys, return_index=True))
+    all_keys = np.unique(np.concatenate(
+        [keys for keys, _ in uniques] + [np.empty(0, dtype=np.int64)]
+    ))
+    ranks = np.full((len(sources), len(all_keys)), -1, dtype=np.int64)
+    for row, (keys, first) in enumerate(uniques):
+        ranks[row, np.searchsorted(all_keys, keys)] = first
+    return all_keys, ranks
+
+
+def fuse(
+    sources: Sequence[List[Dict]],
+    mode: str = "intersection",
+    weights: Optional[Sequence[float]] = None,
+    rrf_k: int = 60,
+    field: str = "video_id",
+    frame_field: str = "frame_id"
+) -> List[Dict]:
+    """
+    Fuses ranked hit lists. Each list is in rank order and the lists are in
+    priority order. Hits are matched by keyframe (video and frame number), so
+    "0123", "0123.jpg" and 123 are the same frame and key order in the hit
+    dicts does not matter. Each keyframe is returned once, as the hit of the
+    highest-priority source holding it.
+
+    Modes:
+        "intersection": keyframes held by every source, in the rank order of
+            the first source.
+        "union": keyframes held by any source, by their best rank in any
+            source, ties going to the higher-priority source.
+        "priority": the keyframes of the first source in rank order, then those
+            of the second source not yet returned, and so on.
+        "rrf": weighted reciprocal-rank fusion; keyframes by decreasing
+            sum over sources of weight / (rrf_k + rank), rank starting at 1,
+            with the fused value as "score".
+        "temporal": the hits of the first source followed, in the same video,
+            by a hit of every other source (see `temporal_join`).
+
+    Args:
+        sources (Sequence[List[Dict]]): The hit lists.
+        mode (str): The fusion mode.
+        weights (Sequence[float]): The weight of each source in "rrf" mode; 1 each by default.
+        rrf_k (int): The rank offset of "rrf" mode, damping the lead of the top ranks.
+        field (str): The video key of a hit.
+        frame_field (str): The frame key of a hit.
+
+    Returns:
+        List[Dict]: The fused hits.
+
+    Raises:
+        ValueError: If the mode is unknown or the weights do not match the sources.
+    """
+    if mode not in FUSION_MODES:
+        raise ValueError(f"Unknown fusion mode: {mode}")
+    if weights is not None and len(weights) != len(sources):
+        raise ValueError("One weight per source is required")
+    if not sources:
+        return []
+    if mode == "temporal":
+        return temporal_join(list(sources), field=field, frame_field=frame_field)
+
+    _, ranks = _rank_table(sources, field, frame_field)
+    present = ranks >= 0
+    # The record of a keyframe comes from the first source holding it.
+    owner = np.argmax(present, axis=0)
+    owner_rank = ranks[owner, np.arange(ranks.shape[1])]
+    scores = None
+    if mode == "intersection":
+        keep = np.flatnonzero(present.all(axis=0))
+        order = keep[np.argsort(ranks[0, keep], kind="stable")]
+    elif mode == "priority":
+        order = np.lexsort((owner_rank, owner))
+    else:
+        masked = np.where(present, ranks, np.iinfo(np.int64).max)
+        best = masked.min(axis=0)
+        best_source = np.argmin(masked, axis=0)
+        if mode == "union":
+            order = np.lexsort((best_source, best))
+        else:
+            source_weights = np.ones(len(sources)) if weights is None else np.asarray(
+                weights, dtype=np.float64
+            )
+            contributions = source_weights[:, None] / (rrf_k + ranks + 1.0)
+            scores = np.where(present, contributions, 0.0).sum(axis=0)
+            order = np.lexsort((best_source, best, -scores))
+    result = []
+    for key in order.tolist():
+        hit = sources[owner[key]][owner_rank[key]]
+        result.append(hit if scores is None else dict(hit, score=float(scores[key])))
+    return result
+
+
+def normalize_scores(
+    scores: np.ndarray
+) -> np.ndarray:
+    """
+    Min-max normalizes the scores of one source to [0, 1], so that sources
+    whose similarities live on different scales can be summed. A source whose
+    scores are all equal scores 1.
+
+    Args:
+        scores (np.ndarray): The scores.
+
+    Returns:
+        np.ndarray: The normalized scores.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) == 0:
+        return scores
+    low, high = scores.min(), scores.max()
+    if high - low <= 0:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+def score_fusion(
+    sources: Sequence[List[Dict]],
+    weights: Optional[Sequence[float]] = None,
+    field: str = "video_id",
+    frame_field: str = "frame_id",
+    score_field: str = "score"
+) -> List[Dict]:
+    """
+    Fuses scored hit lists by the weighted sum of their normalized scores
+    (see `normalize_scores`); a source not holding a keyframe adds 0. Each
+    keyframe is returned once, as the hit of the first source holding it with
+    the fused value as "score", by decreasing fused score.
+
+    Args:
+        sources (Sequence[List[Dict]]): The hit lists, in priority order.
+        weights (Sequence[float]): The weight of each source; 1 each by default.
+        field (str): The video key of a hit.
+        frame_field (str): The frame key of a hit.
+        score_field (str): The similarity key of a hit; hits without one score 0.
+
+    Returns:
+        List[Dict]: The fused hits.
+
+    Raises:
+        ValueError: If the weights do not match the sources.
+    """
+    if weights is not None and len(weights) != len(sources):
+        raise ValueError("One weight per source is required")
+    if not sources:
+        return []
+    _, ranks = _rank_table(sources, field, frame_field)
+    present = ranks >= 0
+    source_weights = np.ones(len(sources)) if weights is None else np.asarray(
+        weights, dtype=np.float64
+    )
+    fused = np.zeros(ranks.shape[1], dtype=np.float64)
+    for row, hits in enumerate(sources):
+        normalized = normalize_scores([hit.get(score_field) or 0.0 for hit in hits])
+        columns = np.flatnonzero(present[row])
+        fused[columns] += source_weights[row] * normalized[ranks[row, columns]]
+    owner = np.argmax(present, axis=0)
+    owner_rank = ranks[owner, np.arange(ranks.shape[1])]
+    masked = np.where(present, ranks, np.iinfo(np.int64).max)
+    order = np.lexsort((masked.min(axis=0), -fused))
+    return [
+        dict(sources[owner[key]][owner_rank[key]], score=float(fused[key]))
+        for key in order.tolist()
+    ]
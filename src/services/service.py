@@ -2,24 +2,23 @@
 Service class for initializing and managing the CLIP retrieval system.
 """
 
-# import os
+import os
 from dotenv import load_dotenv
 import torch
-from open_clip import (create_model_from_pretrained,
-                       get_tokenizer)
-from transformers import (CLIPProcessor,
-                          AutoTokenizer,
-                          CLIPModel)
-
-# from src.utils.utility import convert_value
-from src.modules.original_clip import OriginalCLIP
-from src.modules.apple_clip import AppleCLIP
-from src.modules.laion_clip import LaionCLIP
+
+from src.utils.utility import get_env_value
+from src.utils.executor import InferenceExecutor
+from src.modules.model_loader import load_clip_encoder
+from src.modules.embedding_cache import EmbeddingCache
+from src.modules.image_preprocessor import ImagePreprocessor
 from src.repositories.load_faiss import ClipFaiss
 from src.repositories.load_json import LoadJson
 from src.services.text_clip_retrieval import TextClipRetrieval
 from src.services.image_clip_retrieval import ImageClipRetrieval
 from src.services.multi_event_retrieval import MultiEventRetrieval
+from src.services.model_manager import ModelManager
+from src.services.index_admin import IndexAdmin
+from src.services.result_cursor import ResultCursors
 
 load_dotenv()
 
@@ -34,6 +33,51 @@ APPLE_FAISS = "/kaggle/input/apple-clip/apple.faiss"
 LAION_FAISS = "/kaggle/input/laion-clip/laion.faiss"
 JSON_CLIP = "/kaggle/input/json-clip/clip.json"
 TOP_K = 1500
+MAX_TOP_K = get_env_value("MAX_TOP_K", 2048)
+MAX_RANGE_RESULTS = get_env_value("MAX_RANGE_RESULTS", 10000)
+SUBSET_SCAN_LIMIT = get_env_value("SUBSET_SCAN_LIMIT", 200000)
+RERANK_CANDIDATES = get_env_value("RERANK_CANDIDATES", 0)
+TEXT_BATCH_SIZE = get_env_value("TEXT_BATCH_SIZE", 32)
+TEXT_BATCH_WAIT_MS = get_env_value("TEXT_BATCH_WAIT_MS", 5.0)
+MODEL_POOL_WORKERS = get_env_value("MODEL_POOL_WORKERS", 1)
+INDEX_POOL_WORKERS = get_env_value("INDEX_POOL_WORKERS", 2)
+TEXT_CACHE_ENTRIES = get_env_value("TEXT_CACHE_ENTRIES", 20000)
+TEXT_CACHE_BYTES = get_env_value("TEXT_CACHE_BYTES", 256 * 1024 * 1024)
+TEXT_CACHE_PATH = get_env_value("TEXT_CACHE_PATH", None)
+IMAGE_PREPROCESS_WORKERS = get_env_value("IMAGE_PREPROCESS_WORKERS", 2)
+MAX_UPLOAD_BYTES = get_env_value("MAX_UPLOAD_BYTES", 20 * 1024 * 1024)
+MAX_IMAGE_PIXELS = get_env_value("MAX_IMAGE_PIXELS", 40_000_000)
+IMAGE_CACHE_ENTRIES = get_env_value("IMAGE_CACHE_ENTRIES", 2000)
+IMAGE_CACHE_BYTES = get_env_value("IMAGE_CACHE_BYTES", 64 * 1024 * 1024)
+TEXT_ENCODER_MODE = get_env_value("TEXT_ENCODER_MODE", "default")
+TEXT_ENCODER_DIR = get_env_value("TEXT_ENCODER_DIR", "exported")
+FAISS_MMAP = get_env_value("FAISS_MMAP", True)
+INDEX_VERSION_DIR = get_env_value("INDEX_VERSION_DIR", "indexes")
+ADMIN_TOKEN = get_env_value("ADMIN_TOKEN", "")
+MODEL_MEMORY_BUDGET_BYTES = get_env_value("MODEL_MEMORY_BUDGET_BYTES", 0)
+MODEL_LOAD_WAIT_SECONDS = get_env_value("MODEL_LOAD_WAIT_SECONDS", 30.0)
+MODEL_PRELOAD = get_env_value("MODEL_PRELOAD", "")
+EVENT_CHUNK_SIZE = get_env_value("EVENT_CHUNK_SIZE", 0)
+EVENT_CONCURRENCY = get_env_value("EVENT_CONCURRENCY", 2)
+RESULT_CURSOR_TTL = get_env_value("RESULT_CURSOR_TTL", 600)
+RESULT_CURSOR_ENTRIES = get_env_value("RESULT_CURSOR_ENTRIES", 1000)
+
+
+def text_encoder_path(
+    export_dir: str,
+    model_type: str
+) -> str:
+    """
+    Gets the path of the exported int8 text tower of a model.
+
+    Args:
+        export_dir (str): The directory holding the exported text towers.
+        model_type (str): The model type.
+
+    Returns:
+        str: The path of the TorchScript file.
+    """
+    return os.path.join(export_dir, f"{model_type}_text_int8.pt")
 
 
 class Service:
@@ -52,7 +96,35 @@ class Service:
         apple_clip_faiss=APPLE_FAISS,
         laion_clip_faiss=LAION_FAISS,
         json_clip=JSON_CLIP,
-        top_k=TOP_K
+        top_k=TOP_K,
+        max_top_k=MAX_TOP_K,
+        max_range_results=MAX_RANGE_RESULTS,
+        subset_scan_limit=SUBSET_SCAN_LIMIT,
+        rerank_candidates=RERANK_CANDIDATES,
+        text_batch_size=TEXT_BATCH_SIZE,
+        text_batch_wait_ms=TEXT_BATCH_WAIT_MS,
+        model_pool_workers=MODEL_POOL_WORKERS,
+        index_pool_workers=INDEX_POOL_WORKERS,
+        text_cache_entries=TEXT_CACHE_ENTRIES,
+        text_cache_bytes=TEXT_CACHE_BYTES,
+        text_cache_path=TEXT_CACHE_PATH,
+        image_preprocess_workers=IMAGE_PREPROCESS_WORKERS,
+        max_upload_bytes=MAX_UPLOAD_BYTES,
+        max_image_pixels=MAX_IMAGE_PIXELS,
+        image_cache_entries=IMAGE_CACHE_ENTRIES,
+        image_cache_bytes=IMAGE_CACHE_BYTES,
+        text_encoder_mode=TEXT_ENCODER_MODE,
+        text_encoder_dir=TEXT_ENCODER_DIR,
+        model_memory_budget_bytes=MODEL_MEMORY_BUDGET_BYTES,
+        model_load_wait_seconds=MODEL_LOAD_WAIT_SECONDS,
+        model_preload=MODEL_PRELOAD,
+        faiss_mmap=FAISS_MMAP,
+        index_version_dir=INDEX_VERSION_DIR,
+        admin_token=ADMIN_TOKEN,
+        event_chunk_size=EVENT_CHUNK_SIZE,
+        event_concurrency=EVENT_CONCURRENCY,
+        result_cursor_ttl=RESULT_CURSOR_TTL,
+        result_cursor_entries=RESULT_CURSOR_ENTRIES
     ) -> None:
         """
         Sets up the necessary components for the CLIP retrieval service.
@@ -61,59 +133,159 @@ class Service:
             original_clip_model (str): The path or identifier for the CLIP model.
             original_clip_faiss (str): The path to the FAISS index file.
             top_k (int): The number of top results to return during retrieval.
+            max_top_k (int): The upper bound of a per-request top_k.
+            max_range_results (int): The upper bound of the results of a range search.
+            subset_scan_limit (int): Searches restricted to at most this many keyframes
+                score them directly rather than through a FAISS IDSelector.
+            rerank_candidates (int): Overrides the number of compressed-index candidates
+                re-ranked exactly per query; 0 keeps each index manifest's value.
+            text_batch_size (int): The maximum number of concurrent text queries
+                encoded in one forward pass per model.
+            text_batch_wait_ms (float): How long a text query waits for others to batch with.
+            model_pool_workers (int): The number of inference threads per model.
+            index_pool_workers (int): The number of search threads per FAISS index.
+            text_cache_entries (int): The maximum number of cached query text embeddings.
+            text_cache_bytes (int): The memory budget of the text embedding cache.
+            text_cache_path (str): Optional SQLite file persisting the text embedding cache.
+            image_preprocess_workers (int): The number of image decoding processes.
+            max_upload_bytes (int): The maximum accepted image upload size in bytes.
+            max_image_pixels (int): The maximum accepted image size in pixels.
+            image_cache_entries (int): The maximum number of cached upload embeddings.
+            image_cache_bytes (int): The memory budget of the upload embedding cache.
+            text_encoder_mode (str): "default", "int8" (exported int8 TorchScript text
+                towers on CPU) or "bf16" (CPU bfloat16 autocast for text).
+            text_encoder_dir (str): The directory of the exported text towers.
+            model_memory_budget_bytes (int): The memory budget of the loaded encoders and
+                indexes; the least recently used model is evicted above it, 0 means no limit.
+            model_load_wait_seconds (float): How long a model load waits for models in
+                use to become idle when the budget has no room for it.
+            model_preload (str): Comma-separated model types loaded at startup; the others
+                load on their first request.
+            faiss_mmap (bool): Whether to memory-map the FAISS indexes so that worker
+                processes share them.
+            index_version_dir (str): The directory new index versions and keyframe
+                mappings are written to by ingestion; the admin API reads no path
+                outside it.
+            admin_token (str): The token the admin API requires in the X-Admin-Token
+                header; empty disables the admin API.
+            event_chunk_size (int): The number of events of a multi-event query embedded
+                and searched together; 0 splits each query into `event_concurrency` chunks.
+            event_concurrency (int): The number of event chunks of a multi-event query
+                in flight at once, and the number of threads mapping their results.
+            result_cursor_ttl (float): The seconds the results of a paginated search stay
+                available to later pages.
+            result_cursor_entries (int): The maximum number of paginated result sets kept.
         """
-        self._data = LoadJson(
+        # Forks the preprocessing workers, so it comes before anything that
+        # starts a thread.
+        self._image_preprocessor = ImagePreprocessor(
+            max_workers=image_preprocess_workers,
+            max_upload_bytes=max_upload_bytes,
+            max_pixels=max_image_pixels
+        )
+        self._executor = InferenceExecutor(
+            pool_sizes={
+                "original_clip": model_pool_workers,
+                "apple_clip": model_pool_workers,
+                "laion_clip": model_pool_workers,
+                "original_index": index_pool_workers,
+                "apple_index": index_pool_workers,
+                "laion_index": index_pool_workers,
+                "event_mapping": event_concurrency
+            }
+        )
+        self._text_cache = EmbeddingCache(
+            max_entries=text_cache_entries,
+            max_bytes=text_cache_bytes,
+            store_path=text_cache_path
+        )
+        self._image_cache = EmbeddingCache(
+            max_entries=image_cache_entries,
+            max_bytes=image_cache_bytes
+        )
+        self._frames = LoadJson(
             json_url=json_clip
-        )._data
+        )
+        self._data = self._frames
+        self._result_cursors = ResultCursors(
+            ttl_seconds=result_cursor_ttl,
+            max_entries=result_cursor_entries
+        )
         self._device = torch.device(
             "cuda" if torch.cuda.is_available() else "cpu"
         )
         # self._device = torch.device("cpu")
-        self._oc_model = CLIPModel.from_pretrained(
-            original_clip_model
-        ).to(self._device)
-        self._oc_processor = CLIPProcessor.from_pretrained(original_clip_model)
-        self._oc_tokenizer = AutoTokenizer.from_pretrained(original_clip_model)
-        self._apple_model, self._apple_processor = create_model_from_pretrained(
-            apple_clip_model
-        )
-        self._apple_model.to(self._device)
-        self._apple_tokenizer = get_tokenizer(apple_clip_tokenizer)
-        self._laion_model, self._laion_processor = create_model_from_pretrained(
-            laion_clip_model
-        )
-        self._laion_model.to(self._device)
-        self._laion_tokenizer = get_tokenizer(laion_clip_tokenizer)
-        self._original_clip = OriginalCLIP(
-            model=self._oc_model,
-            processor=self._oc_processor,
-            tokenizer=self._oc_tokenizer,
-            device_type=self._device
-        )
-        self._apple_clip = AppleCLIP(
-            model=self._apple_model,
-            processor=self._apple_processor,
-            tokenizer=self._apple_tokenizer,
-            device_type=self._device
-        )
-        self._laion_clip = LaionCLIP(
-            model=self._laion_model,
-            processor=self._laion_processor,
-            tokenizer=self._laion_tokenizer,
-            device_type=self._device
+        encoder_kwargs = {
+            "device_type": self._device,
+            "batch_size": text_batch_size,
+            "batch_wait_ms": text_batch_wait_ms,
+            "executor": self._executor,
+            "text_cache": self._text_cache,
+            "text_encoder_mode": text_encoder_mode,
+            "lazy": True
+        }
+        self._original_clip = load_clip_encoder(
+            model_type="original_clip",
+            model_name=original_clip_model,
+            tokenizer_name=original_clip_model,
+            text_encoder_path=text_encoder_path(text_encoder_dir, "original_clip"),
+            **encoder_kwargs
+        )
+        self._apple_clip = load_clip_encoder(
+            model_type="apple_clip",
+            model_name=apple_clip_model,
+            tokenizer_name=apple_clip_tokenizer,
+            text_encoder_path=text_encoder_path(text_encoder_dir, "apple_clip"),
+            **encoder_kwargs
+        )
+        self._laion_clip = load_clip_encoder(
+            model_type="laion_clip",
+            model_name=laion_clip_model,
+            tokenizer_name=laion_clip_tokenizer,
+            text_encoder_path=text_encoder_path(text_encoder_dir, "laion_clip"),
+            **encoder_kwargs
         )
         self._faiss = ClipFaiss(
             original_faiss_url=original_clip_faiss,
             apple_faiss_url=apple_clip_faiss,
-            laion_faiss_url=laion_clip_faiss
+            laion_faiss_url=laion_clip_faiss,
+            executor=self._executor,
+            lazy=True,
+            mmap=faiss_mmap,
+            max_top_k=max_top_k,
+            max_range_results=max_range_results,
+            subset_scan_limit=subset_scan_limit,
+            rerank_candidates=rerank_candidates
         )
+        self._index_admin = IndexAdmin(
+            faiss=self._faiss,
+            frames=self._frames,
+            executor=self._executor,
+            output_dir=index_version_dir
+        )
+        self._admin_token = str(admin_token)
+        self._model_manager = ModelManager(
+            executor=self._executor,
+            memory_budget_bytes=model_memory_budget_bytes,
+            load_wait_seconds=model_load_wait_seconds
+        )
+        for encoder in (self._original_clip, self._apple_clip, self._laion_clip):
+            self._model_manager.register(
+                model_type=encoder.model_type,
+                load=self._model_loader(encoder),
+                unload=self._model_unloader(encoder)
+            )
+        if isinstance(model_preload, str):
+            model_preload = [m.strip() for m in model_preload.split(",") if m.strip()]
+        self._model_manager.preload(model_preload)
         self._text_clip_retrieval = TextClipRetrieval(
             top_k=top_k,
             original_clip=self._original_clip,
             apple_clip=self._apple_clip,
             laion_clip=self._laion_clip,
             faiss=self._faiss,
-            data=self._data
+            data=self._data,
+            models=self._model_manager
         )
         self._image_clip_retrieval = ImageClipRetrieval(
             top_k=top_k,
@@ -121,7 +293,11 @@ class Service:
             apple_clip=self._apple_clip,
             laion_clip=self._laion_clip,
             faiss=self._faiss,
-            data=self._data
+            data=self._data,
+            preprocessor=self._image_preprocessor,
+            frames=self._frames,
+            models=self._model_manager,
+            image_cache=self._image_cache
         )
         self._multi_event_retrieval = MultiEventRetrieval(
             top_k=top_k,
@@ -129,9 +305,129 @@ class Service:
             apple_clip=self._apple_clip,
             laion_clip=self._laion_clip,
             faiss=self._faiss,
-            data=self._data
+            data=self._data,
+            models=self._model_manager,
+            frames=self._frames,
+            executor=self._executor,
+            event_chunk_size=event_chunk_size,
+            event_concurrency=event_concurrency
         )
 
+    def _model_loader(self, encoder):
+        """
+        Builds the load function of a model: its encoder, then its FAISS index.
+
+        Args:
+            encoder (BaseCLIP): The encoder of the model.
+
+        Returns:
+            Callable[[], int]: Loads both and returns the bytes they hold.
+        """
+        def load() -> int:
+            try:
+                nbytes = encoder.load()
+                return nbytes + self._faiss.load_index(encoder.model_type)
+            except Exception:
+                encoder.unload()
+                self._faiss.unload_index(encoder.model_type)
+                raise
+        return load
+
+    def _model_unloader(self, encoder):
+        """
+        Builds the unload function of a model.
+
+        Args:
+            encoder (BaseCLIP): The encoder of the model.
+
+        Returns:
+            Callable[[], None]: Releases the encoder and its FAISS index.
+        """
+        def unload() -> None:
+            encoder.unload()
+            self._faiss.unload_index(encoder.model_type)
+        return unload
+
+    @property
+    def executor(self):
+        """
+        Provides access to the executor running blocking inference and search.
+
+        Returns:
+            InferenceExecutor: The shared executor instance.
+        """
+        return self._executor
+
+    @property
+    def text_cache(self):
+        """
+        Provides access to the query text embedding cache.
+
+        Returns:
+            EmbeddingCache: The shared text embedding cache.
+        """
+        return self._text_cache
+
+    @property
+    def image_cache(self):
+        """
+        Provides access to the upload embedding cache.
+
+        Returns:
+            EmbeddingCache: The content-hash image embedding cache.
+        """
+        return self._image_cache
+
+    @property
+    def image_preprocessor(self):
+        """
+        Provides access to the image decoding and preprocessing pool.
+
+        Returns:
+            ImagePreprocessor: The image preprocessing pool.
+        """
+        return self._image_preprocessor
+
+    @property
+    def result_cursors(self):
+        """
+        Provides access to the cursors over paginated results.
+
+        Returns:
+            ResultCursors: The result set cache.
+        """
+        return self._result_cursors
+
+    @property
+    def model_manager(self):
+        """
+        Provides access to the lazy model loader.
+
+        Returns:
+            ModelManager: The memory-budgeted model manager.
+        """
+        return self._model_manager
+
+    @property
+    def index_admin(self):
+        """
+        Provides access to keyframe ingestion and index version reloads.
+
+        Returns:
+            IndexAdmin: The index administration service.
+        """
+        return self._index_admin
+
+    @property
+    def admin_token(self) -> str:
+        """
+        The token required by the admin API, empty when it is disabled.
+
+        Returns:
+            str: The admin token.
+        """
+        return self._admin_token
+
     @property
     def text_clip_retrieval(self):
         """
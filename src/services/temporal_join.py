@@ -0,0 +1,288 @@
+"""
+Indexed temporal join of the per-event hit lists of a multi-event query.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.repositories.load_json import LoadJson
+
+
+class EventHits:
+    """
+    The hits of one event as integer columns: a video code and a frame number
+    per hit, plus the hits sorted by (video, frame) so that "a later frame of
+    the same video" is a binary search instead of a scan.
+    """
+
+    def __init__(
+        self,
+        hits: List[Dict],
+        video_codes: Dict[str, int],
+        field: str = "video_id",
+        frame_field: str = "frame_id",
+        score_field: str = "score"
+    ) -> None:
+        """
+        Initialize the EventHits class.
+
+        Args:
+            hits (List[Dict]): The hits of the event, each with a video and a frame id.
+            video_codes (Dict[str, int]): Video codes shared by the events of a query;
+                unseen videos are added.
+            field (str): The video key of a hit.
+            frame_field (str): The frame key of a hit.
+            score_field (str): The similarity key of a hit; hits without one score 0.
+        """
+        self.hits = hits
+        self.codes = np.array(
+            [video_codes.setdefault(hit[field], len(video_codes)) for hit in hits],
+            dtype=np.int64
+        )
+        self.frames = np.array(
+            [LoadJson.frame_number(hit[frame_field]) for hit in hits],
+            dtype=np.int64
+        )
+        self.scores = np.array(
+            [hit.get(score_field) or 0.0 for hit in hits],
+            dtype=np.float64
+        )
+        self.order = np.argsort(self.keys(self.codes, self.frames), kind="stable")
+        self.sorted_keys = self.keys(self.codes, self.frames)[self.order]
+
+    @staticmethod
+    def keys(
+        codes: np.ndarray,
+        frames: np.ndarray
+    ) -> np.ndarray:
+        """
+        Packs (video code, frame number) pairs into int64 keys ordered by video,
+        then frame.
+        """
+        return (codes << 32) | frames
+
+    def has_later(
+        self,
+        codes: np.ndarray,
+        frames: np.ndarray
+    ) -> np.ndarray:
+        """
+        For each (video, frame) pair, whether this event has a hit in the same
+        video at a strictly later frame.
+
+        Args:
+            codes (np.ndarray): The video codes.
+            frames (np.ndarray): The frame numbers.
+
+        Returns:
+            np.ndarray: A boolean mask parallel to the pairs.
+        """
+        # The first key after (video, frame) is the earliest later hit, if it
+        # still belongs to the same video.
+        positions = np.searchsorted(self.sorted_keys, self.keys(codes, frames), side="right")
+        found = positions < len(self.sorted_keys)
+        found[found] = (self.sorted_keys[positions[found]] >> 32) == codes[found]
+        return found
+
+
+def temporal_join(
+    list_event: List[List[Dict]],
+    field: str = "video_id",
+    frame_field: str = "frame_id"
+) -> List[Dict]:
+    """
+    Keeps the hits of the first event that are followed, in the same video, by
+    a hit of every other event.
+
+    Args:
+        list_event (List[List[Dict]]): The hit lists, the base event first.
+        field (str): The video key of a hit.
+        frame_field (str): The frame key of a hit.
+
+    Returns:
+        List[Dict]: The kept base hits, in their original order.
+    """
+    if not list_event or not list_event[0]:
+        return []
+    video_codes: Dict[str, int] = {}
+    base = EventHits(list_event[0], video_codes, field, frame_field)
+    keep = np.ones(len(base.hits), dtype=bool)
+    for hits in list_event[1:]:
+        other = EventHits(hits, video_codes, field, frame_field)
+        keep[keep] = other.has_later(base.codes[keep], base.frames[keep])
+        if not keep.any():
+            break
+    return [base.hits[i] for i in np.flatnonzero(keep).tolist()]
+
+
+def earliest_frames(
+    hits: List[Dict],
+    field: str = "video_id",
+    frame_field: str = "frame_id"
+) -> Dict[str, int]:
+    """
+    Gets the earliest frame number of the hits of each video.
+
+    Args:
+        hits (List[Dict]): The hits.
+        field (str): The video key of a hit.
+        frame_field (str): The frame key of a hit.
+
+    Returns:
+        Dict[str, int]: Per video id, its earliest hit frame number.
+    """
+    earliest: Dict[str, int] = {}
+    for hit in hits:
+        frame_number = LoadJson.frame_number(hit[frame_field])
+        if frame_number < earliest.get(hit[field], frame_number + 1):
+            earliest[hit[field]] = frame_number
+    return earliest
+
+
+def _range_argmax(
+    values: np.ndarray,
+    lo: np.ndarray,
+    hi: np.ndarray
+) -> np.ndarray:
+    """
+    For each half-open range [lo, hi) of `values`, the position of its maximum
+    (the first one on ties), or -1 for an empty range. Uses a sparse table, so
+    every query is answered by comparing two precomputed positions.
+    """
+    result = np.full(len(lo), -1, dtype=np.int64)
+    n = len(values)
+    if n == 0:
+        return result
+    # table[k][i] is the argmax of values[i:i + 2**k].
+    table = [np.arange(n)]
+    while 1 << len(table) <= n:
+        previous, half = table[-1], 1 << (len(table) - 1)
+        width = n - (1 << len(table)) + 1
+        left, right = previous[:width], previous[half:half + width]
+        table.append(np.where(values[right] > values[left], right, left))
+    lengths = hi - lo
+    queried = np.flatnonzero(lengths > 0)
+    levels = np.floor(np.log2(lengths[queried])).astype(np.int64)
+    for level in np.unique(levels).tolist():
+        rows = queried[levels == level]
+        left = table[level][lo[rows]]
+        right = table[level][hi[rows] - (1 << level)]
+        result[rows] = np.where(values[right] > values[left], right, left)
+    return result
+
+
+def _best_chains(
+    events: List[EventHits],
+    in_batch: np.ndarray,
+    max_gap: Optional[int]
+) -> List[Tuple[float, int, List[int]]]:
+    """
+    Finds the best chain of each video of a batch: one hit per event at strictly
+    increasing frames, at most `max_gap` frames apart, maximizing the summed
+    score. A DP over the hits sorted by (video, frame): the best chain ending at
+    a hit of event i extends the best chain of event i - 1 within the window of
+    earlier frames of the same video.
+
+    Returns:
+        List[Tuple[float, int, List[int]]]: Per video with a chain, its score, its
+        video code and the position of the chosen hit in each event.
+    """
+    selected = [event.order[in_batch[event.codes[event.order]]] for event in events]
+    keys = [EventHits.keys(e.codes[s], e.frames[s]) for e, s in zip(events, selected)]
+    best = events[0].scores[selected[0]]
+    back = []
+    for i in range(1, len(events)):
+        if not np.isfinite(best).any():
+            return []
+        codes = events[i].codes[selected[i]]
+        frames = events[i].frames[selected[i]]
+        earliest = np.zeros_like(frames) if max_gap is None else np.maximum(frames - max_gap, 0)
+        lo = np.searchsorted(keys[i - 1], EventHits.keys(codes, earliest), side="left")
+        hi = np.searchsorted(keys[i - 1], EventHits.keys(codes, frames), side="left")
+        previous = _range_argmax(best, lo, hi)
+        best = np.where(
+            previous >= 0,
+            events[i].scores[selected[i]] + best[np.maximum(previous, 0)],
+            -np.inf
+        )
+        back.append(previous)
+    # The best final hit of each video: sort by video, then score descending.
+    codes = events[-1].codes[selected[-1]]
+    reachable = np.flatnonzero(np.isfinite(best))
+    reachable = reachable[np.lexsort((-best[reachable], codes[reachable]))]
+    first = np.ones(len(reachable), dtype=bool)
+    first[1:] = codes[reachable][1:] != codes[reachable][:-1]
+    chains = [reachable[first]]
+    for previous in reversed(back):
+        chains.append(previous[chains[-1]])
+    chains.reverse()
+    return [
+        (
+            float(best[end]),
+            int(codes[end]),
+            [int(selected[i][chain[row]]) for i, chain in enumerate(chains)]
+        )
+        for row, end in enumerate(chains[-1].tolist())
+    ]
+
+
+def score_sequences(
+    list_event: List[List[Dict]],
+    top_k: int = 100,
+    max_gap: Optional[int] = None,
+    field: str = "video_id",
+    frame_field: str = "frame_id",
+    score_field: str = "score"
+) -> List[Dict]:
+    """
+    Ranks videos by their best ordered chain of hits, one per event in the
+    order of the events, scored by the sum of the hits' similarities.
+
+    Videos are scored in batches, in decreasing order of an upper bound (the sum
+    of each event's best score in the video), and scoring stops once the k-th
+    best chain beats the bound of every remaining video.
+
+    Args:
+        list_event (List[List[Dict]]): The hit lists, one per event, in order.
+        top_k (int): The number of sequences returned.
+        max_gap (int): The largest frame-number gap between consecutive events;
+            None for no limit.
+        field (str): The video key of a hit.
+        frame_field (str): The frame key of a hit.
+        score_field (str): The similarity key of a hit.
+
+    Returns:
+        List[Dict]: The best sequences, each with "video_id", "score" and the
+        chosen hit of every event as "frames".
+    """
+    if not list_event or not all(list_event) or top_k <= 0:
+        return []
+    video_codes: Dict[str, int] = {}
+    events = [EventHits(hits, video_codes, field, frame_field, score_field) for hits in list_event]
+    bounds = np.zeros(len(video_codes))
+    for event in events:
+        event_best = np.full(len(video_codes), -np.inf)
+        np.maximum.at(event_best, event.codes, event.scores)
+        bounds += event_best
+    candidates = np.flatnonzero(np.isfinite(bounds))
+    candidates = candidates[np.argsort(-bounds[candidates], kind="stable")]
+    batch_size = max(top_k, 32)
+    chains: List[Tuple[float, int, List[int]]] = []
+    for start in range(0, len(candidates), batch_size):
+        if len(chains) >= top_k and chains[top_k - 1][0] >= bounds[candidates[start]]:
+            break
+        in_batch = np.zeros(len(video_codes), dtype=bool)
+        in_batch[candidates[start:start + batch_size]] = True
+        chains.extend(_best_chains(events, in_batch, max_gap))
+        chains.sort(key=lambda chain: (-chain[0], chain[1]))
+        del chains[top_k:]
+    video_names = list(video_codes)
+    return [
+        {
+            "video_id": video_names[code],
+            "score": score,
+            "frames": [event.hits[position] for event, position in zip(events, positions)]
+        }
+        for score, code, positions in chains
+    ]
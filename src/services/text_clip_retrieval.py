@@ -2,11 +2,20 @@
 Implements text retrieval using CLIP embeddings and FAISS index.
 """
 
-from typing import List, Dict
+import asyncio
+import time
+from typing import List, Dict, Optional, Tuple, Union
+import numpy as np
 from src.modules.original_clip import OriginalCLIP
 from src.modules.apple_clip import AppleCLIP
 from src.modules.laion_clip import LaionCLIP
 from src.repositories.load_faiss import ClipFaiss
+from src.repositories.load_json import LoadJson
+from src.services.model_manager import ModelManager
+from src.services.result_fusion import fuse, score_fusion
+
+ENSEMBLE_MODEL = "ensemble"
+ENSEMBLE_FUSIONS = ("rrf", "weighted_sum")
 
 
 class TextClipRetrieval:
@@ -21,7 +30,8 @@ class TextClipRetrieval:
         apple_clip: AppleCLIP,
         laion_clip: LaionCLIP,
         faiss: ClipFaiss,
-        data: Dict
+        data: LoadJson,
+        models: ModelManager
     ) -> None:
         """
         Initializes the ClipSearch class with the given CLIP models, FAISS index, and data.
@@ -32,7 +42,9 @@ class TextClipRetrieval:
             apple_clip (AppleCLIP): An instance of the AppleCLIP model.
             laion_clip (LaionCLIP): An instance of the LaionCLIP model.
             faiss (ClipFaiss): An instance of the ClipFaiss class for performing FAISS.
-            data (Dict): A dictionary mapping indices to video and frame information.
+            data (LoadJson): The keyframe store mapping indices to video and frame information.
+            models (ModelManager): Keeps the encoder and index of a model loaded
+                while it is used.
         """
         self._top_k = top_k
         self._original_clip = original_clip
@@ -40,35 +52,44 @@ class TextClipRetrieval:
         self._laion_clip = laion_clip
         self._faiss = faiss
         self._data = data
+        self._models = models
 
     async def mapping_results(
         self,
-        data: Dict,
-        indices: List[int]
+        data: LoadJson,
+        indices: np.ndarray,
+        scores: Optional[np.ndarray] = None
     ) -> List:
         """
         Maps the search results (indices) to the corresponding video and frame information.
 
         Args:
-            data (Dict): A dictionary mapping indices to video and frame information.
-            indices (List[int]): A list of indices retrieved from the FAISS search.
+            data (LoadJson): The keyframe store mapping indices to video and frame information.
+            indices (np.ndarray): A row of indices retrieved from the FAISS search.
+            scores (np.ndarray): The similarity scores parallel to `indices`, added
+                to each result as "score" when given.
 
         Returns:
             List: A list of mapped results containing video 
             and frame information for the given indices.
         """
-        filtered_list = [data[indice] for indice in indices if indice in data]
-        return filtered_list
+        return data.map_indices(indices, scores)
 
     async def original_text_retrieval(
         self,
-        text: str
+        text: str,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         Retrieves text data using the original CLIP model.
 
         Args:
             text (str): The input text to retrieve data for.
+            top_k (int): The number of results, defaulting to the service top_k.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range".
 
         Returns:
             List[Dict]: A list of dictionaries containing the retrieval results.
@@ -76,25 +97,34 @@ class TextClipRetrieval:
         vector_embedding = await self._original_clip.text_embedding(
             text=text
         )
-        indices = await self._faiss.original_search(
-            top_k=self._top_k,
-            query_vectors=vector_embedding
+        scores, indices = await self._faiss.original_search(
+            top_k=self._top_k if top_k is None else top_k,
+            query_vectors=vector_embedding,
+            min_score=min_score,
+            search_mode=search_mode
         )
         result = await self.mapping_results(
             data=self._data,
-            indices=indices[0]
+            indices=indices[0],
+            scores=scores[0]
         )
         return result
 
     async def apple_text_retrieval(
         self,
-        text: str
+        text: str,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         Retrieves text data using the apple CLIP model.
 
         Args:
             text (str): The input text to retrieve data for.
+            top_k (int): The number of results, defaulting to the service top_k.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range".
 
         Returns:
             List[Dict]: A list of dictionaries containing the retrieval results.
@@ -102,25 +132,34 @@ class TextClipRetrieval:
         vector_embedding = await self._apple_clip.text_embedding(
             text=text
         )
-        indices = await self._faiss.apple_search(
-            top_k=self._top_k,
-            query_vectors=vector_embedding
+        scores, indices = await self._faiss.apple_search(
+            top_k=self._top_k if top_k is None else top_k,
+            query_vectors=vector_embedding,
+            min_score=min_score,
+            search_mode=search_mode
         )
         result = await self.mapping_results(
             data=self._data,
-            indices=indices[0]
+            indices=indices[0],
+            scores=scores[0]
         )
         return result
 
     async def laion_text_retrieval(
         self,
-        text: str
+        text: str,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         Retrieves text data using the laion CLIP model.
 
         Args:
             text (str): The input text to retrieve data for.
+            top_k (int): The number of results, defaulting to the service top_k.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range".
 
         Returns:
             List[Dict]: A list of dictionaries containing the retrieval results.
@@ -128,20 +167,26 @@ class TextClipRetrieval:
         vector_embedding = await self._laion_clip.text_embedding(
             text=text
         )
-        indices = await self._faiss.laion_search(
-            top_k=self._top_k,
-            query_vectors=vector_embedding
+        scores, indices = await self._faiss.laion_search(
+            top_k=self._top_k if top_k is None else top_k,
+            query_vectors=vector_embedding,
+            min_score=min_score,
+            search_mode=search_mode
         )
         result = await self.mapping_results(
             data=self._data,
-            indices=indices[0]
+            indices=indices[0],
+            scores=scores[0]
         )
         return result
 
     async def text_retrieval(
         self,
         model_type: str,
-        text: str
+        text: str,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
     ) -> List[Dict]:
         """
         Retrieves text data based on the specified model type.
@@ -149,23 +194,157 @@ class TextClipRetrieval:
         Args:
             model_type (str): The type of model to use for retrieval.
             text (str): The input text to retrieve data for.
+            top_k (int): The number of results, defaulting to the service top_k.
+            min_score (float): Drops results scoring below it; the radius in range mode.
+            search_mode (str): "knn" or "range".
 
         Returns:
             List[Dict]: A list of dictionaries containing the retrieval results.
         """
-        if model_type == "original_clip":
-            return await self.original_text_retrieval(
-                text=text
-            )
-        elif model_type == "apple_clip":
-            return await self.apple_text_retrieval(
-                text=text
-            )
-        elif model_type == "laion_clip":
-            return await self.laion_text_retrieval(
-                text=text
-            )
-        else:
+        if model_type not in self._models.model_types:
             return {
                 "error": "Model type not supported"
             }
+        async with self._models.use(model_type):
+            if model_type == "original_clip":
+                return await self.original_text_retrieval(
+                    text=text,
+                    top_k=top_k,
+                    min_score=min_score,
+                    search_mode=search_mode
+                )
+            if model_type == "apple_clip":
+                return await self.apple_text_retrieval(
+                    text=text,
+                    top_k=top_k,
+                    min_score=min_score,
+                    search_mode=search_mode
+                )
+            return await self.laion_text_retrieval(
+                text=text,
+                top_k=top_k,
+                min_score=min_score,
+                search_mode=search_mode
+            )
+
+    def ensemble_models(
+        self,
+        model_type: Union[str, List[str]]
+    ) -> Optional[List[str]]:
+        """
+        Gets the models of an ensemble request.
+
+        Args:
+            model_type (Union[str, List[str]]): "ensemble" for every model, a list
+                of model types, or a single model type.
+
+        Returns:
+            Optional[List[str]]: The distinct model types of the ensemble, or None
+            for a single model type.
+
+        Raises:
+            ValueError: If a listed model type is not supported or the list is empty.
+        """
+        if model_type == ENSEMBLE_MODEL:
+            return list(self._models.model_types)
+        if isinstance(model_type, str):
+            return None
+        model_types = list(dict.fromkeys(model_type))
+        if not model_types:
+            raise ValueError("At least one model type is required")
+        for name in model_types:
+            if name not in self._models.model_types:
+                raise ValueError(f"Model type not supported: {name}")
+        return model_types
+
+    async def timed_text_retrieval(
+        self,
+        model_type: str,
+        text: str,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn"
+    ) -> Tuple[List[Dict], float]:
+        """
+        Runs `text_retrieval` and measures it.
+
+        Returns:
+            Tuple[List[Dict], float]: The results and the elapsed milliseconds.
+        """
+        start = time.perf_counter()
+        result = await self.text_retrieval(
+            model_type=model_type,
+            text=text,
+            top_k=top_k,
+            min_score=min_score,
+            search_mode=search_mode
+        )
+        return result, (time.perf_counter() - start) * 1000.0
+
+    async def ensemble_text_retrieval(
+        self,
+        model_types: List[str],
+        text: str,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        search_mode: str = "knn",
+        fusion: str = "rrf",
+        weights: Optional[Dict[str, float]] = None,
+        rrf_k: int = 60
+    ) -> Tuple[List[Dict], Dict[str, float]]:
+        """
+        Retrieves with several models concurrently and fuses their results.
+        Each model encodes and searches on its own executor pools, so the
+        request takes about as long as the slowest model.
+
+        Args:
+            model_types (List[str]): The models of the ensemble.
+            text (str): The input text to retrieve data for.
+            top_k (int): The number of results per model, defaulting to the service top_k.
+            min_score (float): Drops results of each model scoring below it.
+            search_mode (str): "knn" or "range".
+            fusion (str): "rrf" for weighted reciprocal-rank fusion, or
+                "weighted_sum" for the weighted sum of the per-model min-max
+                normalized scores.
+            weights (Dict[str, float]): The weight of each model; 1 when missing.
+            rrf_k (int): The rank offset of "rrf".
+
+        Returns:
+            Tuple[List[Dict], Dict[str, float]]: The best `top_k` fused results, each
+            keyframe once with the fused value as "score", and the milliseconds each
+            model took.
+
+        Raises:
+            ValueError: If the fusion is unknown.
+        """
+        if fusion not in ENSEMBLE_FUSIONS:
+            raise ValueError(f"Unknown ensemble fusion: {fusion}")
+        results = await asyncio.gather(*(
+            self.timed_text_retrieval(
+                model_type=model_type,
+                text=text,
+                top_k=top_k,
+                min_score=min_score,
+                search_mode=search_mode
+            ) for model_type in model_types
+        ))
+        sources = [result for result, _ in results]
+        source_weights = [
+            float((weights or {}).get(model_type, 1.0)) for model_type in model_types
+        ]
+        timings = {
+            model_type: elapsed for model_type, (_, elapsed) in zip(model_types, results)
+        }
+        if fusion == "rrf":
+            result = fuse(
+                sources=sources,
+                mode="rrf",
+                weights=source_weights,
+                rrf_k=rrf_k
+            )
+        else:
+            result = score_fusion(
+                sources=sources,
+                weights=source_weights
+            )
+        return result[:self._top_k if top_k is None else top_k], timings
@@ -0,0 +1,328 @@
+"""
+Build the FAISS index of a CLIP model from its raw keyframe embeddings.
+
+Builds several index variants (exact Flat, IVF-Flat, IVF-PQ, HNSW and the
+compressed PQ, SQ8 and fp16 scans) from an (n, d) `.npy` embedding matrix whose
+row i is the keyframe with `indice` i in clip.json, measures recall@K against
+exact search and single-query p50/p99 latency at K, then writes the chosen
+variant with a manifest next to it (`<model_type>.faiss` and
+`<model_type>.manifest.json`). ClipFaiss reads the manifest to check the index
+and apply its search parameters.
+
+With `--rerank-candidates N` every variant is also measured as the first stage
+of a two-stage search whose top N candidates are re-scored exactly against the
+float32 embeddings, and the memory of the index plus the memory-mapped
+embeddings is reported against a flat index. The chosen index then ships
+with `<model_type>.vectors.npy`, which ClipFaiss maps read-only for re-ranking.
+
+Run from the repository root:
+    python -m src.tools.build_index --model-type apple_clip \
+        --embeddings apple.npy --json clip.json --output-dir indexes
+    python -m src.tools.build_index --model-type laion_clip \
+        --embeddings laion.npy --json clip.json --variants flat sq8 pq \
+        --rerank-candidates 4000
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+from src.repositories.index_manifest import apply_search_params, write_manifest
+from src.repositories.load_faiss import GPU_DEVICES, GPU_MAX_K
+from src.repositories.rerank_store import RerankStore
+
+VARIANTS = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "fp16", "pq")
+# TOP_K of the service; not imported to keep the model libraries out of the builder.
+TOP_K = 1500
+
+
+def load_embeddings(
+    embeddings_path: str,
+    json_path: str,
+    normalize: bool = True
+) -> np.ndarray:
+    """
+    Load the embedding matrix and check it against clip.json.
+
+    Args:
+        embeddings_path (str): The (n, d) `.npy` matrix, one row per indice.
+        json_path (str): The keyframe mapping.
+        normalize (bool): Whether to L2-normalize the rows for inner-product search.
+
+    Returns:
+        np.ndarray: The float32 embeddings.
+    """
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    if embeddings.ndim != 2:
+        raise ValueError(f"Expected an (n, d) matrix, got shape {embeddings.shape}")
+    with open(json_path, "r", encoding="utf-8") as f:
+        indices = sorted(obj["indice"] for obj in json.load(f))
+    if indices != list(range(embeddings.shape[0])):
+        raise ValueError(
+            f"clip.json indices must be 0..{embeddings.shape[0] - 1}, one per embedding row"
+        )
+    # Copy out of the read-only map; normalize_L2 works in place.
+    embeddings = np.array(embeddings, dtype=np.float32, order="C")
+    if normalize:
+        faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def factory_string(
+    variant: str,
+    n: int,
+    dim: int,
+    nlist: int,
+    pq_m: int,
+    hnsw_m: int
+) -> str:
+    """
+    Get the index_factory string of a variant.
+    """
+    if variant == "flat":
+        return "Flat"
+    if variant == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if variant == "ivf_pq":
+        if dim % pq_m:
+            raise ValueError(f"--pq-m {pq_m} must divide the dimension {dim}")
+        return f"IVF{nlist},PQ{pq_m}"
+    if variant == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+    if variant == "sq8":
+        return "SQ8"
+    if variant == "fp16":
+        return "SQfp16"
+    if variant == "pq":
+        if dim % pq_m:
+            raise ValueError(f"--pq-m {pq_m} must divide the dimension {dim}")
+        return f"PQ{pq_m}"
+    raise ValueError(f"Unknown variant: {variant} ({n} vectors)")
+
+
+def build_variant(
+    factory: str,
+    embeddings: np.ndarray,
+    train_size: int
+) -> faiss.Index:
+    """
+    Train and fill an inner-product index.
+    """
+    index = faiss.index_factory(embeddings.shape[1], factory, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        rng = np.random.default_rng(0)
+        sample = rng.choice(embeddings.shape[0], min(train_size, embeddings.shape[0]),
+                            replace=False)
+        index.train(embeddings[np.sort(sample)])
+    index.add(embeddings)
+    return index
+
+
+def evaluate(
+    index: faiss.Index,
+    queries: np.ndarray,
+    ground_truth: np.ndarray,
+    top_k: int,
+    store: Optional[RerankStore] = None
+) -> Dict:
+    """
+    Measure recall@K against exact search and single-query latency.
+
+    Args:
+        index (faiss.Index): The index under test, with its search parameters set.
+        queries (np.ndarray): The (q, d) query vectors.
+        ground_truth (np.ndarray): The exact top-k ids of each query.
+        top_k (int): K.
+        store (RerankStore): Re-ranks `store.candidates` results of the index
+            exactly, as ClipFaiss does for compressed indexes.
+
+    Returns:
+        Dict: Recall and p50/p99 latency in milliseconds.
+    """
+    candidates = top_k if store is None else min(max(top_k, store.candidates), index.ntotal)
+    latencies = []
+    recalls = []
+    for query, truth in zip(queries, ground_truth):
+        query = query.reshape(1, -1)
+        start = time.perf_counter()
+        _, ids = index.search(query, candidates)
+        if store is not None:
+            _, ids = store.rerank(query, ids, top_k)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        recalls.append(len(np.intersect1d(ids[0], truth)) / top_k)
+    return {
+        "recall": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2)
+    }
+
+
+def choose(
+    reports: Dict[str, Dict],
+    min_recall: float,
+    rerank: bool = False
+) -> str:
+    """
+    Pick the variant whose recall meets the target; Flat always does. Plain
+    search picks the fastest, two-stage search the smallest in RAM.
+    """
+    prefix = "rerank_" if rerank else ""
+    eligible = [
+        name for name, report in reports.items()
+        if report[f"{prefix}recall"] >= min_recall or name == "flat"
+    ]
+    if rerank:
+        return min(eligible, key=lambda name: (reports[name]["bytes"],
+                                               reports[name]["rerank_p50_ms"]))
+    return min(eligible, key=lambda name: reports[name]["p50_ms"])
+
+
+def main() -> None:
+    """
+    Parse arguments, build and evaluate the variants, and write the chosen one.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-type", required=True,
+                        choices=["original_clip", "apple_clip", "laion_clip"])
+    parser.add_argument("--embeddings", required=True, help="(n, d) .npy matrix")
+    parser.add_argument("--json", required=True, help="the clip.json keyframe mapping")
+    parser.add_argument("--output-dir", default="indexes")
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--queries", help="(q, d) .npy query matrix, e.g. text embeddings; "
+                        "defaults to a sample of the embeddings")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--nlist", type=int, default=None,
+                        help="IVF lists, default 4 * sqrt(n)")
+    parser.add_argument("--nprobe", type=int, default=64)
+    parser.add_argument("--pq-m", type=int, default=None,
+                        help="PQ sub-quantizers, default dim / 8")
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-search", type=int, default=None,
+                        help="HNSW efSearch, default and minimum --top-k")
+    parser.add_argument("--train-size", type=int, default=200_000)
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--choose", choices=VARIANTS,
+                        help="write this variant instead of the fastest one meeting --min-recall")
+    parser.add_argument("--no-normalize", action="store_true")
+    parser.add_argument("--rerank-candidates", type=int, default=0,
+                        help="re-rank this many candidates exactly against memory-mapped "
+                        "float32 embeddings; 0 disables two-stage search")
+    args = parser.parse_args()
+    if args.model_type in GPU_DEVICES and args.rerank_candidates > GPU_MAX_K:
+        parser.error(
+            f"{args.model_type} is searched on a GPU, which returns at most "
+            f"{GPU_MAX_K} re-rank candidates"
+        )
+
+    embeddings = load_embeddings(args.embeddings, args.json, not args.no_normalize)
+    n, dim = embeddings.shape
+    top_k = min(args.top_k, n)
+    nlist = args.nlist or max(1, int(4 * math.sqrt(n)))
+    pq_m = args.pq_m or dim // 8
+    search_params = {
+        "ivf_flat": {"nprobe": min(args.nprobe, nlist)},
+        "ivf_pq": {"nprobe": min(args.nprobe, nlist)},
+        # HNSW cannot return more than efSearch neighbours.
+        "hnsw": {"efSearch": max(args.ef_search or top_k, top_k)}
+    }
+
+    if args.queries:
+        queries = np.ascontiguousarray(np.load(args.queries), dtype=np.float32)
+        if not args.no_normalize:
+            faiss.normalize_L2(queries)
+    else:
+        rng = np.random.default_rng(1)
+        queries = embeddings[rng.choice(n, min(args.num_queries, n), replace=False)]
+
+    exact = faiss.IndexFlatIP(dim)
+    exact.add(embeddings)
+    _, ground_truth = exact.search(queries, top_k)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    store = None
+    if args.rerank_candidates:
+        # The rows are already normalized, so the store reads them as they are.
+        vectors_path = os.path.join(args.output_dir, f"{args.model_type}.vectors.npy")
+        np.save(vectors_path, embeddings)
+        store = RerankStore(vectors_path, normalize=False,
+                            candidates=args.rerank_candidates)
+
+    indexes: Dict[str, faiss.Index] = {}
+    reports: Dict[str, Dict] = {}
+    print(f"{args.model_type}: {n} vectors, d={dim}, {len(queries)} queries, K={top_k}")
+    print(f"{'variant':<10}{'factory':<22}{'build s':>9}{'recall':>9}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'size MB':>9}"
+          + (f"{'rr recall':>11}{'rr p50':>9}{'rr p99':>9}" if store else ""))
+    for variant in args.variants:
+        factory = factory_string(variant, n, dim, nlist, pq_m, args.hnsw_m)
+        start = time.perf_counter()
+        index = exact if variant == "flat" else build_variant(factory, embeddings,
+                                                              args.train_size)
+        build_seconds = time.perf_counter() - start
+        params = search_params.get(variant, {})
+        apply_search_params(index, params)
+        report = evaluate(index, queries, ground_truth, top_k)
+        report.update({
+            "factory": factory,
+            "search_params": params,
+            "build_seconds": round(build_seconds, 1),
+            "bytes": int(faiss.serialize_index(index).nbytes)
+        })
+        row = ""
+        if store is not None:
+            two_stage = evaluate(index, queries, ground_truth, top_k, store)
+            report.update({f"rerank_{key}": value for key, value in two_stage.items()})
+            row = (f"{two_stage['recall']:>11.4f}{two_stage['p50_ms']:>9.2f}"
+                   f"{two_stage['p99_ms']:>9.2f}")
+        indexes[variant] = index
+        reports[variant] = report
+        print(f"{variant:<10}{factory:<22}{build_seconds:>9.1f}{report['recall']:>9.4f}"
+              f"{report['p50_ms']:>9.2f}{report['p99_ms']:>9.2f}"
+              f"{report['bytes'] / 2**20:>9.1f}" + row)
+
+    chosen = args.choose or choose(reports, args.min_recall, rerank=store is not None)
+    if chosen not in indexes:
+        raise SystemExit(f"--choose {chosen} was not built, add it to --variants")
+    flat_mb = n * dim * 4 / 2**20
+    index_mb = reports[chosen]["bytes"] / 2**20
+    if store is not None:
+        print(f"memory: flat {flat_mb:.1f} MB in RAM; {chosen} {index_mb:.1f} MB in RAM "
+              f"+ {store.nbytes() / 2**20:.1f} MB memory-mapped re-rank vectors "
+              f"({index_mb / flat_mb:.1%} of flat resident)")
+    index_path = os.path.join(args.output_dir, f"{args.model_type}.faiss")
+    faiss.write_index(indexes[chosen], index_path)
+    manifest = {
+        "model_type": args.model_type,
+        "variant": chosen,
+        "factory": reports[chosen]["factory"],
+        "metric": "inner_product",
+        "normalized": not args.no_normalize,
+        "dim": dim,
+        "ntotal": n,
+        "search_params": reports[chosen]["search_params"],
+        "top_k": top_k,
+        "embeddings": os.path.abspath(args.embeddings),
+        "json": os.path.abspath(args.json),
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "reports": reports
+    }
+    if store is not None:
+        manifest["rerank"] = {
+            "vectors": os.path.abspath(vectors_path),
+            "normalize": False,
+            "candidates": args.rerank_candidates
+        }
+    manifest_file = write_manifest(index_path, manifest)
+    print(f"chose {chosen}: wrote {index_path} and {manifest_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Compile keyframe metadata JSON into a memory-mappable bundle.
+
+Parses `clip.json` once and writes its columns (video code, frame number and
+frame id format per FAISS id, plus the video name and frame format tables) as
+`.npy` arrays and offset/string tables in `clip.bundle/`. `LoadJson` maps the
+bundle instead of parsing the JSON whenever the bundle is up to date with the
+file, or when JSON_CLIP points at the bundle itself. The bundle records the
+size and mtime of its source, so editing clip.json falls back to JSON until
+it is compiled again.
+
+Run from the repository root:
+    python -m src.tools.compile_metadata clip.json
+"""
+
+import argparse
+import time
+
+from src.repositories.load_json import LoadJson
+from src.repositories.metadata_bundle import bundle_path
+
+
+def main() -> None:
+    """
+    Parse arguments, compile the bundle and check it against the JSON file.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("json", help="the clip.json keyframe mapping")
+    parser.add_argument("--output", help="bundle directory, default <json stem>.bundle")
+    args = parser.parse_args()
+
+    output = args.output or bundle_path(args.json)
+    start = time.perf_counter()
+    frames = LoadJson(args.json, use_bundle=False)
+    parse_seconds = time.perf_counter() - start
+    frames.save_bundle(output, source_url=args.json)
+
+    start = time.perf_counter()
+    bundle = LoadJson(output)
+    open_seconds = time.perf_counter() - start
+    if bundle.records() != frames.records():
+        raise SystemExit(f"{output} does not match {args.json}")
+    print(f"{len(frames)} keyframes: parsed {args.json} in {parse_seconds:.2f}s, "
+          f"wrote {output}, opened it in {open_seconds * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Export a CPU-optimized text encoder for each CLIP model.
+
+The text tower is traced with TorchScript after int8 dynamic quantization of
+its linear layers, and written to `<output-dir>/<model_type>_text_int8.pt`,
+which is where the service looks for it when TEXT_ENCODER_MODE=int8.
+
+Run from the repository root:
+    python -m src.tools.export_text_encoder --model-type apple_clip laion_clip
+"""
+
+import argparse
+import os
+
+import torch
+
+from src.modules.base_clip import BaseCLIP
+from src.modules.cpu_text_encoder import export_text_tower
+from src.modules.model_loader import load_clip_encoder
+from src.services.service import (ORIGINAL_CLIP_MODEL,
+                                  APPLE_CLIP_MODEL,
+                                  APPLE_CLIP_TOKENIZER,
+                                  LAION_CLIP_MODEL,
+                                  LAION_CLIP_TOKENIZER,
+                                  TEXT_ENCODER_DIR,
+                                  text_encoder_path)
+
+MODELS = {
+    "original_clip": (ORIGINAL_CLIP_MODEL, ORIGINAL_CLIP_MODEL),
+    "apple_clip": (APPLE_CLIP_MODEL, APPLE_CLIP_TOKENIZER),
+    "laion_clip": (LAION_CLIP_MODEL, LAION_CLIP_TOKENIZER),
+}
+
+
+def load_cpu_encoder(model_type: str) -> BaseCLIP:
+    """
+    Load the fp32 encoder of a model on CPU.
+
+    Args:
+        model_type (str): The model type.
+
+    Returns:
+        BaseCLIP: The encoder in "default" text encoder mode.
+    """
+    model_name, tokenizer_name = MODELS[model_type]
+    return load_clip_encoder(
+        model_type=model_type,
+        model_name=model_name,
+        tokenizer_name=tokenizer_name,
+        device_type=torch.device("cpu")
+    )
+
+
+def main() -> None:
+    """
+    Parse arguments and export the requested text towers.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-type", nargs="+", choices=sorted(MODELS),
+                        default=sorted(MODELS))
+    parser.add_argument("--output-dir", default=TEXT_ENCODER_DIR)
+    parser.add_argument("--no-quantize", action="store_true",
+                        help="trace the fp32 tower without int8 quantization")
+    parser.add_argument("--onnx", action="store_true",
+                        help="also write an fp32 ONNX export next to the TorchScript file")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for model_type in args.model_type:
+        encoder = load_cpu_encoder(model_type)
+        tower, example_inputs = encoder.text_tower()
+        output_path = text_encoder_path(args.output_dir, model_type)
+        onnx_path = None
+        if args.onnx:
+            onnx_path = os.path.join(args.output_dir, f"{model_type}_text.onnx")
+        export_text_tower(
+            tower=tower,
+            example_inputs=example_inputs,
+            output_path=output_path,
+            quantize=not args.no_quantize,
+            onnx_path=onnx_path
+        )
+        print(f"{model_type}: wrote {output_path}")
+        del encoder, tower
+
+
+if __name__ == "__main__":
+    main()
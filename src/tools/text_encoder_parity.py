@@ -0,0 +1,114 @@
+"""
+Check a CPU text encoder mode against the fp32 text embeddings.
+
+Reports the cosine similarity between fp32 and candidate embeddings and the
+top-k overlap of their searches on the model's FAISS index.
+
+Run from the repository root:
+    python -m src.tools.text_encoder_parity --model-type apple_clip --mode int8 \
+        --index /kaggle/input/apple-clip/apple.faiss --queries queries.txt
+"""
+
+import argparse
+
+import faiss
+import numpy as np
+
+from src.services.service import TEXT_ENCODER_DIR, text_encoder_path
+from src.tools.export_text_encoder import MODELS, load_cpu_encoder
+
+DEFAULT_QUERIES = [
+    "a man is riding a motorbike on a crowded street",
+    "workers are processing dried shrimp, behind is a blue barrel",
+    "a news anchor in a red dress in the studio",
+    "fireworks over the river at night",
+    "a football player celebrating a goal",
+    "an aerial view of rice fields",
+    "a firefighter spraying water on a burning house",
+    "children in white uniforms at a school ceremony",
+]
+
+
+def encode(encoder, texts, batch_size: int = 16) -> np.ndarray:
+    """
+    Encode texts in batches with the encoder's current mode.
+    """
+    rows = [
+        encoder.encode_texts(texts[i:i + batch_size]).float().cpu().numpy()
+        for i in range(0, len(texts), batch_size)
+    ]
+    return np.concatenate(rows, axis=0).astype(np.float32)
+
+
+def parity_report(
+    reference: np.ndarray,
+    candidate: np.ndarray,
+    index: faiss.Index = None,
+    top_k: int = 100
+) -> dict:
+    """
+    Compare candidate embeddings with the fp32 reference.
+
+    Args:
+        reference (np.ndarray): The fp32 embeddings, one row per query.
+        candidate (np.ndarray): The embeddings of the mode under test.
+        index (faiss.Index): Optional index used for the top-k overlap.
+        top_k (int): The number of neighbours compared.
+
+    Returns:
+        dict: Mean and minimum cosine similarity and, with an index, the mean
+        and minimum top-k overlap.
+    """
+    reference_unit = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate_unit = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = (reference_unit * candidate_unit).sum(axis=1)
+    report = {
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+    }
+    if index is not None:
+        _, reference_ids = index.search(reference, top_k)
+        _, candidate_ids = index.search(candidate, top_k)
+        overlap = np.array([
+            len(np.intersect1d(ref, cand)) / top_k
+            for ref, cand in zip(reference_ids, candidate_ids)
+        ])
+        report[f"top{top_k}_overlap_mean"] = float(overlap.mean())
+        report[f"top{top_k}_overlap_min"] = float(overlap.min())
+    return report
+
+
+def main() -> None:
+    """
+    Parse arguments and print the parity report.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-type", choices=sorted(MODELS), required=True)
+    parser.add_argument("--mode", choices=["int8", "bf16"], default="int8")
+    parser.add_argument("--export-dir", default=TEXT_ENCODER_DIR)
+    parser.add_argument("--index", help="FAISS index of the model for top-k overlap")
+    parser.add_argument("--queries", help="text file with one query per line")
+    parser.add_argument("--top-k", type=int, default=100)
+    args = parser.parse_args()
+
+    texts = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+    encoder = load_cpu_encoder(args.model_type)
+    reference = encode(encoder, texts)
+    encoder.set_text_encoder_mode(
+        mode=args.mode,
+        path=text_encoder_path(args.export_dir, args.model_type)
+    )
+    candidate = encode(encoder, texts)
+    index = faiss.read_index(args.index) if args.index else None
+    report = parity_report(reference, candidate, index, args.top_k)
+    print(f"{args.model_type} {args.mode} vs fp32 on {len(texts)} queries")
+    for name, value in report.items():
+        print(f"  {name:<22}{value:.4f}")
+
+
+if __name__ == "__main__":
+    main()
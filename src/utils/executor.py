@@ -0,0 +1,108 @@
+"""
+This module provides the executor layer that runs blocking model inference
+and FAISS search off the asyncio event loop.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import (Any,
+                    Callable,
+                    Dict,
+                    Optional)
+
+
+class InferenceExecutor:
+    """
+    Owns one bounded thread pool per model and per index.
+
+    Blocking torch and FAISS calls are submitted to the pool of the resource
+    they use, so a slow query on one model never occupies the event loop or
+    the workers of another model.
+    """
+
+    def __init__(
+        self,
+        pool_sizes: Optional[Dict[str, int]] = None,
+        default_workers: int = 1
+    ) -> None:
+        """
+        Initialize the InferenceExecutor class.
+
+        Args:
+            pool_sizes (Dict[str, int]): The number of worker threads per named pool.
+            default_workers (int): The number of workers for pools created on demand.
+        """
+        self._pool_sizes = dict(pool_sizes or {})
+        self._default_workers = max(1, int(default_workers))
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    def get_pool(
+        self,
+        name: str
+    ) -> ThreadPoolExecutor:
+        """
+        Get the thread pool for a resource, creating it on first use.
+
+        Args:
+            name (str): The name of the pool (a model type or an index name).
+
+        Returns:
+            ThreadPoolExecutor: The bounded thread pool for the resource.
+        """
+        pool = self._pools.get(name)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(name)
+                if pool is None:
+                    pool = ThreadPoolExecutor(
+                        max_workers=max(
+                            1, int(self._pool_sizes.get(name, self._default_workers))
+                        ),
+                        thread_name_prefix=f"infer-{name}"
+                    )
+                    self._pools[name] = pool
+        return pool
+
+    async def run(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        *args,
+        **kwargs
+    ) -> Any:
+        """
+        Run a blocking function on the pool of a resource and await its result.
+
+        Args:
+            name (str): The name of the pool to run on.
+            func (Callable[..., Any]): The blocking function.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            Any: The return value of the function.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.get_pool(name),
+            functools.partial(func, *args, **kwargs)
+        )
+
+    def shutdown(
+        self,
+        wait: bool = True
+    ) -> None:
+        """
+        Shut down every pool.
+
+        Args:
+            wait (bool): Whether to wait for running jobs to finish.
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.shutdown(wait=wait)
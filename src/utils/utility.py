@@ -1,8 +1,11 @@
 """
 This script is used for utility functions
 """
+import os
 import json
-from typing import List, Dict
+import ctypes
+import ctypes.util
+from typing import Any, List, Dict
 
 
 def convert_value(value):
@@ -34,6 +37,41 @@ def convert_value(value):
         pass
     return value
 
+
+def get_env_value(
+    name: str,
+    default: Any
+) -> Any:
+    """
+    Read a configuration value from the environment, falling back to a default.
+
+    Args:
+        name (str): The name of the environment variable.
+        default (Any): The value returned when the variable is not set.
+
+    Returns:
+        The converted environment value, or the default.
+    """
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return convert_value(value)
+
+
+def release_free_memory() -> None:
+    """
+    Return memory freed after a large parse to the OS. glibc keeps freed heap
+    memory for reuse, which otherwise stays in every worker's private RSS.
+    Does nothing on other C libraries.
+    """
+    libc_name = ctypes.util.find_library("c")
+    if libc_name is None:
+        return
+    malloc_trim = getattr(ctypes.CDLL(libc_name), "malloc_trim", None)
+    if malloc_trim is not None:
+        malloc_trim(0)
+
+
 def count_non_empty_fields(test: str, list_ocr: List[Dict], list_asr: List[Dict]) -> int:
     # Đếm số lượng field không rỗng
     count = 0
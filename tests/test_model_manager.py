@@ -0,0 +1,92 @@
+"""
+Tests of the memory budget of ModelManager.
+"""
+
+import asyncio
+import threading
+import time
+
+from src.services.model_manager import ModelManager
+from src.utils.executor import InferenceExecutor
+
+MODEL_TYPES = ("a", "b", "c")
+
+
+class FakeModels:
+    """
+    Models of a fixed size whose loads take a while, recording the peak of the
+    memory held, counted from the start of each load.
+    """
+
+    def __init__(self, nbytes: int, load_seconds: float = 0.05) -> None:
+        self.nbytes = nbytes
+        self.load_seconds = load_seconds
+        self.held = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def loader(self):
+        def load() -> int:
+            with self._lock:
+                self.held += self.nbytes
+                self.peak = max(self.peak, self.held)
+            time.sleep(self.load_seconds)
+            return self.nbytes
+        return load
+
+    def unloader(self):
+        def unload() -> None:
+            with self._lock:
+                self.held -= self.nbytes
+        return unload
+
+
+def make_manager(models: FakeModels, budget: int) -> ModelManager:
+    executor = InferenceExecutor(pool_sizes={name: 1 for name in MODEL_TYPES})
+    manager = ModelManager(executor, memory_budget_bytes=budget, load_wait_seconds=5)
+    for name in MODEL_TYPES:
+        manager.register(name, models.loader(), models.unloader())
+    return manager
+
+
+async def request(manager: ModelManager, model_type: str) -> None:
+    async with manager.use(model_type):
+        await asyncio.sleep(0.01)
+
+
+def test_concurrent_cold_loads_stay_within_budget():
+    models = FakeModels(nbytes=60)
+    manager = make_manager(models, budget=130)
+
+    async def main():
+        # An ensemble request touching every model before any size is known.
+        await asyncio.gather(*(request(manager, name) for name in MODEL_TYPES))
+        for _ in range(3):
+            await request(manager, "a")
+
+    asyncio.run(main())
+    loaded = sum(stats["bytes"] for stats in manager.stats().values())
+    assert models.peak <= 130
+    assert loaded <= 130
+    assert models.held == loaded
+
+
+def test_models_over_budget_while_in_use_are_evicted_once_idle():
+    models = FakeModels(nbytes=60)
+    manager = make_manager(models, budget=130)
+
+    async def main():
+        use_a, use_b = manager.use("a"), manager.use("b")
+        await use_a.__aenter__()
+        # Larger than its estimate, so "b" goes over budget while "a" is in use.
+        models.nbytes = 80
+        await use_b.__aenter__()
+        assert sum(stats["bytes"] for stats in manager.stats().values()) == 140
+        await use_a.__aexit__(None, None, None)
+        stats = manager.stats()
+        await use_b.__aexit__(None, None, None)
+        return stats
+
+    stats = asyncio.run(main())
+    assert sum(s["bytes"] for s in stats.values()) <= 130
+    assert stats["b"]["loaded"] and not stats["a"]["loaded"]